@@ -1,12 +1,21 @@
+import copy
+import json
+import multiprocessing
+import os
+import threading
 import pandas
 import openpyxl
 import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date, datetime
 from openpyxl.worksheet.worksheet import Worksheet
 from openpyxl.cell.cell import Cell
+from openpyxl.utils import get_column_letter
 from os import path
 
 import utils
+from fileio import fileio_module as fio
 
 BUDGET_ENTRIES = [
     "Staff Regional Meetings",
@@ -20,20 +29,279 @@ BUDGET_ENTRIES = [
     "Allocated Expenses"
 ]
 
-def parse_excel_to_budgets(file):
+MRPT_SHEET = "MRPT"
+HEADER_VALUES = ["MTD Actual", "MTD Budget", "YTD Budget"]
+
+# Parsed results kept per worker (memory) and shared by workers (disk), least recently used ones are evicted first.
+# Bump PARSER_VERSION whenever parsing changes, older cached results are then ignored
+CACHE_MAX_ENTRIES       = int(os.getenv("PPA_MRPT_CACHE_MAX_ENTRIES", "16"))
+CACHE_MAX_DISK_ENTRIES  = int(os.getenv("PPA_MRPT_CACHE_MAX_DISK_ENTRIES", "64"))
+CACHE_DIR               = os.path.join(fio.DATA_FOLDER, fio.CACHE_FOLDER, "mrpt")
+PARSER_VERSION          = 2
+
+# "stream" reads the MRPT sheet once in read-only mode, "pandas" is the original slimify round trip
+ENGINE = os.getenv("PPA_MRPT_ENGINE", "stream")
+
+# Processes parsing the sheets of one workbook side by side, 0 for one per CPU
+MAX_WORKERS = int(os.getenv("PPA_MRPT_WORKERS", "0")) or os.cpu_count() or 1
+
+def parse_excel_to_budgets(file, engine: str = None):
     """Returns a tuple of :
     - Two list of dict (MonthlyActual, MonthlyBudget) 
     - One dict (YearlyBudget)"""
-    res_actual = []
-    res_budget = []
-    res_yearlyBudget = {}
-
     folder_name, file_name = path.split(file)
 
     # Data Validation
     if not (path.exists(file) and folder_name and file_name):
         raise FileNotFoundError("Given filepath doesn't exist!")
-    
+
+    if (engine or ENGINE) == "pandas":
+        return _parse_slim(folder_name, file_name)
+
+    return _parse_stream(file)
+
+def parse_excel_by_year(file, engine: str = None):
+    """Returns a dict of {year: (actuals, budgets, yearly)} as returned by parse_excel_to_budgets,
+    of every MRPT-style sheet (having 'MTD Actual' headers) and every year in them.
+    The sheets are parsed concurrently in a process pool"""
+    folder_name, file_name = path.split(file)
+
+    if not (path.exists(file) and folder_name and file_name):
+        raise FileNotFoundError("Given filepath doesn't exist!")
+
+    if (engine or ENGINE) == "pandas": # The MRPT sheet and a single year only
+        res = _parse_slim(folder_name, file_name)
+        return {res[2]["year"]: res}
+
+    wb = openpyxl.load_workbook(filename=file, read_only=True, data_only=True)
+    try:
+        if len(wb.sheetnames) == 1 or MAX_WORKERS == 1 or multiprocessing.current_process().daemon:
+            # Daemonic processes (pool workers on python 3.8) cannot start a pool of their own
+            sheets = [_sheet_by_year(wb[name]) for name in wb.sheetnames]
+        else:
+            pool = _get_pool()
+            sheets = [f.result() for f in [pool.submit(_parse_sheet_by_year, file, name) for name in wb.sheetnames]]
+    finally:
+        wb.close()
+
+    res = {}
+    for sheet in sheets:
+        for year, budgets in sheet.items():
+            if year in res:
+                raise TypeError(f"Budgets of year ({year}) found more than once!")
+            res[year] = budgets
+
+    if not res:
+        raise TypeError("Unknown Excel data structure!")
+
+    return dict(sorted(res.items()))
+
+_pool_lock = threading.Lock()
+_pool = None
+
+def _get_pool():
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked, like the jobs pool
+            _pool = ProcessPoolExecutor(MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+    return _pool
+
+### Parsed Results Cache ###
+_cache_lock = threading.Lock()
+_cache      = OrderedDict()
+
+def content_key(sha256_hex: str):
+    """Returns the cache key of an uploaded workbook, from the sha256 of its bytes"""
+    return f"{sha256_hex}_v{PARSER_VERSION}"
+
+def get_cached(key: str):
+    """Returns the {year: (actuals, budgets, yearly)} dict parsed earlier from the same content, None when not cached"""
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return copy.deepcopy(_cache[key])
+
+    filepath = os.path.join(CACHE_DIR, f"{key}.json")
+    try:
+        with open(filepath) as f:
+            # JSON keys are strings
+            res = {int(year): tuple(budgets) for year, budgets in json.load(f).items()}
+        os.utime(filepath) # Keeps recently used files from eviction
+    except (OSError, ValueError):
+        return None
+
+    _remember(key, res)
+
+    return copy.deepcopy(res)
+
+def put_cached(key: str, parsed):
+    _remember(key, copy.deepcopy(parsed))
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    filepath = os.path.join(CACHE_DIR, f"{key}.json")
+
+    # Written aside then renamed, other workers never read a partial file
+    tmp_filepath = f"{filepath}.{os.getpid()}.tmp"
+    with open(tmp_filepath, "w") as f:
+        json.dump(parsed, f)
+    os.replace(tmp_filepath, filepath)
+
+    _evict_disk()
+
+def _remember(key: str, parsed):
+    with _cache_lock:
+        _cache[key] = parsed
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+def _evict_disk():
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith(".json"):
+            try:
+                entries.append((os.path.getmtime(os.path.join(CACHE_DIR, name)), name))
+            except OSError: # Evicted by another worker meanwhile
+                pass
+
+    for (_, name) in sorted(entries)[:max(len(entries) - CACHE_MAX_DISK_ENTRIES, 0)]:
+        try:
+            os.remove(os.path.join(CACHE_DIR, name))
+        except OSError:
+            pass
+
+### Streaming Engine ###
+def _parse_stream(file):
+    wb = openpyxl.load_workbook(filename=file, read_only=True, data_only=True)
+    try:
+        if MRPT_SHEET not in wb.sheetnames:
+            raise TypeError(f"No '{MRPT_SHEET}' sheet found!")
+        headers, label_rows = _scan_sheet(wb[MRPT_SHEET])
+    finally:
+        wb.close()
+
+    return _block_to_budgets(headers, label_rows)
+
+def _parse_sheet_by_year(file, sheet_name):
+    """_sheet_by_year of the workbook's sheet, runs in the pool"""
+    wb = openpyxl.load_workbook(filename=file, read_only=True, data_only=True)
+    try:
+        return _sheet_by_year(wb[sheet_name])
+    finally:
+        wb.close()
+
+def _sheet_by_year(ws):
+    """Returns the {year: (actuals, budgets, yearly)} of a sheet, empty when it has no MRPT headers"""
+    res = {}
+    try:
+        for headers, label_rows in _scan_blocks(ws):
+            # Years side by side share the block's entry rows
+            years = sorted({_header_date(h)["date"].year for hs in headers.values() for h in hs})
+
+            for year in years:
+                if year in res:
+                    raise TypeError(f"Budgets of year ({year}) found more than once!")
+
+                year_headers = {v: [h for h in hs if h["date"].year == year] for v, hs in headers.items()}
+                res[year] = _block_to_budgets(year_headers, label_rows)
+    except TypeError as e:
+        raise TypeError(f"Sheet '{ws.title}': {e}")
+
+    return res
+
+def _block_to_budgets(headers, label_rows):
+    # Same checks, in the same order, as the pandas engine
+    if not headers["MTD Actual"]:
+        raise TypeError("Unknown Excel data structure!")
+    if not (len(headers["MTD Actual"]) == len(headers["MTD Budget"])):
+        raise TypeError("Different amount of MonthlyActual and MonthlyBudget in file!")
+    if not (len(headers["YTD Budget"]) == 2):
+        raise TypeError("There aren't two columns of YTD Budget!")
+
+    actuals = [_header_date(h) for h in headers["MTD Actual"]]
+    budgets = [_header_date(h) for h in headers["MTD Budget"]]
+    yearly  = next((h for h in headers["YTD Budget"] if _header_date(h)["date"].month == 12), None)
+    if not yearly:
+        raise TypeError("No (YTD Budget) was found!")
+
+    for e in BUDGET_ENTRIES:
+        if e not in label_rows:
+            raise TypeError(f"Missing entry label ({e})")
+
+    def column_of(h):
+        col = h["col"]
+        return _to_budget(h["date"], lambda entry: _value_at(label_rows[entry], col))
+
+    return ([column_of(a) for a in actuals], [column_of(b) for b in budgets], column_of(_header_date(yearly)))
+
+def _scan_sheet(ws):
+    """Single pass over the sheet. Returns a tuple of :
+    - dict of {header_value: [{"col", "row", "month", "month_row"}]}, month being the value right below the header
+    - dict of {entry_label: row values}, last row wins like in the pandas engine"""
+    headers     = {v: [] for v in HEADER_VALUES}
+    label_rows  = {}
+
+    for (block_headers, block_label_rows) in _scan_blocks(ws):
+        for v, hs in block_headers.items():
+            headers[v] += hs
+        label_rows.update(block_label_rows)
+
+    return headers, label_rows
+
+def _scan_blocks(ws):
+    """Single pass over the sheet. Returns a list of (headers, label_rows) tuples as returned by _scan_sheet,
+    one per block of rows: a header row starts a new block once entry rows were found below the previous one,
+    blocks stacked vertically each have their own entry rows"""
+    blocks  = []
+    pending = [] # Headers of the previous row, waiting for their month label
+
+    for row_idx, row in enumerate(ws.iter_rows(values_only=True), start=1):
+        # Blank rows are dropped by the pandas round trip, "right below" means the next non blank row
+        if all(v is None for v in row):
+            continue
+
+        for h in pending:
+            h["month"]      = _value_at(row, h["col"])
+            h["month_row"]  = row_idx
+        pending = []
+
+        for col, value in enumerate(row):
+            if value in HEADER_VALUES:
+                if not blocks or blocks[-1][1]:
+                    blocks.append(({v: [] for v in HEADER_VALUES}, {}))
+
+                h = {"col": col, "row": row_idx, "month": None, "month_row": row_idx + 1}
+                blocks[-1][0][value].append(h)
+                pending.append(h)
+            elif value in BUDGET_ENTRIES:
+                if not blocks: # Entry rows above any header
+                    blocks.append(({v: [] for v in HEADER_VALUES}, {}))
+
+                blocks[-1][1][value] = row
+
+    return blocks
+
+def _header_date(h):
+    if "date" not in h:
+        try:
+            h["date"] = datetime.strptime(h["month"], "%b %Y")
+        except ValueError:
+            raise TypeError(f"Wrong Month Year format ({h['month']}) found on Cell {get_column_letter(h['col'] + 1)}{h['month_row']}!")
+
+    return h
+
+def _value_at(row, col):
+    return row[col] if col < len(row) else None
+
+### Pandas Engine ###
+def _parse_slim(folder_name, file_name):
+    res_actual = []
+    res_budget = []
+    res_yearlyBudget = {}
+
     # Slimify xlsx
     slim_filepath = _slimify_mrpt(folder_name, file_name)
     # slim_filepath = "data/MRPT dummy_slim.xlsx"
@@ -83,7 +351,7 @@ def _get_mrpt_cells(ws: Worksheet):
 
 def _slimify_mrpt(dirName, fileName):
     try:
-        df = pandas.read_excel(path.join(dirName, fileName), sheet_name="MRPT")
+        df = pandas.read_excel(path.join(dirName, fileName), sheet_name=MRPT_SHEET)
     except ValueError:
         return ValueError("Fail to read excel using Pandas")
 
@@ -182,34 +450,42 @@ def _find_entry_labels_columns(ws: Worksheet):
     return res
 
 def _process_column(ws: Worksheet, header_cell, entryLabels):
-    r = {}
-
     column_index = header_cell['header'].column
 
-    r["year"]      = header_cell['date'].year
-    r["month"]     = header_cell['date'].month
+    return _to_budget(
+        header_cell['date'],
+        lambda entry: ws.cell(row=_get_label_cell_row(entryLabels, entry), column=column_index).value
+    )
+
+### Budget Dict ###
+def _to_budget(monthyear: datetime, value_of):
+    """Returns the budget dict of a column, value_of(entry_label) giving the column's value on that entry's row"""
+    r = {}
+
+    r["year"]      = monthyear.year
+    r["month"]     = monthyear.month
 
-    staff_total_expense = ws.cell(row=_get_label_cell_row(entryLabels, "Staff Expenses"), column=column_index).value
-    staff_training      = ws.cell(row=_get_label_cell_row(entryLabels, "Staff Training"), column=column_index).value
-    staff_regmeet       = ws.cell(row=_get_label_cell_row(entryLabels, "Staff Regional Meetings"), column=column_index).value
+    staff_total_expense = value_of("Staff Expenses")
+    staff_training      = value_of("Staff Training")
+    staff_regmeet       = value_of("Staff Regional Meetings")
     
     staff_train_regmeet = staff_training + staff_regmeet
     staff_salaries      = staff_total_expense - staff_train_regmeet
 
-    other_total             = ws.cell(row=_get_label_cell_row(entryLabels, "Other Related"), column=column_index).value
-    other_transport_travel  = ws.cell(row=_get_label_cell_row(entryLabels, "Transport & Travels"), column=column_index).value
+    other_total             = value_of("Other Related")
+    other_transport_travel  = value_of("Transport & Travels")
     
     other_other             = other_total - other_transport_travel
 
 
     r["staff_salaries"]             = staff_salaries
     r["staff_training_reg_meeting"] = staff_train_regmeet
-    r["revenue_related"]            = ws.cell(row=_get_label_cell_row(entryLabels, "Revenue Related"), column=column_index).value
-    r["it_related"]                 = ws.cell(row=_get_label_cell_row(entryLabels, "IT - Related"), column=column_index).value
-    r["occupancy_related"]          = ws.cell(row=_get_label_cell_row(entryLabels, "Occupancy - Related"), column=column_index).value
+    r["revenue_related"]            = value_of("Revenue Related")
+    r["it_related"]                 = value_of("IT - Related")
+    r["occupancy_related"]          = value_of("Occupancy - Related")
     r["other_transport_travel"]     = other_transport_travel
     r["other_other"]                = other_other
-    r["indirect_expense"]           = ws.cell(row=_get_label_cell_row(entryLabels, "Allocated Expenses"), column=column_index).value
+    r["indirect_expense"]           = value_of("Allocated Expenses")
 
     return r
 
@@ -0,0 +1,15 @@
+# Rebuilds the dashboard summary tables, run from the app folder: python -m aggregator
+import models
+from database import engine, SessionLocal
+from aggregator import summary_module as summ
+
+models.Base.metadata.create_all(engine)
+
+db = SessionLocal()
+try:
+    summ.rebuild(db)
+    db.commit()
+finally:
+    db.close()
+
+print("Dashboard aggregates rebuilt")
@@ -0,0 +1,207 @@
+import datetime
+from sqlalchemy import func, case, and_, cast, Integer
+from sqlalchemy.orm import Session
+
+from models import Employee, Certification, Project, ProjectStatus, Training, TrainingTarget
+from models import SocialContrib, BUSUEngagement
+
+GEN_X_YOUNGEST = datetime.date(1975,12,31)
+GEN_Y_YOUNGEST = datetime.date(1989,12,31)
+
+# Upper bounds (exclusive) of the audit experience buckets, last bucket is open ended
+AUDIT_EXP_BOUNDS = [3, 7, 10, 13, 16]
+
+SMR_IN_PROGRESS = "SMR In Progress"
+SMR_LEVEL_PREFIX = "SMR Level "
+
+PROJECT_STATUSES = ["Completed", "Sign-off", "Reporting", "Fieldwork", "Planning"]
+PROJECT_COUNT_LABELS = ["Total Projects"] + PROJECT_STATUSES + ["Timely Report", "DA", "PA"]
+
+### Employee Charts ###
+def count_by_generation_gender(db: Session):
+    """Returns a dict of {(gen_index, gender): count} of active employees, gen_index being 0 (Gen X), 1 (Gen Y) or 2 (Gen Z)"""
+    gen = case(
+        (Employee.date_of_birth <= GEN_X_YOUNGEST, 0),
+        (Employee.date_of_birth <= GEN_Y_YOUNGEST, 1),
+        else_=2
+    )
+
+    rows = db.query(gen, Employee.gender, func.count(Employee.id)).filter(
+        Employee.active == True
+    ).group_by(gen, Employee.gender).all()
+
+    return {(g, gender): count for (g, gender, count) in rows}
+
+def count_by_edu(db: Session):
+    """Returns a dict of {(edu_category, edu_level): count} of active employees"""
+    rows = db.query(Employee.edu_category, Employee.edu_level, func.count(Employee.id)).filter(
+        Employee.active == True
+    ).group_by(Employee.edu_category, Employee.edu_level).all()
+
+    return {(cat, lvl): count for (cat, lvl, count) in rows}
+
+def count_by_highest_smr(db: Session):
+    """Returns a dict of {smr_level: count} of active employees, level 0 being 'SMR In Progress'.
+    Mirrors api.extract_highest_smr_level: only proven SMR levels count, In Progress only when no level is proven"""
+    per_emp = db.query(
+        Certification.emp_id.label("emp_id"),
+        func.max(_smr_level_case()).label("lvl")
+    ).join(Certification.owner).filter(
+        Employee.active == True
+    ).group_by(Certification.emp_id).subquery()
+
+    rows = db.query(per_emp.c.lvl, func.count(per_emp.c.emp_id)).filter(
+        per_emp.c.lvl != None
+    ).group_by(per_emp.c.lvl).all()
+
+    return {lvl: count for (lvl, count) in rows}
+
+def count_by_cert_name(db: Session):
+    """Returns a dict of {cert_name: count} of proven certs of active employees"""
+    rows = db.query(Certification.cert_name, func.count(Certification.id)).join(Certification.owner).filter(
+        Employee.active == True,
+        _has_proof()
+    ).group_by(Certification.cert_name).all()
+
+    return {n: count for (n, count) in rows}
+
+def count_by_audit_exp(db: Session, today: datetime.date = None):
+    """Returns a list of tuples (in_uob_bucket, outside_uob_bucket, total_bucket, count) of active employees,
+    bucket being the index of AUDIT_EXP_BOUNDS the years of experience falls into"""
+    today = datetime.date.today() if not today else today
+
+    in_uob  = _full_years_since(Employee.date_first_uob, today)
+    out_uob = Employee.year_audit_non_uob
+    total   = in_uob + out_uob
+
+    buckets = (_bucket_case(in_uob), _bucket_case(out_uob), _bucket_case(total))
+
+    rows = db.query(*buckets, func.count(Employee.id)).filter(
+        Employee.active == True
+    ).group_by(*buckets).all()
+
+    return [tuple(r) for r in rows]
+
+### Yearly Charts ###
+# Every function below takes an optional year, None meaning all years, and returns rows starting with the year
+
+def count_projects_by_div(db: Session, year: int = None):
+    """Returns a list of tuples (year, div_id, *counts), counts being ordered as PROJECT_COUNT_LABELS"""
+    counts = [func.count(Project.id)]
+    counts += [func.sum(case((ProjectStatus.name == s, 1), else_=0)) for s in PROJECT_STATUSES]
+    counts += [
+        func.sum(case((Project.timely_report == True, 1), else_=0)),
+        func.sum(case((Project.used_DA == True, 1), else_=0)),
+        func.sum(case((and_(Project.completion_PA != None, Project.completion_PA != ""), 1), else_=0)),
+    ]
+
+    q = db.query(Project.year, Project.div_id, *counts).outerjoin(Project.status)
+    if year is not None:
+        q = q.filter(Project.year == year)
+
+    return [tuple(r) for r in q.group_by(Project.year, Project.div_id).all()]
+
+def sum_training_costs_by_div(db: Session, year: int = None):
+    """Returns a list of tuples (year, div_id, budget, realization, charged_by_fin) of active employees' trainings"""
+    t_year = _year_of(Training.date)
+
+    q = db.query(
+        t_year, Employee.div_id,
+        func.sum(Training.budget), func.sum(Training.realization), func.sum(Training.charged_by_fin)
+    ).join(Training.employee).filter(
+        Training.emp_id != 0,
+        Employee.active == True
+    )
+    q = _filter_date_in_year(q, Training.date, year)
+
+    return [tuple(r) for r in q.group_by(t_year, Employee.div_id).all()]
+
+def sum_mandatory_training_costs(db: Session, year: int = None):
+    """Returns a list of tuples (year, budget, realization, charged_by_fin) of mandatory trainings (emp_id 0)"""
+    t_year = _year_of(Training.date)
+
+    q = db.query(
+        t_year, func.sum(Training.budget), func.sum(Training.realization), func.sum(Training.charged_by_fin)
+    ).filter(
+        Training.emp_id == 0
+    )
+    q = _filter_date_in_year(q, Training.date, year)
+
+    return [tuple(r) for r in q.group_by(t_year).all()]
+
+def sum_training_hours_by_div(db: Session, year: int = None):
+    """Returns a list of tuples (year, div_id, hours) of active employees' trainings"""
+    t_year = _year_of(Training.date)
+
+    q = db.query(t_year, Employee.div_id, func.sum(Training.duration_hours)).join(Training.employee).filter(
+        Training.emp_id > 0,
+        Employee.active == True
+    )
+    q = _filter_date_in_year(q, Training.date, year)
+
+    return [tuple(r) for r in q.group_by(t_year, Employee.div_id).all()]
+
+def sum_training_targets_by_div(db: Session, year: int = None):
+    """Returns a list of tuples (year, div_id, target_hours)"""
+    q = db.query(TrainingTarget.year, Employee.div_id, func.sum(TrainingTarget.target_hours)).join(TrainingTarget.trainee)
+    q = _filter_year(q, TrainingTarget.year, year)
+
+    return [tuple(r) for r in q.group_by(TrainingTarget.year, Employee.div_id).all()]
+
+def count_social_contribs_by_div(db: Session, year: int = None):
+    """Returns a list of tuples (year, creator_div_id, social_type_id, creator_active, count)"""
+    s_year = _year_of(SocialContrib.date)
+    active = case((Employee.active == True, True), else_=False)
+
+    q = db.query(s_year, Employee.div_id, SocialContrib.social_type_id, active, func.count(SocialContrib.id)).join(SocialContrib.creator)
+    q = _filter_date_in_year(q, SocialContrib.date, year)
+
+    return [tuple(r) for r in q.group_by(s_year, Employee.div_id, SocialContrib.social_type_id, active).all()]
+
+def count_busu_by_div(db: Session, year: int = None):
+    """Returns a list of tuples (year, creator_div_id, eng_type_id, count)"""
+    b_year = _year_of(BUSUEngagement.date)
+
+    q = db.query(b_year, Employee.div_id, BUSUEngagement.eng_type_id, func.count(BUSUEngagement.id)).join(BUSUEngagement.creator)
+    q = _filter_date_in_year(q, BUSUEngagement.date, year)
+
+    return [tuple(r) for r in q.group_by(b_year, Employee.div_id, BUSUEngagement.eng_type_id).all()]
+
+### Expressions ###
+def _year_of(date_col):
+    return cast(func.strftime('%Y', date_col), Integer)
+
+def _filter_year(q, year_col, year):
+    return q if year is None else q.filter(year_col == year)
+
+def _filter_date_in_year(q, date_col, year):
+    if year is None:
+        return q
+
+    return q.filter(date_col >= datetime.date(year,1,1), date_col <= datetime.date(year,12,31))
+
+def _has_proof():
+    return and_(Certification.cert_proof != None, Certification.cert_proof != "")
+
+def _smr_level_case():
+    """Per cert SMR level: the proven level (1-9), 0 for 'SMR In Progress', NULL otherwise"""
+    level = cast(func.substr(Certification.cert_name, -1), Integer)
+
+    return case(
+        (and_(Certification.cert_name.like(SMR_LEVEL_PREFIX + "_"), level > 0, _has_proof()), level),
+        (Certification.cert_name == SMR_IN_PROGRESS, 0),
+        else_=None
+    )
+
+def _full_years_since(date_col, today: datetime.date):
+    """Whole years between date_col and today, same as relativedelta(today, date_col).years"""
+    today_str = today.isoformat()
+
+    years   = cast(func.strftime('%Y', today_str), Integer) - cast(func.strftime('%Y', date_col), Integer)
+    not_yet = case((func.strftime('%m-%d', today_str) < func.strftime('%m-%d', date_col), 1), else_=0)
+
+    return years - not_yet
+
+def _bucket_case(expr):
+    whens = [(expr < bound, i) for i, bound in enumerate(AUDIT_EXP_BOUNDS)]
+    return case(*whens, else_=len(AUDIT_EXP_BOUNDS))
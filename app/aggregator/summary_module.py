@@ -0,0 +1,271 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import DashboardAggregate, Employee, Certification, Project, Training, TrainingTarget
+from models import SocialContrib, BUSUEngagement
+from aggregator import aggregator_module as agg
+from cache import cache_module as cache
+
+# Metrics stored per family, a family is always refreshed as a whole (for one year or for every year)
+FAMILY_METRICS = {
+    "employee"  : ["smr", "pro_cert", "generation", "edu"],
+    "project"   : ["project"],
+    "training"  : ["training_cost", "training_mandatory", "training_hours", "training_target"],
+    "social"    : ["social"],
+    "busu"      : ["busu"],
+}
+
+# Tables each family is computed from
+FAMILY_SOURCES = {
+    "employee"  : [Employee, Certification],
+    "project"   : [Project],
+    "training"  : [Training, TrainingTarget, Employee],
+    "social"    : [SocialContrib, Employee],
+    "busu"      : [BUSUEngagement, Employee],
+}
+
+# Families built from the employees' division/active flag on top of their own table
+EMPLOYEE_DEPENDENT_FAMILIES = ["training", "social", "busu"]
+
+_TRACKED_KEY = "dashboard_aggregate_slices"
+
+### Refresh ###
+def refresh(db: Session, family: str, year: int = None):
+    """Recomputes the summary rows of a family, for a single year or for every year when year is None"""
+    if family == "employee":
+        year = None
+
+    q = db.query(DashboardAggregate).filter(DashboardAggregate.metric.in_(FAMILY_METRICS[family]))
+    if year is not None:
+        q = q.filter(DashboardAggregate.year == year)
+    q.delete(synchronize_session=False)
+
+    db.bulk_insert_mappings(DashboardAggregate, _ROW_BUILDERS[family](db, year))
+
+def rebuild(db: Session):
+    """Recomputes every summary row. Caller commits"""
+    db.query(DashboardAggregate).delete(synchronize_session=False)
+
+    for family in FAMILY_METRICS:
+        refresh(db, family)
+
+    # Responses cached from drifted summaries are keyed by the source tables' versions, not by the summary table's
+    cache.bump_versions({m.__tablename__ for family in FAMILY_METRICS for m in FAMILY_SOURCES[family]}, db)
+
+def rebuild_if_empty(session_factory):
+    db = session_factory()
+    try:
+        if db.query(DashboardAggregate.id).first() is None:
+            rebuild(db)
+            db.commit()
+    finally:
+        db.close()
+
+### Write Tracking ###
+def install(session_factory):
+    """Keeps the summary rows in sync with every session made by session_factory.
+    Touched (family, year) slices are collected on flush and refreshed right before commit, in the same transaction"""
+    event.listen(session_factory, "after_flush", _track_flush)
+    event.listen(session_factory, "after_bulk_update", _track_bulk)
+    event.listen(session_factory, "after_bulk_delete", _track_bulk)
+    event.listen(session_factory, "before_commit", _refresh_tracked)
+    event.listen(session_factory, "after_rollback", _forget_tracked)
+
+def _track_flush(session, flush_context):
+    slices = session.info.setdefault(_TRACKED_KEY, set())
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        slices.update(_slices_of(obj))
+
+def _track_bulk(ctx):
+    # Bulk query.update()/delete() do not tell which rows were hit, refresh every year of the family
+    slices = ctx.session.info.setdefault(_TRACKED_KEY, set())
+    cls = ctx.mapper.class_
+
+    if cls is Employee:
+        slices.add(("employee", None))
+        slices.update((f, None) for f in EMPLOYEE_DEPENDENT_FAMILIES)
+    elif cls in _FAMILY_OF:
+        slices.add((_FAMILY_OF[cls][0], None))
+
+def _refresh_tracked(session):
+    session.flush()
+    slices = session.info.pop(_TRACKED_KEY, None)
+    if not slices:
+        return
+
+    whole = {f for (f, y) in slices if y is None}
+    for family, year in sorted(slices, key=lambda s: (s[0], s[1] or 0)):
+        if year is None or family not in whole:
+            refresh(session, family, year)
+
+def _forget_tracked(session):
+    session.info.pop(_TRACKED_KEY, None)
+
+def _slices_of(obj):
+    cls = type(obj)
+
+    if cls is Employee:
+        res = {("employee", None)}
+        state = inspect(obj)
+        if state.pending or state.deleted or _changed(obj, "active") or _changed(obj, "div_id"):
+            res.update((f, None) for f in EMPLOYEE_DEPENDENT_FAMILIES)
+        return res
+
+    if cls is Certification:
+        return {("employee", None)}
+
+    if cls not in _FAMILY_OF:
+        return set()
+
+    family, attr = _FAMILY_OF[cls]
+    years = {getattr(v, "year", v) for v in inspect(obj).attrs[attr].history.sum()}
+    if not years or not all(isinstance(y, int) for y in years):
+        return {(family, None)}
+
+    return {(family, y) for y in years}
+
+def _changed(obj, attr):
+    return inspect(obj).attrs[attr].history.has_changes()
+
+# Family and the attribute giving the year (or a date of that year) of a row
+_FAMILY_OF = {
+    Project         : ("project", "year"),
+    Training        : ("training", "date"),
+    TrainingTarget  : ("training", "year"),
+    SocialContrib   : ("social", "date"),
+    BUSUEngagement  : ("busu", "date"),
+}
+
+### Reads ###
+def count_by_highest_smr(db: Session):
+    """Returns a dict of {smr_level: count} of active employees, level 0 being 'SMR In Progress'"""
+    return {int(key): int(value) for (_, key, _, value) in _read(db, "smr")}
+
+def count_by_pro_cert(cert_names, db: Session):
+    """Returns a dict of {cert_name: count} of proven certs of active employees, certs not in cert_names summed under 'Others'"""
+    res = {}
+    for (_, key, _, value) in _read(db, "pro_cert"):
+        name = key if key in cert_names else "Others"
+        res[name] = res.get(name, 0) + int(value)
+
+    return res
+
+def count_by_generation_gender(db: Session):
+    """Returns a dict of {(gen_index, gender): count} of active employees"""
+    return {(int(key), subkey): int(value) for (_, key, subkey, value) in _read(db, "generation")}
+
+def count_by_edu(db: Session):
+    """Returns a dict of {(edu_category, edu_level): count} of active employees"""
+    return {(key, subkey): int(value) for (_, key, subkey, value) in _read(db, "edu")}
+
+def count_projects_by_div(year: int, db: Session):
+    """Returns a dict of {div_id: {label: count}}, labels being agg.PROJECT_COUNT_LABELS"""
+    res = {}
+    for (div_id, key, _, value) in _read(db, "project", year):
+        res.setdefault(div_id, {})[key] = int(value)
+
+    return res
+
+def sum_training_costs_by_div(year: int, db: Session):
+    """Returns a tuple of ({div_id: {"realized", "charged"}}, {"budget", "realized", "charged"} of mandatory trainings)"""
+    by_div = {}
+    for (div_id, key, _, value) in _read(db, "training_cost", year):
+        by_div.setdefault(div_id, {})[key] = value
+
+    mandatory = {key: value for (_, key, _, value) in _read(db, "training_mandatory", year)}
+
+    return by_div, mandatory
+
+def sum_training_hours_by_div(year: int, db: Session):
+    """Returns a tuple of dicts ({div_id: trained_hours}, {div_id: target_hours})"""
+    hours   = {div_id: value for (div_id, _, _, value) in _read(db, "training_hours", year)}
+    targets = {div_id: value for (div_id, _, _, value) in _read(db, "training_target", year)}
+
+    return hours, targets
+
+def count_social_contribs_by_div(year: int, db: Session, active_only: bool = False):
+    """Returns a dict of {div_id: {social_type_id: count}} by the creators' division"""
+    res = {}
+    for (div_id, key, subkey, value) in _read(db, "social", year):
+        if key is None or (active_only and subkey != "active"):
+            continue
+        per_type = res.setdefault(div_id, {})
+        per_type[int(key)] = per_type.get(int(key), 0) + int(value)
+
+    return res
+
+def count_busu_by_div(year: int, db: Session):
+    """Returns a dict of {div_id: {eng_type_id: count}} by the creators' division"""
+    res = {}
+    for (div_id, key, _, value) in _read(db, "busu", year):
+        if key is None:
+            continue
+        res.setdefault(div_id, {})[int(key)] = int(value)
+
+    return res
+
+def _read(db: Session, metric: str, year: int = None):
+    return db.query(
+        DashboardAggregate.div_id, DashboardAggregate.key, DashboardAggregate.subkey, DashboardAggregate.value
+    ).filter(
+        DashboardAggregate.metric == metric,
+        DashboardAggregate.year == year
+    ).all()
+
+### Row Builders ###
+def _row(metric, year, div_id, key, value, subkey=None):
+    return {
+        "metric": metric, "year": year, "div_id": div_id,
+        "key": None if key is None else str(key), "subkey": subkey, "value": value or 0
+    }
+
+def _employee_rows(db: Session, year: int = None):
+    rows = []
+    rows += [_row("smr", None, None, lvl, count) for lvl, count in agg.count_by_highest_smr(db).items()]
+    rows += [_row("pro_cert", None, None, name, count) for name, count in agg.count_by_cert_name(db).items()]
+    rows += [_row("generation", None, None, gen, count, gender) for (gen, gender), count in agg.count_by_generation_gender(db).items()]
+    rows += [_row("edu", None, None, cat, count, lvl) for (cat, lvl), count in agg.count_by_edu(db).items()]
+
+    return rows
+
+def _project_rows(db: Session, year: int = None):
+    rows = []
+    for (y, div_id, *counts) in agg.count_projects_by_div(db, year):
+        rows += [_row("project", y, div_id, label, c) for label, c in zip(agg.PROJECT_COUNT_LABELS, counts)]
+
+    return rows
+
+def _training_rows(db: Session, year: int = None):
+    rows = []
+    for (y, div_id, _, realized, charged) in agg.sum_training_costs_by_div(db, year):
+        rows += [_row("training_cost", y, div_id, "realized", realized), _row("training_cost", y, div_id, "charged", charged)]
+
+    for (y, budget, realized, charged) in agg.sum_mandatory_training_costs(db, year):
+        rows += [
+            _row("training_mandatory", y, None, "budget", budget),
+            _row("training_mandatory", y, None, "realized", realized),
+            _row("training_mandatory", y, None, "charged", charged),
+        ]
+
+    rows += [_row("training_hours", y, div_id, "hours", h) for (y, div_id, h) in agg.sum_training_hours_by_div(db, year)]
+    rows += [_row("training_target", y, div_id, "target", t) for (y, div_id, t) in agg.sum_training_targets_by_div(db, year)]
+
+    return rows
+
+def _social_rows(db: Session, year: int = None):
+    return [
+        _row("social", y, div_id, type_id, count, "active" if active else "inactive")
+        for (y, div_id, type_id, active, count) in agg.count_social_contribs_by_div(db, year)
+    ]
+
+def _busu_rows(db: Session, year: int = None):
+    return [_row("busu", y, div_id, type_id, count) for (y, div_id, type_id, count) in agg.count_busu_by_div(db, year)]
+
+_ROW_BUILDERS = {
+    "employee"  : _employee_rows,
+    "project"   : _project_rows,
+    "training"  : _training_rows,
+    "social"    : _social_rows,
+    "busu"      : _busu_rows,
+}
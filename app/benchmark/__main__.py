@@ -0,0 +1,170 @@
+# Times every GET route in-process, run from the app folder:
+# python -m benchmark run --generate --employees 2000 --out base.json
+# python -m benchmark compare base.json new.json
+# python -m benchmark plans --workdir <folder with data/database.db>
+# python -m benchmark mrpt [--file some_mrpt.xlsx] [--sheets 4]
+# python -m benchmark concurrency --workdir <folder with data/database.db>
+import argparse
+import json
+import os
+import sys
+
+parser = argparse.ArgumentParser(prog="python -m benchmark")
+sub = parser.add_subparsers(dest="command", required=True)
+
+p_run = sub.add_parser("run", help="time the routes and save the results as JSON")
+p_run.add_argument("--out", default="benchmark.json")
+p_run.add_argument("--workdir", default=".", help="folder holding data/database.db, generated there with --generate")
+p_run.add_argument("--generate", action="store_true", help="fill a new database in the workdir with the datagen module first")
+p_run.add_argument("--divisions", type=int, default=6)
+p_run.add_argument("--employees", type=int, default=300)
+p_run.add_argument("--years", type=int, default=3)
+p_run.add_argument("--seed", type=int, default=0)
+p_run.add_argument("--proof-files", action="store_true", help="also generate proof files, for the download routes")
+p_run.add_argument("--repeat", type=int, default=20)
+p_run.add_argument("--warm", action="store_true", help="keep the response cache between requests")
+p_run.add_argument("--match", help="only time routes containing this string")
+
+p_cmp = sub.add_parser("compare", help="compare two saved runs, exits with 1 on regressions")
+p_cmp.add_argument("base")
+p_cmp.add_argument("new")
+p_cmp.add_argument("--threshold", type=float, default=None, help="relative slow down counted as a regression")
+p_cmp.add_argument("--all", action="store_true", help="also print unchanged metrics")
+
+p_pln = sub.add_parser("plans", help="EXPLAIN QUERY PLAN the routes' statements, exits with 1 on full table scans")
+p_pln.add_argument("--workdir", default=".", help="folder holding data/database.db")
+p_pln.add_argument("--match", help="only check routes containing this string")
+
+p_mrp = sub.add_parser("mrpt", help="time both MRPT parse engines, exits with 1 if their results differ")
+p_mrp.add_argument("--file", help="MRPT workbook to parse, a synthetic one is written when missing")
+p_mrp.add_argument("--rows", type=int, default=5000, help="filler rows of the synthetic workbook")
+p_mrp.add_argument("--months", type=int, default=12)
+p_mrp.add_argument("--repeat", type=int, default=3)
+p_mrp.add_argument("--sheets", type=int, default=1, help="above 1, times parsing every year serially then in the process pool")
+p_mrp.add_argument("--workers", type=int, default=None, help="pool size, one per CPU by default")
+
+p_con = sub.add_parser("concurrency", help="reader/writer throughput with SQLite's default pragmas, then with database.SQLITE_PRAGMAS")
+p_con.add_argument("--workdir", default=".", help="folder holding data/database.db, its rows are rewritten unchanged")
+p_con.add_argument("--readers", type=int, default=4)
+p_con.add_argument("--writers", type=int, default=1)
+p_con.add_argument("--seconds", type=float, default=5.0)
+
+args = parser.parse_args()
+
+# The DB url is relative, move into the workdir before the app opens it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if args.command in ("run", "plans", "concurrency"):
+    os.makedirs(os.path.join(args.workdir, "data"), exist_ok=True)
+    if args.command == "run":
+        args.out = os.path.abspath(args.out)
+    os.chdir(args.workdir)
+
+    if args.command == "run" and args.generate and os.path.exists(os.path.join("data", "database.db")):
+        parser.error(f"{args.workdir} already has a database, --generate needs an empty --workdir")
+
+from benchmark import benchmark_module as bench
+
+if args.command == "compare":
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    threshold = args.threshold or bench.DEFAULT_THRESHOLD
+    rows = bench.compare(base, new, threshold)
+    regressions = [r for r in rows if r[4]]
+
+    for (template, metric, b, n, is_regression) in rows:
+        if is_regression or (args.all and b != n):
+            print(f"{'REGRESSION' if is_regression else '':<12}{template:<80}{metric:<10}{b:>12} -> {n}")
+    print(f"{len(regressions)} regression(s) over {len({r[0] for r in rows})} routes (threshold x{threshold})")
+
+    sys.exit(1 if regressions else 0)
+
+if args.command == "mrpt":
+    import tempfile
+
+    filepath = args.file
+    if not filepath:
+        filepath = os.path.join(tempfile.mkdtemp(), "MRPT_benchmark.xlsx")
+        bench.write_mrpt_workbook(filepath, months=args.months, filler_rows=args.rows, sheets=args.sheets)
+        print(f"Wrote {filepath} ({os.path.getsize(filepath) // 1024} KiB)")
+
+    if args.sheets > 1:
+        times, same = bench.time_mrpt_by_year(filepath, args.repeat, args.workers)
+        for label, seconds in times.items():
+            print(f"{label:<10}{seconds * 1000:>10.0f}ms")
+        print(f"speed-up x{times['serial'] / times['pool']:.1f}, {'same' if same else 'DIFFERENT'} results")
+
+        sys.exit(0 if same else 1)
+
+    times, same = bench.time_mrpt(filepath, args.repeat)
+    for engine, seconds in times.items():
+        print(f"{engine:<10}{seconds * 1000:>10.0f}ms")
+    print(f"speed-up x{times['pandas'] / times['stream']:.1f}, {'same' if same else 'DIFFERENT'} results")
+
+    sys.exit(0 if same else 1)
+
+if args.command == "concurrency":
+    from database import SQLALCHEMY_DB_URL, SQLITE_PRAGMAS
+
+    print(f"{args.readers} reader(s), {args.writers} writer(s), {args.seconds}s each")
+    for label, pragmas in [("baseline", bench.BASELINE_PRAGMAS), ("tuned", SQLITE_PRAGMAS)]:
+        r = bench.concurrency(SQLALCHEMY_DB_URL, pragmas, args.readers, args.writers, args.seconds)
+        print(
+            f"{label:<10}reads {r['reads_per_s']:>8}/s p50 {r['read_p50_ms']}ms p95 {r['read_p95_ms']}ms   "
+            f"writes {r['writes_per_s']:>8}/s p50 {r['write_p50_ms']}ms p95 {r['write_p95_ms']}ms   errors {r['errors']}"
+        )
+
+    sys.exit(0)
+
+import models
+from database import engine, SessionLocal
+
+if args.command == "run" and args.generate:
+    from aggregator import summary_module as summ
+    from datagen import datagen_module as datagen
+
+    models.Base.metadata.create_all(engine)
+
+    db = SessionLocal()
+    try:
+        datagen.generate(
+            db, divisions=args.divisions, employees=args.employees, years=args.years, seed=args.seed,
+            proof_files=args.proof_files
+        )
+        summ.rebuild(db)
+        db.commit()
+    finally:
+        db.close()
+
+import main
+
+db = SessionLocal()
+try:
+    params = bench.sample_params(db)
+finally:
+    db.close()
+
+if args.command == "plans":
+    scans = bench.full_scans(main.app, engine, params, match=args.match)
+
+    for (template, table, statement) in scans:
+        print(f"{template:<80}SCAN {table:<30}{statement[:200]}")
+    print(f"{len(scans)} full table scan(s)")
+
+    sys.exit(1 if scans else 0)
+
+results = bench.run(main.app, params, repeat=args.repeat, warm=args.warm, match=args.match)
+
+for template, r in results.items():
+    if r["url"] is None:
+        print(f"{template:<80}skipped, no sample path params")
+    else:
+        print(f"{template:<80}{r['status']:>4}{r['p50_ms']:>10.1f}ms{r['p95_ms']:>10.1f}ms{str(r['queries']):>6}q{r['peak_kib']:>10.0f}KiB")
+
+meta = {k: getattr(args, k) for k in ("divisions", "employees", "years", "seed", "proof_files", "repeat", "warm", "generate")}
+with open(args.out, "w") as f:
+    json.dump(bench.make_report(results, meta), f, indent=1, sort_keys=True)
+
+print(f"Saved to {args.out}")
@@ -0,0 +1,377 @@
+import datetime
+import math
+import multiprocessing
+import os
+import platform
+import random
+import re
+import time
+import tracemalloc
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from sqlalchemy import create_engine, event, desc, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from starlette.testclient import TestClient
+
+import openpyxl
+import database
+from models import Employee, Certification, Division, DivisionHistory, Training
+from cache import cache_module as cache
+from aggregator import aggregator_module as agg
+from querystats import querystats_module as qs
+from MrptParser import parser_module as pm
+
+# Routers timed by default, by URL prefix
+PREFIXES = ("/api", "/historic")
+
+# Relative slow down (new / base) reported as a regression by compare()
+DEFAULT_THRESHOLD = 1.25
+
+# Absolute changes below these are noise, never reported as regressions
+NOISE_FLOOR = {"p50_ms": 1.0, "p95_ms": 2.0, "peak_kib": 64.0}
+
+# Tables small enough (lookups, a row per division or per year) for a full scan to be the right plan
+SMALL_TABLES = {
+    "roles", "divisions", "attrtypes", "engagementtypes", "socialtypes", "projectstatus", "qatypes", "qagradingresults",
+    "serverstate", "annoucements", "tableversions", "yearlybudgets", "trainingbudgets", "yearlyattritions",
+    "divisionhistory", "trainingbudgethistory", "attritionmaintablehistory",
+}
+
+# Maintenance routes scanning whole tables by design, left out of full_scans()
+PLAN_SKIPPED_ROUTES = {
+    "/api/admin/operation/proof_store/audit",   # Reads every proof column of every row
+}
+
+# SQLite's own defaults, what the app ran with before the tuning pragmas
+BASELINE_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL"}
+
+_SCAN_RE        = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+_WHERE_RE       = re.compile(r"\bWHERE\b")
+_QUERY_COUNT_RE = re.compile(r'desc="(\d+) queries"')
+_PATH_PARAM_RE  = re.compile(r"{(\w+)}")
+
+### Routes ###
+def get_routes(app: FastAPI, prefixes=PREFIXES):
+    """Returns the sorted path templates of every GET route under the given prefixes"""
+    return sorted(
+        r.path for r in app.routes
+        if isinstance(r, APIRoute) and "GET" in r.methods and r.path.startswith(prefixes)
+    )
+
+def sample_params(db: Session):
+    """Returns a dict of {path_param: value} pointing at existing rows, "historic_year" being used for /historic routes"""
+    hist = db.query(DivisionHistory.year).order_by(desc(DivisionHistory.year)).first()
+    curr_year = hist[0] + 1 if hist else datetime.date.today().year
+
+    emp  = db.query(Employee).filter(Employee.active == True).order_by(Employee.id).first()
+    cert = db.query(Certification).filter(Certification.cert_proof != "").order_by(Certification.id).first()
+    div  = db.query(Division).order_by(Division.id).first()
+
+    return {
+        "year"          : curr_year,
+        "historic_year" : curr_year - 1,
+        "month"         : 1,
+        "id"            : 1,
+        "budget_id"     : 1,
+        "div_id"        : div.id if div else 1,
+        "div_name"      : div.short_name if div else "WBGM",
+        "nik"           : cert.owner.staff_id if cert else (emp.staff_id if emp else "0"),
+        "cert_name"     : cert.cert_name if cert else "CISA",
+    }
+
+def fill_path(template: str, params: dict):
+    """Returns the template with its path params substituted, None if a param has no sample value"""
+    values = dict(params)
+    if "/historic/" in template:
+        values["year"] = params["historic_year"]
+
+    if any(p not in values for p in _PATH_PARAM_RE.findall(template)):
+        return None
+
+    return _PATH_PARAM_RE.sub(lambda m: str(values[m.group(1)]), template)
+
+### Run ###
+def run(app: FastAPI, params: dict, repeat: int = 20, warm: bool = False, match: str = None, routes=None):
+    """Times every route and returns a dict of {template: {url, status, p50_ms, p95_ms, queries, peak_kib}}.
+    The response cache is cleared before each request unless warm is set"""
+    client = TestClient(app, raise_server_exceptions=False)
+    res = {}
+
+    for template in routes or get_routes(app):
+        if match and match not in template:
+            continue
+
+        url = fill_path(template, params)
+        if url is None:
+            res[template] = {"url": None, "status": None}
+            continue
+
+        # Warm up imports and lazy state, also gives the status and statement count
+        resp = _get(client, url, warm)
+        queries = _query_count(resp)
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            _get(client, url, warm)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        # Separate run, tracemalloc slows everything down
+        tracemalloc.start()
+        try:
+            _get(client, url, warm)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        res[template] = {
+            "url"       : url,
+            "status"    : resp.status_code,
+            "p50_ms"    : round(percentile(timings, 50), 3),
+            "p95_ms"    : round(percentile(timings, 95), 3),
+            "queries"   : queries,
+            "peak_kib"  : round(peak / 1024, 1),
+        }
+
+    return res
+
+def make_report(results: dict, meta: dict):
+    """Returns the JSON serializable report saved by the CLI"""
+    meta = dict(meta)
+    meta.update(python=platform.python_version(), created=datetime.datetime.now().isoformat(timespec="seconds"))
+
+    return {"meta": meta, "routes": results}
+
+def percentile(values, pct: float):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+
+    return ordered[rank - 1]
+
+def _get(client: TestClient, url: str, warm: bool):
+    if not warm:
+        cache.clear()
+
+    return client.get(url)
+
+def _query_count(resp):
+    found = _QUERY_COUNT_RE.search(resp.headers.get("server-timing", ""))
+    return int(found.group(1)) if found else None
+
+### Compare ###
+def compare(base: dict, new: dict, threshold: float = DEFAULT_THRESHOLD):
+    """Returns a list of tuples (template, metric, base_value, new_value, is_regression) for routes found in both reports.
+    Latencies and memory regress past threshold times the base (and past NOISE_FLOOR), statement counts and status codes on any change for the worse"""
+    rows = []
+    for template in sorted(set(base["routes"]) & set(new["routes"])):
+        b, n = base["routes"][template], new["routes"][template]
+        if b.get("status") is None or n.get("status") is None:
+            continue
+
+        rows.append((template, "status", b["status"], n["status"], b["status"] < 400 <= n["status"]))
+        for metric in ("p50_ms", "p95_ms", "peak_kib"):
+            worse = n[metric] > b[metric] * threshold and n[metric] - b[metric] > NOISE_FLOOR[metric]
+            rows.append((template, metric, b[metric], n[metric], worse))
+        if b["queries"] is not None and n["queries"] is not None:
+            rows.append((template, "queries", b["queries"], n["queries"], n["queries"] > b["queries"]))
+
+    return rows
+
+### Query Plans ###
+def full_scans(app: FastAPI, engine, params: dict, match: str = None, routes=None):
+    """Runs every route (but PLAN_SKIPPED_ROUTES) once and returns a sorted list of tuples (template, table, statement)
+    of the filtered SELECTs whose EXPLAIN QUERY PLAN reads a whole table outside of SMALL_TABLES"""
+    client = TestClient(app, raise_server_exceptions=False)
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and _WHERE_RE.search(statement):
+            statements.append((statement, parameters))
+
+    res = set()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        for template in routes or get_routes(app):
+            url = fill_path(template, params)
+            if (match and match not in template) or url is None or template in PLAN_SKIPPED_ROUTES:
+                continue
+
+            del statements[:]
+            _get(client, url, warm=False)
+
+            for (statement, parameters) in statements:
+                for table in _scanned_tables(engine, statement, parameters):
+                    res.add((template, table, qs.fingerprint(statement)))
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    return sorted(res)
+
+def _scanned_tables(engine, statement: str, parameters):
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        details = [row[-1] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+    found = [_SCAN_RE.match(d) for d in details]
+    return {m.group(1) for m in found if m and m.group(1) not in SMALL_TABLES}
+
+### Concurrency ###
+def concurrency(db_url: str, pragmas: dict, readers: int = 4, writers: int = 1, seconds: float = 5.0):
+    """Runs reader and writer processes (like gunicorn workers) against the same DB for some seconds.
+    Returns a dict of {reads_per_s, read_p50_ms, read_p95_ms, writes_per_s, write_p95_ms, errors}"""
+    # The journal mode is a property of the DB file, switch it before anyone else connects
+    setup = create_engine(db_url)
+    with setup.connect() as conn:
+        conn.execute(text(f"PRAGMA journal_mode={pragmas.get('journal_mode') or 'DELETE'}"))
+    setup.dispose()
+
+    queue = multiprocessing.Queue()
+    start = multiprocessing.Event()
+    procs = [
+        multiprocessing.Process(target=_concurrency_worker, args=(db_url, pragmas, kind, seconds, start, queue))
+        for kind in ["read"] * readers + ["write"] * writers
+    ]
+    for p in procs:
+        p.start()
+    start.set()
+
+    timings = {"read": [], "write": []}
+    errors = 0
+    for _ in procs:
+        kind, worker_timings, worker_errors = queue.get()
+        timings[kind] += worker_timings
+        errors += worker_errors
+    for p in procs:
+        p.join()
+
+    res = {"errors": errors}
+    for kind in ("read", "write"):
+        res[f"{kind}s_per_s"] = round(len(timings[kind]) / seconds, 1)
+        res[f"{kind}_p50_ms"] = round(percentile(timings[kind], 50), 3) if timings[kind] else None
+        res[f"{kind}_p95_ms"] = round(percentile(timings[kind], 95), 3) if timings[kind] else None
+
+    return res
+
+def _concurrency_worker(db_url, pragmas, kind, seconds, start, queue):
+    engine = create_engine(db_url, connect_args={"check_same_thread":False})
+    event.listen(engine, "connect", lambda dbapi_conn, connection_record: database.apply_pragmas(dbapi_conn, pragmas))
+
+    db = Session(bind=engine)
+    ids = [i for (i,) in db.query(Training.id).order_by(Training.id).limit(1000)] or [0]
+    timings, errors = [], 0
+
+    start.wait()
+    deadline = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < deadline:
+        t = time.perf_counter()
+        try:
+            if kind == "read":
+                # Dashboard style aggregate plus a table read
+                agg.count_by_cert_name(db)
+                db.query(Training).filter(Training.emp_id == ids[n % len(ids)] % 100).all()
+                db.rollback()
+            else:
+                # Same rows written back, the DB content does not change
+                db.query(Training).filter(Training.id.in_(ids[:50])).update(
+                    {Training.remark: Training.remark}, synchronize_session=False
+                )
+                db.commit()
+            timings.append((time.perf_counter() - t) * 1000)
+        except OperationalError:
+            db.rollback()
+            errors += 1
+        n += 1
+
+    db.close()
+    engine.dispose()
+    queue.put((kind, timings, errors))
+
+### MRPT Parser ###
+def write_mrpt_workbook(filepath: str, year: int = 2021, months: int = 12, filler_rows: int = 5000, seed: int = 0, sheets: int = 1):
+    """Writes a synthetic MRPT workbook: an MTD Actual / MTD Budget / Variance column triple per month,
+    YTD columns for the last month and December, and the budget entry rows spread between filler GL rows.
+    With several sheets, each one holds the next year ('MRPT', 'MRPT 2022', ...)"""
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook(write_only=True)
+
+    for sheet_year in range(year, year + sheets):
+        month_labels = [datetime.date(sheet_year, m, 1).strftime("%b %Y") for m in range(1, months + 1)]
+        dec_label = datetime.date(sheet_year, 12, 1).strftime("%b %Y")
+
+        headers = [None, None]
+        labels  = [None, None]
+        for m in month_labels:
+            headers += ["MTD Actual", "MTD Budget", "Variance"]
+            labels  += [m, m, m]
+        headers += ["YTD Actual", "YTD Budget", "YTD Budget"]
+        labels  += [month_labels[-1], month_labels[-1], dec_label]
+
+        ws = wb.create_sheet(pm.MRPT_SHEET if sheet_year == year else f"{pm.MRPT_SHEET} {sheet_year}")
+        ws.append(["Management Report", f"FY{sheet_year}"])
+        ws.append([])
+        ws.append(headers)
+        ws.append(labels)
+
+        entry_every = max(filler_rows // len(pm.BUDGET_ENTRIES), 1)
+        entries = list(pm.BUDGET_ENTRIES)
+        for i in range(filler_rows):
+            if i % entry_every == 0 and entries:
+                label = entries.pop(0)
+            else:
+                label = f"GL {100000 + i} Sundry"
+            ws.append([f"{100000 + i}", label] + [rng.randint(0, 10**9) for _ in range(len(headers) - 2)])
+        for label in entries:
+            ws.append([None, label] + [rng.randint(0, 10**9) for _ in range(len(headers) - 2)])
+
+    wb.save(filepath)
+
+def time_mrpt(filepath: str, repeat: int = 3):
+    """Returns a tuple ({engine: best_seconds}, same_result) of both parse engines on the file"""
+    times, results = {}, {}
+    for engine in ("pandas", "stream"):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results[engine] = pm.parse_excel_to_budgets(filepath, engine=engine)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        times[engine] = best
+
+    # The pandas engine leaves its slim copy next to the file
+    slim = os.path.splitext(filepath)[0] + "_slim.xlsx"
+    if os.path.exists(slim):
+        os.remove(slim)
+
+    return times, results["pandas"] == results["stream"]
+
+def time_mrpt_by_year(filepath: str, repeat: int = 3, workers: int = None):
+    """Returns a tuple ({"serial"/"pool": best_seconds}, same_result) of parse_excel_by_year on the file,
+    the pool one started beforehand"""
+    workers = workers or os.cpu_count() or 1
+    times, results = {}, {}
+    max_workers = pm.MAX_WORKERS
+
+    try:
+        for label, n in (("serial", 1), ("pool", workers)):
+            pm.MAX_WORKERS = n
+            if n > 1:
+                pm._get_pool().submit(int).result() # Spawning the workers is not timed
+
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                results[label] = pm.parse_excel_by_year(filepath)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            times[label] = best
+    finally:
+        pm.MAX_WORKERS = max_workers
+
+    return times, results["serial"] == results["pool"]
@@ -0,0 +1,169 @@
+import datetime
+import functools
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from itertools import chain
+from fastapi import Depends, Request, Response, status
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from models import TableVersion
+from database import get_db
+
+# Max number of cached responses kept per worker, least recently used ones are evicted first
+MAX_ENTRIES = int(os.getenv("PPA_CACHE_MAX_ENTRIES", "256"))
+
+_TOUCHED_KEY = "touched_tables"
+
+_lock    = threading.Lock()
+_entries = OrderedDict()
+_stats   = {"hits": 0, "misses": 0, "evictions": 0}
+
+### Response Cache ###
+def cached(*models):
+    """Caches the endpoint's response per parameters until one of the given models' tables is written to.
+    Versions live in the DB so a write from any worker invalidates every worker's entries"""
+    tables = tuple(sorted(m.__tablename__ for m in models))
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            db = kwargs["db"]
+            key = (func.__module__, func.__code__.co_firstlineno, tuple(sorted((k, v) for k, v in kwargs.items() if k != "db")))
+
+            # Versions are read before computing, a write racing the computation only makes the entry stale sooner
+            versions = get_versions(tables, db)
+
+            found, value = _get(key, versions)
+            if found:
+                return value
+
+            value = func(*args, **kwargs)
+            _put(key, versions, value)
+
+            return value
+
+        return wrapper
+
+    return decorator
+
+def get_stats():
+    with _lock:
+        return dict(_stats, size=len(_entries), max_entries=MAX_ENTRIES)
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+def _get(key, versions):
+    with _lock:
+        entry = _entries.get(key)
+
+        if entry is None or entry[0] != versions:
+            _stats["misses"] += 1
+            return False, None
+
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        return True, entry[1]
+
+def _put(key, versions, value):
+    with _lock:
+        _entries[key] = (versions, value)
+        _entries.move_to_end(key)
+
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+
+### Conditional GET ###
+class NotModified(Exception):
+    def __init__(self, etag: str):
+        self.etag = etag
+
+def etag(*models, daily: bool = False):
+    """Returns a route dependency setting an ETag built from the versions of the models' tables,
+    raising NotModified (answered as 304) when it matches the request's If-None-Match.
+    Use daily=True for responses that also depend on today's date (ages, years of experience)"""
+    tables = tuple(sorted(m.__tablename__ for m in models))
+
+    def dependency(request: Request, response: Response, db: Session = Depends(get_db)):
+        raw = f"{request.url.path}?{request.url.query}|{get_versions(tables, db)}"
+        if daily:
+            raw += f"|{datetime.date.today()}"
+
+        tag = f'W/"{hashlib.sha1(raw.encode()).hexdigest()[:20]}"'
+
+        if _matches(tag, request.headers.get("if-none-match")):
+            raise NotModified(tag)
+
+        response.headers["ETag"] = tag
+
+    return dependency
+
+def not_modified_handler(request: Request, exc: NotModified):
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": exc.etag})
+
+def _matches(tag: str, if_none_match: str):
+    if not if_none_match:
+        return False
+
+    candidates = [t.strip() for t in if_none_match.split(",")]
+    # Weak comparison, W/"x" and "x" are the same
+    return "*" in candidates or _opaque(tag) in [_opaque(c) for c in candidates]
+
+def _opaque(tag: str):
+    return tag[2:] if tag.startswith("W/") else tag
+
+### Table Versions ###
+def get_versions(tables, db: Session):
+    """Returns a tuple of the current version of each table, 0 for never written tables"""
+    rows = db.query(TableVersion.name, TableVersion.version).filter(TableVersion.name.in_(tables)).all()
+    found = dict(rows)
+
+    return tuple(found.get(t, 0) for t in tables)
+
+def bump_versions(tables, db: Session):
+    stmt = insert(TableVersion).values([{"name": t, "version": 1} for t in sorted(tables)])
+    stmt = stmt.on_conflict_do_update(index_elements=["name"], set_={"version": TableVersion.version + 1})
+
+    db.execute(stmt)
+
+def install(session_factory):
+    """Bumps the version of every table written by sessions made by session_factory, in the same transaction as the write"""
+    event.listen(session_factory, "after_flush", _track_flush)
+    event.listen(session_factory, "after_bulk_update", _track_bulk)
+    event.listen(session_factory, "after_bulk_delete", _track_bulk)
+    event.listen(session_factory, "do_orm_execute", _track_execute)
+    event.listen(session_factory, "before_commit", _bump_touched)
+    event.listen(session_factory, "after_rollback", _forget_touched)
+
+def _track_flush(session, flush_context):
+    touched = session.info.setdefault(_TOUCHED_KEY, set())
+
+    for obj in chain(session.new, session.dirty, session.deleted):
+        touched.add(obj.__table__.name)
+
+def _track_bulk(ctx):
+    ctx.session.info.setdefault(_TOUCHED_KEY, set()).add(ctx.mapper.local_table.name)
+
+def _track_execute(orm_execute_state):
+    # insert()/update()/delete() statements ran with session.execute(), e.g. upserts
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = orm_execute_state.statement.table
+        if table.name != TableVersion.__tablename__:
+            orm_execute_state.session.info.setdefault(_TOUCHED_KEY, set()).add(table.name)
+
+def _bump_touched(session):
+    session.flush()
+    touched = session.info.pop(_TOUCHED_KEY, set())
+    touched.discard(TableVersion.__tablename__)
+
+    if touched:
+        bump_versions(touched, session)
+
+def _forget_touched(session):
+    session.info.pop(_TOUCHED_KEY, None)
@@ -1,18 +1,111 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 SQLALCHEMY_DB_URL = 'sqlite:///data/database.db'
 
+# Pragmas applied on every new connection. Each one can be overridden with PPA_SQLITE_<NAME> (e.g. PPA_SQLITE_JOURNAL_MODE=DELETE),
+# an empty value skips it, PPA_SQLITE_TUNING=0 skips them all (WAL stays on for a DB file once set, use PPA_SQLITE_JOURNAL_MODE=DELETE).
+# WAL lets readers of every gunicorn worker go on while one of them writes, busy_timeout makes writers wait for the lock instead of failing
+_PRAGMA_DEFAULTS = {
+    "journal_mode"  : "WAL",
+    "busy_timeout"  : "5000",       # ms
+    "synchronous"   : "NORMAL",     # Safe with WAL, only the last commits can be lost on power loss
+    "mmap_size"     : "268435456",  # 256 MiB
+    "cache_size"    : "-65536",     # 64 MiB, negative values are KiB
+    "temp_store"    : "MEMORY",
+}
+
+SQLITE_PRAGMAS = {} if os.getenv("PPA_SQLITE_TUNING", "1") == "0" else {
+    name: os.getenv(f"PPA_SQLITE_{name.upper()}", default) for name, default in _PRAGMA_DEFAULTS.items()
+}
+
+def apply_pragmas(dbapi_conn, pragmas: dict = None):
+    """Runs the PRAGMA statements on a raw sqlite3 connection, SQLITE_PRAGMAS by default"""
+    cursor = dbapi_conn.cursor()
+    try:
+        for name, value in (SQLITE_PRAGMAS if pragmas is None else pragmas).items():
+            if value != "":
+                cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
 engine = create_engine(SQLALCHEMY_DB_URL, connect_args={"check_same_thread":False})
+event.listen(engine, "connect", lambda dbapi_conn, connection_record: apply_pragmas(dbapi_conn))
 
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
 Base = declarative_base()
 
+# Indexes replaced by others of Base.metadata, dropped from existing DB files at startup
+OBSOLETE_INDEXES = [
+    "ix_monthlybudgets_year_month",         # By uq_monthlybudgets_year_month
+    "ix_monthlyactualbudgets_year_month",   # By uq_monthlyactualbudgets_year_month
+]
+
+def create_missing_indexes():
+    """create_all() leaves the tables that already exist untouched, creates the indexes added to them since
+    and drops OBSOLETE_INDEXES"""
+    with engine.begin() as conn:
+        for name in OBSOLETE_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except IntegrityError:
+                if not index.unique:
+                    raise
+
+                # Upserts need the unique index (ON CONFLICT), refuses to start rather than picking which rows to delete
+                columns = [c.name for c in index.columns]
+                dups = find_duplicates(table.name, columns)
+                keys = "; ".join(f"{key} (ids {', '.join(str(r['id']) for r in rows)})" for key, rows in list(dups.items())[:20])
+                raise RuntimeError(
+                    f"Unique index {index.name} can't be created, {len(dups)} key(s) of {table.name} over ({', '.join(columns)}) "
+                    f"are held by several rows: {keys}. List and remove them with python -m dedupe from the app folder"
+                ) from None
+
+def unique_indexes():
+    """(table name, index name, column names) of the unique indexes of Base.metadata"""
+    return [
+        (table.name, index.name, [c.name for c in index.columns])
+        for table in Base.metadata.sorted_tables for index in table.indexes if index.unique
+    ]
+
+def find_duplicates(table: str, columns: list):
+    """Rows of table sharing the same values of columns, as {key tuple: [row dicts by id]}. NULLs never conflict"""
+    cols = ", ".join(columns)
+    not_null = " AND ".join(f"t.{c} IS NOT NULL" for c in columns)
+    same_key = " AND ".join(f"d.{c} = t.{c}" for c in columns)
+
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            f"SELECT t.* FROM {table} t "
+            f"JOIN (SELECT {cols} FROM {table} GROUP BY {cols} HAVING count(*) > 1) d ON {same_key} "
+            f"WHERE {not_null} ORDER BY {', '.join(f't.{c}' for c in columns)}, t.id"
+        )).mappings().all()
+
+    dups = {}
+    for row in rows:
+        dups.setdefault(tuple(row[c] for c in columns), []).append(dict(row))
+    return dups
+
+def delete_rows(table: str, ids: list):
+    """Deletes the rows of table by id, returns how many were"""
+    if not ids:
+        return 0
+
+    with engine.begin() as conn:
+        res = conn.execute(text(f"DELETE FROM {table} WHERE id IN ({', '.join(str(int(i)) for i in ids)})"))
+    return res.rowcount
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,38 @@
+# Fills the database with synthetic data, run from the app folder:
+# python -m datagen --divisions 50 --employees 20000 --years 10 --seed 0
+import argparse
+
+import models
+from database import engine, SessionLocal
+from aggregator import summary_module as summ
+from cache import cache_module as cache
+from datagen import datagen_module as datagen
+
+parser = argparse.ArgumentParser(prog="python -m datagen", description="Generates a deterministic synthetic organization")
+parser.add_argument("--divisions", type=int, default=6)
+parser.add_argument("--employees", type=int, default=300)
+parser.add_argument("--years", type=int, default=3, help="the last year is the current one, earlier years go to the history tables")
+parser.add_argument("--first-year", type=int, default=2021)
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--proof-files", action="store_true", help="also write placeholder proof files under data/files")
+parser.add_argument("--reset", action="store_true", help="drop every table first")
+args = parser.parse_args()
+
+if args.reset:
+    models.Base.metadata.drop_all(engine)
+models.Base.metadata.create_all(engine)
+
+db = SessionLocal()
+try:
+    counts = datagen.generate(
+        db, divisions=args.divisions, employees=args.employees, years=args.years, first_year=args.first_year,
+        seed=args.seed, proof_files=args.proof_files
+    )
+    summ.rebuild(db)
+    cache.bump_versions([t for t in counts if t in models.Base.metadata.tables], db)
+    db.commit()
+finally:
+    db.close()
+
+for table, count in sorted(counts.items()):
+    print(f"{table:<40}{count:>10}")
@@ -0,0 +1,380 @@
+import datetime
+import hashlib
+import os
+import random
+from sqlalchemy.orm import Session
+
+import hashing
+from models import *
+from fileio import fileio_module as fio
+
+# Synthetic organization data for load and benchmark testing.
+# The output only depends on the parameters: same seed and scale, same rows (and proof files) every time.
+
+DIV_NAMES       = ["WBGM", "RBA", "BRDS", "TAD", "PPA", "IAH"]
+ROLES           = ["User", "Power User", "Administrator"]
+ATTR_TYPES      = ["Join", "Resign", "Transfer In", "Transfer Out"]
+ENG_TYPES       = ["Regular Meeting", "Workshop"]
+SOCIAL_TYPES    = ["Audit News", "MyUOB", "Audit Bulletin"]
+PRJ_STATUSES    = ["Not Started", "Planning", "Fieldwork", "Reporting", "Sign-off", "Completed"]
+QA_TYPES        = ["Plan - Regular", "Plan - Thematic", "Regulatory", "Special Review", "-"]
+QA_RESULTS      = ["Generally Conforms", "Partially Conforms", "Does Not Conform", "-"]
+
+PRO_CERTS       = ["CISA", "CEH", "ISO27001", "CHFI", "QIA", "CIA", "CA", "CBIA", "CPA", "IDEA", "QualifiedIA"]
+SMR_CERTS       = ["SMR In Progress"] + [f"SMR Level {i}" for i in range(1, 6)]
+OTHER_CERTS     = ["CFE", "CRISC", "CISM", "PMP", "ITIL", "COBIT"]
+
+EDU_LEVELS      = ["Bachelor", "Master"]
+EDU_CATEGORIES  = ["Management/Economy", "Information Technology", "Others"]
+
+QAF_FLAGS = [c.name for c in QAIP.__table__.columns if c.name.startswith("qaf_")]
+CSF_SCORES = [f"atp_{i}" for i in range(1, 7)] + [f"ac_{i}" for i in range(1, 7)] + [f"paw_{i}" for i in range(1, 4)]
+BUDGET_COLUMNS = [
+    "staff_salaries", "staff_training_reg_meeting", "revenue_related", "it_related",
+    "occupancy_related", "other_transport_travel", "other_other", "indirect_expense"
+]
+
+# Rows per unit of scale
+CERTS_PER_EMP           = 3
+TRAININGS_PER_EMP       = 3
+MANDATORY_TRAININGS     = 10    # per year
+PROJECTS_PER_DIV        = 20    # per year
+CSFS_PER_PRJ            = 2
+JRT_PER_DIV             = 10    # per year
+ROTATIONS_PER_DIV       = 5     # per year
+BUSU_PER_EMP            = 0.3   # per year
+SOCIAL_PER_EMP          = 0.5   # per year
+
+_CHUNK = 5000
+
+def generate(db: Session, divisions: int = 6, employees: int = 300, years: int = 3, first_year: int = 2021,
+             seed: int = 0, proof_files: bool = False):
+    """Fills an empty database. The last year is the current one (live tables), previous years only exist as history rows,
+    like after running the year-end migration. Returns a dict of {table_name: rows_inserted}. Caller commits"""
+    if db.query(Employee.id).first() is not None:
+        raise ValueError("Database already has employees, generate into an empty database")
+
+    rng = random.Random(seed)
+    curr_year = first_year + years - 1
+    counts = {}
+
+    def insert(model, rows):
+        for i in range(0, len(rows), _CHUNK):
+            db.bulk_insert_mappings(model, rows[i:i+_CHUNK])
+        counts[model.__tablename__] = counts.get(model.__tablename__, 0) + len(rows)
+
+    ### Lookups ###
+    for model, names in [
+        (Role, ROLES), (AttrType, ATTR_TYPES), (EngagementType, ENG_TYPES), (SocialType, SOCIAL_TYPES),
+        (ProjectStatus, PRJ_STATUSES), (QAType, QA_TYPES), (QAGradingResult, QA_RESULTS)
+    ]:
+        insert(model, [{"id": i+1, "name": n} for i, n in enumerate(names)])
+
+    ### Divisions & Employees ###
+    divs = [_div_name(i) for i in range(divisions)]
+    emps = [_employee(rng, i+1, divisions) for i in range(employees)]
+
+    # First employees of each division head it
+    heads = {}
+    for e in emps:
+        heads.setdefault(e["div_id"], e["id"])
+
+    insert(Division, [
+        {"id": i+1, "short_name": d, "long_name": f"{d} Audit Division", "dh_id": heads.get(i+1)}
+        for i, d in enumerate(divs)
+    ])
+
+    pw = hashing.bcrypt("password")
+    for e in emps:
+        e["pw"] = pw
+    insert(Employee, emps)
+
+    certs = []
+    for e in emps:
+        for name in rng.sample(PRO_CERTS + SMR_CERTS + OTHER_CERTS, rng.randint(0, CERTS_PER_EMP * 2)):
+            proven = rng.random() < 0.8
+            path = _path(fio.CERTS_FOLDER, str(e["id"]), f"{name}.pdf") if proven else ""
+            certs.append({"id": len(certs)+1, "cert_name": name, "cert_proof": path, "emp_id": e["id"]})
+    insert(Certification, certs)
+
+    ### Yearly ###
+    yearly_attrs, train_budgets, targets = [], [], []
+    headcounts = {}
+    for e in emps:
+        headcounts[e["div_id"]] = headcounts.get(e["div_id"], 0) + 1
+
+    for y in range(first_year, curr_year+1):
+        for d in range(1, divisions+1):
+            hc = headcounts.get(d, 0)
+            yearly_attrs.append({"year": y, "start_headcount": max(hc, 1), "budget_headcount": hc + rng.randint(0, 5), "div_id": d})
+            # Past years' training budgets only live on as TrainingBudgetHistory
+            if y == curr_year:
+                train_budgets.append({"year": y, "budget": float(rng.randint(50, 500) * 1000000), "div_id": d})
+        for e in emps:
+            targets.append({"year": y, "target_hours": 40.0, "emp_id": e["id"]})
+    insert(YearlyAttrition, yearly_attrs)
+    insert(TrainingBudget, train_budgets)
+    insert(TrainingTarget, targets)
+
+    ### Budgets ###
+    yearly_budgets, monthly_budgets, monthly_actuals = [], [], []
+    for y in range(first_year, curr_year+1):
+        yearly_budgets.append(dict(year=y, **{c: float(rng.randint(1, 1000) * 1000000) for c in BUDGET_COLUMNS}))
+        for m in range(1, 13):
+            monthly_budgets.append(dict(year=y, month=m, **{c: float(rng.randint(1, 100) * 1000000) for c in BUDGET_COLUMNS}))
+            monthly_actuals.append(dict(year=y, month=m, remark="", **{c: float(rng.randint(1, 100) * 1000000) for c in BUDGET_COLUMNS}))
+    insert(YearlyBudget, yearly_budgets)
+    insert(MonthlyBudget, monthly_budgets)
+    insert(MonthlyActualBudget, monthly_actuals)
+
+    ### Current Year (live tables) ###
+    active_ids = [e["id"] for e in emps if e["active"]] or [e["id"] for e in emps]
+
+    trainings = []
+    for e in emps:
+        for _ in range(rng.randint(0, TRAININGS_PER_EMP * 2)):
+            trainings.append(_training(rng, len(trainings)+1, curr_year, e["id"]))
+    for _ in range(MANDATORY_TRAININGS):
+        trainings.append(_training(rng, len(trainings)+1, curr_year, 0))
+    insert(Training, trainings)
+
+    prjs, qaips, csfs = [], [], []
+    for d in range(1, divisions+1):
+        for _ in range(PROJECTS_PER_DIV):
+            prj_id = len(prjs)+1
+            done = rng.random() < 0.5
+            prjs.append({
+                "id": prj_id, "name": f"Audit {divs[d-1]} #{prj_id}", "year": curr_year,
+                "used_DA": rng.random() < 0.5, "is_carried_over": rng.random() < 0.2, "timely_report": rng.random() < 0.7,
+                "completion_PA": _path(fio.PA_CMPLT_FOLDER, f"{prj_id}.pdf") if done else "",
+                "status_id": 6 if done else rng.randint(1, 5), "div_id": d, "tl_id": rng.choice(active_ids)
+            })
+            qaips.append(_qaip(rng, prj_id))
+            for _ in range(rng.randint(0, CSFS_PER_PRJ * 2)):
+                csfs.append(_csf(rng, prj_id, curr_year, divisions))
+    insert(Project, prjs)
+    insert(QAIP, qaips)
+    insert(CSF, csfs)
+
+    jrts, rots = [], []
+    for d in range(1, divisions+1):
+        for _ in range(JRT_PER_DIV):
+            jrts.append({
+                "type_id": rng.randint(1, len(ATTR_TYPES)), "staff_name": _person_name(rng), "staff_nik": str(rng.randint(100000, 999999)),
+                "date": _date_in(rng, curr_year), "div_id": d
+            })
+        for _ in range(ROTATIONS_PER_DIV if divisions > 1 else 0):
+            to_div = rng.choice([x for x in range(1, divisions+1) if x != d])
+            rots.append({
+                "staff_name": _person_name(rng), "staff_nik": str(rng.randint(100000, 999999)),
+                "date": _date_in(rng, curr_year), "from_div_id": d, "to_div_id": to_div
+            })
+    insert(AttritionJoinResignTransfer, jrts)
+    insert(AttritionRotation, rots)
+
+    busus, socials = [], []
+    for _ in range(int(employees * BUSU_PER_EMP)):
+        busu_id = len(busus)+1
+        creator = rng.choice(active_ids)
+        busus.append({
+            "id": busu_id, "activity_name": f"Engagement #{busu_id}", "date": _date_in(rng, curr_year),
+            "proof": _path(fio.BUSU_ENG_FOLDER, str(creator), f"{busu_id}.pdf"),
+            "eng_type_id": rng.randint(1, len(ENG_TYPES)), "creator_id": creator
+        })
+    for _ in range(int(employees * SOCIAL_PER_EMP)):
+        socials.append({
+            "date": _date_in(rng, curr_year), "topic_name": f"Topic #{len(socials)+1}",
+            "creator_id": rng.choice(active_ids), "social_type_id": rng.randint(1, len(SOCIAL_TYPES))
+        })
+    insert(BUSUEngagement, busus)
+    insert(SocialContrib, socials)
+
+    ### Previous Years (history tables) ###
+    emp_by_id = {e["id"]: e for e in emps}
+    certs_by_emp = {}
+    for c in certs:
+        certs_by_emp.setdefault(c["emp_id"], []).append(c)
+
+    for y in range(first_year, curr_year):
+        _history_year(rng, y, divs, emps, emp_by_id, certs_by_emp, heads, insert)
+
+    ### Proof Files ###
+    if proof_files:
+        paths  = [c["cert_proof"] for c in certs] + [t["proof"] for t in trainings]
+        paths += [p["completion_PA"] for p in prjs] + [b["proof"] for b in busus]
+        counts["proof_files"] = _write_proof_files([p for p in paths if p])
+
+    return counts
+
+def _history_year(rng, year, divs, emps, emp_by_id, certs_by_emp, heads, insert):
+    insert(DivisionHistory, [{
+        "year": year, "short_name": d, "long_name": f"{d} Audit Division",
+        "dh_name": emp_by_id[heads[i+1]]["name"] if i+1 in heads else None,
+        "dh_nik": emp_by_id[heads[i+1]]["staff_id"] if i+1 in heads else None,
+    } for i, d in enumerate(divs)])
+
+    # Employee snapshots get explicit ids so their certs can point to them
+    first_id = year * 1000000
+    emp_hs, cert_hs = [], []
+    for e in emps:
+        emp_h = {k: e[k] for k in (
+            "name", "email", "staff_id", "div_stream", "corporate_title", "corporate_grade", "gender",
+            "edu_level", "edu_major", "edu_category", "ia_background", "ea_background", "year_audit_non_uob",
+            "date_of_birth", "date_first_employment", "date_first_uob", "date_first_ia", "active"
+        )}
+        emp_h.update(id=first_id + e["id"], year=year, role=ROLES[e["role_id"]-1], division=divs[e["div_id"]-1])
+        emp_hs.append(emp_h)
+
+        for c in certs_by_emp.get(e["id"], []):
+            cert_hs.append({"cert_name": c["cert_name"], "cert_proof": "", "emp_id": emp_h["id"]})
+    insert(EmployeeHistory, emp_hs)
+    insert(CertHistory, cert_hs)
+
+    insert(TrainingBudgetHistory, [
+        {"year": year, "budget": float(rng.randint(50, 500) * 1000000), "division": d} for d in divs
+    ])
+
+    insert(TrainingHistory, [{
+        "year": year, "nik": e["staff_id"], "division": divs[e["div_id"]-1], "emp_name": e["name"],
+        "name": rng.choice(_TRAINING_NAMES), "date": _date_in(rng, year), "hours": rng.randint(1, 16),
+        "budget": 0.0, "realized": float(rng.randint(0, 20) * 100000), "charged": 0.0,
+        "mandatory": "", "remark": "", "proof": ""
+    } for e in emps for _ in range(rng.randint(0, TRAININGS_PER_EMP * 2))])
+
+    prj_hs, csf_hs, qa_hs = [], [], []
+    for i, d in enumerate(divs):
+        for n in range(PROJECTS_PER_DIV):
+            tl = rng.choice(emps)
+            p_name = f"Audit {d} {year} #{n+1}"
+            prj_hs.append({
+                "year": year, "p_name": p_name, "div": d, "tl_name": tl["name"], "tl_nik": tl["staff_id"],
+                "status": rng.choice(PRJ_STATUSES), "use_da": rng.random() < 0.5, "carried_over": rng.random() < 0.2,
+                "timely": rng.random() < 0.7, "pa_proof": None
+            })
+            qa_hs.append({
+                "year": year, "qa_type": rng.choice(QA_TYPES), "p_name": p_name, "tl_name": tl["name"], "division": d,
+                "div_head": emp_by_id[heads[i+1]]["name"] if i+1 in heads else None,
+                "qa_grading_result": rng.choice(QA_RESULTS), "qaf_category": "", "qaf_stage": "", "qaf_deliv": "",
+                "issue_count": 0, "qa_sample": rng.random() < 0.3
+            })
+            for _ in range(rng.randint(0, CSFS_PER_PRJ * 2)):
+                csf_h = {
+                    "year": year, "p_name": p_name, "tl_name": tl["name"], "client_name": _person_name(rng),
+                    "client_unit": "Business Unit", "date": _date_in(rng, year), "division": d,
+                    "division_by_inv": rng.choice(divs)
+                }
+                csf_h.update({s: float(rng.randint(1, 4)) for s in CSF_SCORES})
+                csf_hs.append(csf_h)
+    insert(ProjectHistory, prj_hs)
+    insert(QAResultHistory, qa_hs)
+    insert(CSFHistory, csf_hs)
+
+    attr_hs, jrt_hs, rot_hs = [], [], []
+    for d in divs:
+        counts = [rng.randint(0, JRT_PER_DIV) for _ in range(6)]
+        attr_hs.append(dict(
+            year=year, division=d, hc_budget=len(emps) // len(divs) + 5, hc_start=len(emps) // len(divs),
+            **dict(zip(["join", "resign", "r_in", "r_out", "t_in", "t_out"], counts))
+        ))
+        for _ in range(JRT_PER_DIV):
+            jrt_hs.append({
+                "year": year, "emp_name": _person_name(rng), "emp_nik": str(rng.randint(100000, 999999)),
+                "category": rng.choice(ATTR_TYPES), "date": _date_in(rng, year), "division": d
+            })
+        for _ in range(ROTATIONS_PER_DIV):
+            rot_hs.append({
+                "year": year, "emp_name": _person_name(rng), "emp_nik": str(rng.randint(100000, 999999)),
+                "date": _date_in(rng, year), "from_div": d, "to_div": rng.choice(divs)
+            })
+    insert(AttritionMainTableHistory, attr_hs)
+    insert(AttritionJRTTableHistory, jrt_hs)
+    insert(AttritionRotationTableHistory, rot_hs)
+
+    busu_hs, social_hs = [], []
+    for _ in range(int(len(emps) * BUSU_PER_EMP)):
+        e = rng.choice(emps)
+        busu_hs.append({
+            "year": year, "tl_name": e["name"], "division": divs[e["div_id"]-1], "WorM": rng.choice(ENG_TYPES),
+            "name": f"Engagement {year} #{len(busu_hs)+1}", "date": _date_in(rng, year), "proof": None
+        })
+    for _ in range(int(len(emps) * SOCIAL_PER_EMP)):
+        e = rng.choice(emps)
+        social_hs.append({
+            "year": year, "div": divs[e["div_id"]-1], "category": rng.choice(SOCIAL_TYPES),
+            "sc_name": f"Topic {year} #{len(social_hs)+1}", "date": _date_in(rng, year),
+            "creator_name": e["name"], "creator_nik": e["staff_id"]
+        })
+    insert(BUSUHistory, busu_hs)
+    insert(SocialContribHistory, social_hs)
+
+### Rows ###
+_FIRST_NAMES = ["Andi", "Budi", "Citra", "Dewi", "Eka", "Fajar", "Gita", "Hadi", "Indah", "Joko", "Kartika", "Lestari"]
+_LAST_NAMES  = ["Santoso", "Wijaya", "Pratama", "Saputra", "Hidayat", "Kusuma", "Nugroho", "Halim", "Tan", "Lim"]
+_TRAINING_NAMES = ["Data Analytics", "IT Audit Fundamentals", "Risk Based Auditing", "AML Refresher", "Fraud Detection", "Leadership"]
+
+def _div_name(index: int):
+    return DIV_NAMES[index] if index < len(DIV_NAMES) else f"DIV{index+1:03d}"
+
+def _person_name(rng):
+    return f"{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)}"
+
+def _date_in(rng, year: int):
+    return datetime.date(year, 1, 1) + datetime.timedelta(days=rng.randint(0, 364))
+
+def _employee(rng, emp_id: int, divisions: int):
+    dob = datetime.date(rng.randint(1965, 2000), rng.randint(1, 12), rng.randint(1, 28))
+    first_emp = dob + datetime.timedelta(days=365 * rng.randint(21, 25))
+    first_uob = first_emp + datetime.timedelta(days=rng.randint(0, 365 * 5))
+
+    return {
+        "id": emp_id, "name": f"{_person_name(rng)} {emp_id}", "email": f"emp{emp_id}@example.com",
+        "staff_id": str(100000 + emp_id), "div_stream": rng.choice(["Audit", "IT Audit", "Data Analytics"]),
+        "corporate_title": rng.choice(["Officer", "Manager", "Senior Manager", "VP"]),
+        "corporate_grade": rng.choice(["E", "F", "G", "H"]),
+        "date_of_birth": dob, "date_first_employment": first_emp, "date_first_uob": first_uob, "date_first_ia": first_uob,
+        "gender": rng.choice(["M", "F"]), "year_audit_non_uob": rng.randint(0, 10),
+        "edu_level": rng.choice(EDU_LEVELS), "edu_major": "Accounting", "edu_category": rng.choice(EDU_CATEGORIES),
+        "ia_background": rng.random() < 0.5, "ea_background": rng.random() < 0.3, "active": rng.random() < 0.95,
+        "div_id": rng.randint(1, divisions), "role_id": rng.choice([1, 1, 1, 2, 3]),
+    }
+
+def _training(rng, train_id: int, year: int, emp_id: int):
+    budget = float(rng.randint(0, 20) * 100000)
+
+    return {
+        "id": train_id, "name": rng.choice(_TRAINING_NAMES), "date": _date_in(rng, year),
+        "duration_hours": float(rng.randint(1, 16)),
+        "proof": _path(fio.TRAIN_PROOF_FOLDER, str(emp_id), f"{train_id}.pdf") if emp_id and rng.random() < 0.7 else "",
+        "budget": budget if emp_id == 0 else 0.0, "realization": budget * rng.random(), "charged_by_fin": budget * rng.random(),
+        "remark": "", "mandatory_from": "Regulator" if emp_id == 0 else "", "emp_id": emp_id
+    }
+
+def _qaip(rng, prj_id: int):
+    row = {"prj_id": prj_id, "qa_type_id": rng.randint(1, 4), "qa_grading_result_id": rng.randint(1, 3), "qa_sample": rng.random() < 0.3}
+    row.update({f: rng.random() < 0.2 for f in QAF_FLAGS})
+
+    return row
+
+def _csf(rng, prj_id: int, year: int, divisions: int):
+    row = {
+        "client_name": _person_name(rng), "client_unit": "Business Unit", "csf_date": _date_in(rng, year),
+        "prj_id": prj_id, "by_invdiv_div_id": rng.randint(1, divisions)
+    }
+    row.update({s: float(rng.randint(1, 4)) for s in CSF_SCORES})
+
+    return row
+
+### Files ###
+def _path(*parts):
+    return os.path.join(fio.DATA_FOLDER, fio.FILES_FOLDER, *parts)
+
+def _write_proof_files(paths):
+    for p in paths:
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+
+        # Small deterministic placeholder, up to ~20 KiB
+        digest = hashlib.sha1(p.encode()).digest()
+        with open(p, 'wb') as f:
+            f.write(digest * (1 + digest[0] * 4))
+
+    return len(paths)
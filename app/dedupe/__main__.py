@@ -0,0 +1,60 @@
+# Lists the rows keeping a unique index from being created at startup, run from the app folder:
+# python -m dedupe                                      reports every duplicate key with its rows, deletes nothing
+# python -m dedupe --table monthlybudgets --drop 12 15  deletes those rows, picked from the report
+# python -m dedupe --keep lowest                        deletes all but the lowest (or highest) id of each duplicate key
+# Upserts update a row in place, so the highest id isn't the last written one: compare the figures before using --keep
+import argparse
+import sys
+
+import models
+from database import engine, unique_indexes, find_duplicates, delete_rows
+
+parser = argparse.ArgumentParser(prog="python -m dedupe", description="Reports, and on request deletes, the duplicate rows of unique indexes")
+parser.add_argument("--table", help="only this table, required by --drop")
+parser.add_argument("--drop", type=int, nargs="+", metavar="ID", help="ids of the rows to delete")
+parser.add_argument("--keep", choices=["lowest", "highest"], help="keep this id of each duplicate key, delete the others")
+args = parser.parse_args()
+
+if args.drop and args.keep:
+    parser.error("--drop and --keep can't be combined")
+if args.drop and not args.table:
+    parser.error("--drop needs --table, ids are per table")
+
+models.Base.metadata.create_all(engine)
+
+found = False
+for table, index, columns in unique_indexes():
+    if args.table and table != args.table:
+        continue
+
+    dups = find_duplicates(table, columns)
+    if not dups:
+        continue
+    found = True
+
+    print(f"{table} ({index} over {', '.join(columns)}): {len(dups)} duplicate key(s)")
+    for key, rows in dups.items():
+        print(f"  {key}")
+        for row in rows:
+            print(f"    {row}")
+
+    if args.drop:
+        dup_ids = {row["id"] for rows in dups.values() for row in rows}
+        unknown = sorted(set(args.drop) - dup_ids)
+        if unknown:
+            sys.exit(f"Rows {unknown} of {table} aren't duplicates, nothing deleted")
+
+        emptied = [key for key, rows in dups.items() if all(row["id"] in args.drop for row in rows)]
+        if emptied:
+            sys.exit(f"--drop would delete every row of {emptied}, keep one of each, nothing deleted")
+
+        print(f"Deleted {delete_rows(table, args.drop)} row(s) of {table}")
+    elif args.keep:
+        pick = min if args.keep == "lowest" else max
+        ids = [row["id"] for rows in dups.values() for row in rows if row["id"] != pick(r["id"] for r in rows)]
+        print(f"Deleted {delete_rows(table, ids)} row(s) of {table}, ids {ids}")
+
+if not found:
+    print("No duplicate rows")
+elif not (args.drop or args.keep):
+    print("Nothing deleted, pick the rows with --table/--drop or --keep")
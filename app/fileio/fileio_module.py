@@ -1,12 +1,21 @@
+import hashlib
+import mimetypes
 import os
+import re
 import shutil
 import pathlib
+import tempfile
 from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import HTTPException, Request, status
+from fastapi.responses import FileResponse, Response, StreamingResponse
 
 DATA_FOLDER     = 'data'
 
 FILES_FOLDER    = 'files'
 HISTORY_FOLDER  = 'history'
+CACHE_FOLDER    = 'cache'
+BLOBS_FOLDER    = 'blobs'
 
 CERTS_FOLDER    = 'certs'
 BUDGET_FOLDER   = 'budget'
@@ -14,183 +23,143 @@ TRAIN_PROOF_FOLDER = 'trainings'
 BUSU_ENG_FOLDER = 'busu'
 PA_CMPLT_FOLDER = 'pa_completion'
 
-
+# Uploads are copied CHUNK_SIZE bytes at a time, the ones bigger than MAX_UPLOAD_BYTES are refused
+CHUNK_SIZE          = 1024 * 1024
+MAX_UPLOAD_BYTES    = int(os.getenv("PPA_MAX_UPLOAD_MB", "50")) * 1024 * 1024
 
 def is_file_exist(filepath:str):
     return os.path.isfile(filepath)
 
-def write_pa_completion_proof(prj_id, data, filename):
-    dir_name = os.path.join(DATA_FOLDER, FILES_FOLDER, PA_CMPLT_FOLDER)
-    os.makedirs(dir_name, exist_ok=True)
-
-    new_fname = f"{prj_id}.{filename.split('.')[-1]}"
-
-    # Check if cert with same name exist
-    for (idirpath, dirnames, filenames) in os.walk(dir_name):
-        for fname in filenames:
-            if fname.split('.')[0] == new_fname.split('.')[0]:
-                os.remove(os.path.join(dir_name, fname))
-        break # Only walk first level dir
-    
-    # Write proof
-    full_filepath = os.path.join(dir_name, new_fname)
-    f = open(full_filepath, 'wb')
-    f.write(data)
-    f.close()
-
-    return full_filepath
-
-def write_busu_proof(eng_id, emp_id, data, filename):
-    dir_name = os.path.join(DATA_FOLDER, FILES_FOLDER, BUSU_ENG_FOLDER, str(emp_id))
-    os.makedirs(dir_name, exist_ok=True)
-
-    new_fname = f"{eng_id}.{filename.split('.')[-1]}"
-
-    # Check if cert with same name exist
-    for (idirpath, dirnames, filenames) in os.walk(dir_name):
-        for fname in filenames:
-            if fname.split('.')[0] == new_fname.split('.')[0]:
-                os.remove(os.path.join(dir_name, fname))
-        break # Only walk first level dir
-    
-    # Write proof
-    full_filepath = os.path.join(dir_name, new_fname)
-    f = open(full_filepath, 'wb')
-    f.write(data)
-    f.close()
-
-    return full_filepath
-
-def write_training_proof(train_id, emp_id, data, filename):
-    dir_name = os.path.join(DATA_FOLDER, FILES_FOLDER, TRAIN_PROOF_FOLDER, str(emp_id))
-    os.makedirs(dir_name, exist_ok=True)
-
-    new_fname = f"{train_id}.{filename.split('.')[-1]}"
-
-    # Check if cert with same name exist
-    remove_duplicate_file(dir_name, new_fname)
-    
-    # Write proof
-    full_filepath = os.path.join(dir_name, new_fname)
-    f = open(full_filepath, 'wb')
-    f.write(data)
-    f.close()
-
-    return full_filepath
-
-def write_cert(cert_name, emp_id, data, filename):
-    dir_name = os.path.join(DATA_FOLDER, FILES_FOLDER, CERTS_FOLDER, str(emp_id))
-    os.makedirs(dir_name, exist_ok=True)
-
-    new_fname = f"{cert_name}.{filename.split('.')[-1]}"
-
-    # Check if cert with same name exist
-    for (idirpath, dirnames, filenames) in os.walk(dir_name):
-        for fname in filenames:
-            if fname.split('.')[0] == new_fname.split('.')[0]:
-                os.remove(os.path.join(dir_name, fname))
-        break # Only walk first level dir
-
-    # Write Cert
-    full_filepath = os.path.join(dir_name, new_fname)
-    f = open(full_filepath, 'wb')
-    f.write(data)
-    f.close()
-
-    return full_filepath
-
-def write_mrpt(data, filename):
+def write_mrpt(src, filename, hasher=None):
     dir_name = os.path.join(DATA_FOLDER, FILES_FOLDER, BUDGET_FOLDER)
     os.makedirs(dir_name, exist_ok=True)
 
-    now_str = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    new_fname = f"MRPT_{now_str}.xlsx"
+    # Unique per upload, import jobs keep the file until a background process parsed it
+    now_str = datetime.now().strftime("%Y-%m-%d_%H-%M-%S-%f")
+    new_fname = f"MRPT_{now_str}_{os.getpid()}.xlsx"
 
     # Write MRPT
-    full_filepath = os.path.join(dir_name, new_fname)
-    f = open(full_filepath, 'wb')
-    f.write(data)
-    f.close()
-
-    return full_filepath
+    return write_stream(src, os.path.join(dir_name, new_fname), hasher)
+
+def write_stream(src, filepath, hasher=None):
+    """Copies the file object src to filepath through a temp file renamed into place, readers never see a partial file"""
+    os.replace(stream_to_temp(src, os.path.dirname(filepath) or ".", hasher), filepath)
+
+    return filepath
+
+def stream_to_temp(src, dir_name, hasher=None, max_bytes=MAX_UPLOAD_BYTES):
+    """Copies the file object src, CHUNK_SIZE bytes at a time, to a new temp file of dir_name (renamed by the caller)
+    and returns its path. hasher (e.g. hashlib.sha256()) is fed every chunk. Raises 413 past max_bytes (None for no cap)"""
+    # Hidden name, never mistaken for a stored file of the same dir
+    fd, tmp_filepath = tempfile.mkstemp(prefix=".upload_", suffix=".tmp", dir=dir_name)
+
+    try:
+        written = 0
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                written += len(chunk)
+                if max_bytes is not None and written > max_bytes:
+                    raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, f"Sent file is bigger than the {max_bytes // (1024 * 1024)} MB limit!")
+
+                f.write(chunk)
+                if hasher:
+                    hasher.update(chunk)
+    except BaseException:
+        os.remove(tmp_filepath)
+        raise
+
+    return tmp_filepath
+
+### Downloads
+def file_response(filepath: str, request: Request):
+    """FileResponse of filepath with ETag / Last-Modified validators, answering 304 when the client's copy is current
+    and 206 with the requested part for a single 'Range: bytes=' range (resumed downloads)"""
+    stat = os.stat(filepath)
+    etag = f'"{hashlib.md5(f"{stat.st_mtime}-{stat.st_size}".encode()).hexdigest()}"'
+    headers = {
+        "ETag"          : etag,
+        "Last-Modified" : formatdate(stat.st_mtime, usegmt=True),
+        "Accept-Ranges" : "bytes",
+    }
+
+    if _not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    byte_range = _requested_range(request, etag, headers["Last-Modified"], stat.st_size)
+
+    if byte_range is None:
+        return FileResponse(filepath, headers=headers, stat_result=stat)
+    if byte_range is False:
+        return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers={"Content-Range": f"bytes */{stat.st_size}"})
+
+    (start, end) = byte_range
+    headers["Content-Range"]    = f"bytes {start}-{end}/{stat.st_size}"
+    headers["Content-Length"]   = str(end - start + 1)
+
+    return StreamingResponse(
+        _read_range(filepath, start, end), status_code=status.HTTP_206_PARTIAL_CONTENT, headers=headers,
+        media_type=mimetypes.guess_type(filepath)[0] or "text/plain"
+    )
+
+def _not_modified(request: Request, etag: str, mtime: float):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match: # Takes precedence over If-Modified-Since
+        candidates = [t.strip() for t in if_none_match.split(",")]
+        return "*" in candidates or etag in [c[2:] if c.startswith("W/") else c for c in candidates]
+
+    try:
+        since = parsedate_to_datetime(request.headers["if-modified-since"])
+    except (KeyError, TypeError, ValueError):
+        return False
+
+    return int(mtime) <= since.timestamp()
+
+def _requested_range(request: Request, etag: str, last_modified: str, size: int):
+    """Returns the (start, end) bytes of the request's Range, None to send the whole file, False when not satisfiable"""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", request.headers.get("range", "").strip())
+    if not match or match.groups() == ("", ""): # Absent, malformed or several ranges
+        return None
+
+    # If-Range: the part is only wanted if the file didn't change since the client got the rest
+    if_range = request.headers.get("if-range")
+    if if_range and if_range not in (etag, last_modified):
+        return None
+
+    (first, last) = match.groups()
+    if first and last and int(last) < int(first): # Invalid, ignored (RFC 9110 14.2)
+        return None
+
+    if first == "": # Suffix, the last bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+
+    if start >= size:
+        return False
+
+    return (start, end)
+
+def _read_range(filepath: str, start: int, end: int):
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
 
 def delete_file(filepath):
     os.remove(filepath)
 
 def delete_cert_files_dir():
     dir_name = pathlib.Path(f"{DATA_FOLDER}/{FILES_FOLDER}/{CERTS_FOLDER}")
-    shutil.rmtree(dir_name)
-
-### Historic
-def migrate_training_proof(old_filepath:str, year:int, emp_id:int, train_id:int):
-    dir_name = os.path.join(DATA_FOLDER, HISTORY_FOLDER, str(year), TRAIN_PROOF_FOLDER, str(emp_id))
-    os.makedirs(dir_name, exist_ok=True)
-
-    _, old_filename = os.path.split(old_filepath)
-    new_fname = f"{train_id}.{old_filename.split('.')[-1]}"
-
-    remove_duplicate_file(dir_name, new_fname)
-
-    # Migrate
-    full_filepath = os.path.join(dir_name, new_fname)
-    shutil.copy(old_filepath, full_filepath)
-    
-    return full_filepath
-
-def migrate_busu_proof(old_filepath:str, year:int, emp_id:int, busu_id:int):
-    dir_name = os.path.join(DATA_FOLDER, HISTORY_FOLDER, str(year), BUSU_ENG_FOLDER, str(emp_id))
-    os.makedirs(dir_name, exist_ok=True)
-
-    _, old_filename = os.path.split(old_filepath)
-    new_fname = f"{busu_id}.{old_filename.split('.')[-1]}"
-
-    remove_duplicate_file(dir_name, new_fname)
-
-    # Migrate
-    full_filepath = os.path.join(dir_name, new_fname)
-    shutil.copy(old_filepath, full_filepath)
-    
-    return full_filepath
-
-def migrate_pa_completion(old_filepath:str, year:int, prj_id:int):
-    dir_name = os.path.join(DATA_FOLDER, HISTORY_FOLDER, str(year), PA_CMPLT_FOLDER, str(prj_id))
-    os.makedirs(dir_name, exist_ok=True)
-
-    _, old_filename = os.path.split(old_filepath)
-    new_fname = f"{prj_id}.{old_filename.split('.')[-1]}"
-
-    remove_duplicate_file(dir_name, new_fname)
-
-    # Migrate
-    full_filepath = os.path.join(dir_name, new_fname)
-    shutil.copy(old_filepath, full_filepath)
-    
-    return full_filepath
-
-def migrate_cert(old_filepath:str, year:int, emp_id:int, cert_id:int):
-    dir_name = os.path.join(DATA_FOLDER, HISTORY_FOLDER, str(year), CERTS_FOLDER, str(emp_id), str(cert_id))
-    os.makedirs(dir_name, exist_ok=True)
-
-    _, old_filename = os.path.split(old_filepath)
-    new_fname = f"{cert_id}.{old_filename.split('.')[-1]}"
-
-    remove_duplicate_file(dir_name, new_fname)
-
-    # Migrate
-    full_filepath = os.path.join(dir_name, new_fname)
-    shutil.copy(old_filepath, full_filepath)
-    
-    return full_filepath
-
-
-### utils
-def remove_duplicate_file(dir_name, new_fname):
-    # Check if file with same name exist
-    for (idirpath, dirnames, filenames) in os.walk(dir_name):
-        for fname in filenames:
-            if fname.split('.')[0] == new_fname.split('.')[0]:
-                os.remove(os.path.join(dir_name, fname))
-                return True
-        break # Only walk first level dir
-    
-    return False
\ No newline at end of file
+    # Gone once every cert proof was moved to the proof store
+    if dir_name.exists():
+        shutil.rmtree(dir_name)
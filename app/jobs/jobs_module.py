@@ -0,0 +1,128 @@
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from models import BackgroundJob
+from database import engine, SessionLocal
+from aggregator import summary_module as summ
+from cache import cache_module as cache
+from proofstore import proofstore_module as ps
+
+# Processes per gunicorn worker running background jobs
+MAX_WORKERS = int(os.getenv("PPA_JOB_WORKERS", "1"))
+
+STAGE_QUEUED = "queued"
+STAGE_DONE   = "done"
+STAGE_FAILED = "failed"
+
+_pool_lock = threading.Lock()
+_pool = None
+
+### Job Rows ###
+# Jobs live in the DB, any gunicorn worker can answer for a job started by another one
+
+def create(db: Session, kind: str, **details):
+    """Adds a queued job and returns its id. Commits"""
+    now = datetime.datetime.now()
+    job = BackgroundJob(kind=kind, stage=STAGE_QUEUED, details=json.dumps(details), created_at=now, updated_at=now)
+
+    db.add(job)
+    db.commit()
+
+    return job.id
+
+def update(job_id: int, stage: str = None, error: str = None, **details):
+    """Sets the stage/error (an empty error clears it) and merges details into the job's, in its own transaction"""
+    db = SessionLocal()
+    try:
+        job = db.query(BackgroundJob).filter(BackgroundJob.id == job_id).one()
+
+        if stage:
+            job.stage = stage
+        if error is not None:
+            job.error = error or None
+        if details:
+            job.details = json.dumps(dict(json.loads(job.details or "{}"), **details))
+        job.updated_at = datetime.datetime.now()
+
+        db.commit()
+    finally:
+        db.close()
+
+def get(db: Session, job_id: int, kind: str = None):
+    """Returns a dict of the job, None when there is no such job (of that kind)"""
+    job = db.query(BackgroundJob).filter(BackgroundJob.id == job_id).first()
+    if not job or (kind and job.kind != kind):
+        return None
+
+    return {
+        "id"        : job.id,
+        "kind"      : job.kind,
+        "stage"     : job.stage,
+        "done"      : job.stage in (STAGE_DONE, STAGE_FAILED),
+        "error"     : job.error,
+        "details"   : json.loads(job.details or "{}"),
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+@contextlib.contextmanager
+def stage(job_id: int, name: str):
+    """Marks the job as being in that stage and records the stage's duration as details[f"{name}_ms"],
+    or details["failed_stage"] when the stage raises"""
+    update(job_id, stage=name)
+    start = time.perf_counter()
+
+    try:
+        yield
+    except Exception:
+        update(job_id, failed_stage=name)
+        raise
+
+    update(job_id, **{f"{name}_ms": round((time.perf_counter() - start) * 1000, 1)})
+
+### Process Pool ###
+def submit(func, job_id: int, *args):
+    """Runs func(job_id, *args) in the process pool. func must be importable (module level).
+    The job ends up 'done', or 'failed' with the error message when func raises"""
+    return _get_pool().submit(_run, func, job_id, *args)
+
+def _get_pool():
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked: gunicorn workers run threads whose locks a fork would copy mid-use
+            _pool = ProcessPoolExecutor(MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker)
+
+    return _pool
+
+def _init_worker():
+    # Same session hooks as main.py, writes from a job keep the summaries, cached responses and proof files in sync
+    engine.dispose()
+    summ.install(SessionLocal)
+    cache.install(SessionLocal)
+    ps.install(SessionLocal)
+
+def _run(func, job_id: int, *args):
+    start = time.perf_counter()
+    error = None
+
+    try:
+        func(job_id, *args)
+    except HTTPException as e:
+        error = str(e.detail)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+
+    update(
+        job_id, stage=STAGE_FAILED if error else STAGE_DONE, error=error,
+        total_ms=round((time.perf_counter() - start) * 1000, 1)
+    )
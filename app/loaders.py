@@ -0,0 +1,21 @@
+from sqlalchemy.orm import joinedload, selectinload
+from models import Employee, EmployeeHistory
+
+# Loader option presets, pass to query.options(*preset) so a table builder costs a fixed number of queries.
+# Many-to-one relationships are joined in the same SELECT, one-to-many ones are fetched by one extra SELECT ... IN
+
+### Employee ###
+EMPLOYEE_TABLE = (
+    joinedload(Employee.role),
+    joinedload(Employee.part_of_div),
+    selectinload(Employee.emp_certifications),
+)
+
+EMPLOYEE_CERTS = (
+    selectinload(Employee.emp_certifications),
+)
+
+### Historic ###
+EMPLOYEE_HISTORY_TABLE = (
+    selectinload(EmployeeHistory.certs),
+)
@@ -4,11 +4,22 @@ import models
 from routers import division, employee, auth, training, debug, qaip, csf, states
 from routers import socialContrib, attrition, engagement, project, budget, api
 from routers import historic
-from database import engine
+from database import engine, SessionLocal, create_missing_indexes
+from aggregator import summary_module as summ
+from cache import cache_module as cache
+from proofstore import proofstore_module as ps
+from querystats import querystats_module as qs
 
 models.Base.metadata.create_all(engine)
+create_missing_indexes()
+summ.install(SessionLocal)
+cache.install(SessionLocal)
+ps.install(SessionLocal)
+summ.rebuild_if_empty(SessionLocal)
 
 app = FastAPI()
+app.add_exception_handler(cache.NotModified, cache.not_modified_handler)
+qs.install(app, engine)
 
 origins = [
     # "https://111.95.148.87"
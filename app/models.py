@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Float, Boolean, Date
+from sqlalchemy import Column, Integer, String, ForeignKey, Float, Boolean, Date, DateTime, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -21,10 +21,10 @@ class Employee(Base):
     __tablename__ = 'employees'
     id = Column(Integer, primary_key=True, index=True)
     name    = Column(String)
-    email   = Column(String)
+    email   = Column(String, index=True)
     pw      = Column(String)
 
-    staff_id                = Column(String)
+    staff_id                = Column(String, index=True)
     div_stream              = Column(String)
     corporate_title         = Column(String)
     corporate_grade         = Column(String)
@@ -39,10 +39,10 @@ class Employee(Base):
     edu_category            = Column(String)
     ia_background           = Column(Boolean)
     ea_background           = Column(Boolean)
-    active                  = Column(Boolean)
+    active                  = Column(Boolean, index=True)
 
 
-    div_id = Column(Integer, ForeignKey('divisions.id'))
+    div_id = Column(Integer, ForeignKey('divisions.id'), index=True)
     part_of_div = relationship("Division", back_populates="employees_of_div") # division id
 
     role_id = Column(Integer, ForeignKey('roles.id'))
@@ -59,10 +59,10 @@ class Certification(Base):
     __tablename__ = 'certifications'
     id = Column(Integer, primary_key=True, index=True)
 
-    cert_name   = Column(String)
+    cert_name   = Column(String, index=True)
     cert_proof  = Column(String)
 
-    emp_id = Column(Integer, ForeignKey('employees.id'))
+    emp_id = Column(Integer, ForeignKey('employees.id'), index=True)
     owner = relationship("Employee", back_populates="emp_certifications")
 
 class Role(Base):
@@ -83,7 +83,7 @@ class Training(Base):
     __tablename__ = 'trainings'
     id              = Column(Integer, primary_key=True, index=True)
     name            = Column(String)
-    date            = Column(Date)
+    date            = Column(Date, index=True)
     duration_hours  = Column(Float)
     proof           = Column(String)
 
@@ -96,15 +96,19 @@ class Training(Base):
     emp_id          = Column(Integer, ForeignKey('employees.id'))
     employee        = relationship("Employee", back_populates="emp_trainings") #employee id
 
+    __table_args__ = (Index('ix_trainings_emp_id_date', 'emp_id', 'date'),)
+
 class TrainingTarget(Base):
     __tablename__ = 'trainingtargets'
     id = Column(Integer, primary_key=True, index=True)
-    year = Column(Integer)
+    year = Column(Integer, index=True)
     target_hours = Column(Float)
 
     emp_id = Column(Integer, ForeignKey('employees.id'))
     trainee = relationship("Employee", back_populates="emp_trainingtargets") #employee id
 
+    __table_args__ = (Index('ix_trainingtargets_emp_id_year', 'emp_id', 'year'),)
+
 class TrainingBudget(Base):
     __tablename__ = 'trainingbudgets'
     id      = Column(Integer, primary_key=True, index=True)
@@ -124,10 +128,10 @@ class DebugParent(Base):
 class SocialContrib(Base):
     __tablename__ = 'socialcontribs'
     id          = Column(Integer, primary_key=True, index=True)
-    date        = Column(Date)
+    date        = Column(Date, index=True)
     topic_name  = Column(String)
 
-    creator_id  = Column(Integer, ForeignKey('employees.id'))
+    creator_id  = Column(Integer, ForeignKey('employees.id'), index=True)
     creator     = relationship("Employee", back_populates="emp_social_contrib")
 
     social_type_id  = Column(Integer, ForeignKey('socialtypes.id'))
@@ -157,16 +161,18 @@ class AttritionJoinResignTransfer(Base):
 
     staff_name  = Column(String)
     staff_nik   = Column(String)
-    date        = Column(Date)
+    date        = Column(Date, index=True)
     div_id      = Column(Integer)
 
+    __table_args__ = (Index('ix_attritionjoinresigntransfers_div_id_date', 'div_id', 'date'),)
+
 class AttritionRotation(Base):
     __tablename__ = 'attritionrotations'
     id          = Column(Integer, primary_key=True, index=True)
 
     staff_name  = Column(String)
     staff_nik   = Column(String)
-    date        = Column(Date)
+    date        = Column(Date, index=True)
 
     from_div_id = Column(Integer)
     to_div_id   = Column(Integer)
@@ -192,13 +198,13 @@ class BUSUEngagement(Base):
     __tablename__ = 'busuengagements'
     id              = Column(Integer, primary_key=True, index=True)
     activity_name   = Column(String)
-    date            = Column(Date)
+    date            = Column(Date, index=True)
     proof           = Column(String)
 
     eng_type_id     = Column(Integer, ForeignKey('engagementtypes.id'))
     eng_type        = relationship("EngagementType", back_populates="engagements")
 
-    creator_id  = Column(Integer, ForeignKey('employees.id'))
+    creator_id  = Column(Integer, ForeignKey('employees.id'), index=True)
     creator     = relationship("Employee", back_populates="emp_busu_engs")
 
 # Audit Projects
@@ -217,7 +223,7 @@ class Project(Base):
     completion_PA   = Column(String)
     is_carried_over = Column(Boolean)
     timely_report   = Column(Boolean)
-    year            = Column(Integer)
+    year            = Column(Integer, index=True)
 
     status_id       = Column(Integer, ForeignKey('projectstatus.id'))
     status          = relationship("ProjectStatus", back_populates="status_of_projects")
@@ -225,7 +231,7 @@ class Project(Base):
     div_id  = Column(Integer, ForeignKey('divisions.id'))
     div     = relationship("Division", back_populates="div_projects")
 
-    tl_id   = Column(Integer, ForeignKey('employees.id'))
+    tl_id   = Column(Integer, ForeignKey('employees.id'), index=True)
     tl      = relationship("Employee", back_populates="emp_prj_tl")
 
     csfs = relationship("CSF", back_populates="prj")
@@ -245,6 +251,8 @@ class YearlyBudget(Base):
     other_other                 = Column(Float)
     indirect_expense            = Column(Float)
 
+    __table_args__ = (Index('uq_yearlybudgets_year', 'year', unique=True),)
+
 class MonthlyBudget(Base):
     __tablename__ = 'monthlybudgets'
     id                          = Column(Integer, primary_key=True, index=True)
@@ -259,6 +267,8 @@ class MonthlyBudget(Base):
     other_other                 = Column(Float)
     indirect_expense            = Column(Float)
 
+    __table_args__ = (Index('uq_monthlybudgets_year_month', 'year', 'month', unique=True),)
+
 class MonthlyActualBudget(Base):
     __tablename__ = 'monthlyactualbudgets'
     id                          = Column(Integer, primary_key=True, index=True)
@@ -274,12 +284,14 @@ class MonthlyActualBudget(Base):
     indirect_expense            = Column(Float)
     remark                      = Column(String)
 
+    __table_args__ = (Index('uq_monthlyactualbudgets_year_month', 'year', 'month', unique=True),)
+
 # QAIP
 class QAIP(Base):
     __tablename__ = 'qaips'
     id                  = Column(Integer, primary_key=True, index=True)
 
-    prj_id              = Column(Integer, ForeignKey('projects.id'))
+    prj_id              = Column(Integer, ForeignKey('projects.id'), index=True)
     prj                 = relationship("Project", back_populates="qaips")
 
     qa_type_id          = Column(Integer, ForeignKey('qatypes.id'))
@@ -335,7 +347,7 @@ class CSF(Base):
     id                  = Column(Integer, primary_key=True, index=True)
     client_name         = Column(String)
     client_unit         = Column(String)
-    csf_date            = Column(Date)
+    csf_date            = Column(Date, index=True)
     atp_1               = Column(Float)
     atp_2               = Column(Float)
     atp_3               = Column(Float)
@@ -352,7 +364,7 @@ class CSF(Base):
     paw_2               = Column(Float)
     paw_3               = Column(Float)
 
-    prj_id  = Column(Integer, ForeignKey('projects.id'))
+    prj_id  = Column(Integer, ForeignKey('projects.id'), index=True)
     prj     = relationship("Project", back_populates="csfs")
 
     by_invdiv_div_id = Column(Integer, ForeignKey('divisions.id'))
@@ -365,18 +377,57 @@ class ServerState(Base):
     name    = Column(String)
     value   = Column(Boolean)
 
+# Dashboard
+class DashboardAggregate(Base):
+    __tablename__ = 'dashboardaggregates'
+    id      = Column(Integer, primary_key=True, index=True)
+    metric  = Column(String)
+    year    = Column(Integer)
+    div_id  = Column(Integer)
+    key     = Column(String)
+    subkey  = Column(String)
+    value   = Column(Float)
+
+    __table_args__ = (Index('ix_dashboardaggregates_metric_year', 'metric', 'year'),)
+
+# Cache
+class TableVersion(Base):
+    __tablename__ = 'tableversions'
+    id      = Column(Integer, primary_key=True, index=True)
+    name    = Column(String, unique=True)
+    version = Column(Integer)
+
+# Background Jobs
+class BackgroundJob(Base):
+    __tablename__ = 'backgroundjobs'
+    id          = Column(Integer, primary_key=True, index=True)
+    kind        = Column(String)
+    stage       = Column(String)
+    details     = Column(String) # JSON: row counts, per stage timings
+    error       = Column(String)
+    created_at  = Column(DateTime)
+    updated_at  = Column(DateTime)
+
+# Proof Store
+class ProofBlob(Base):
+    __tablename__ = 'proofblobs'
+    id      = Column(Integer, primary_key=True, index=True)
+    name    = Column(String, unique=True) # "{sha256}.{ext}", the file under data/blobs
+    size    = Column(Integer)
+    refs    = Column(Integer) # Rows (live or historic) pointing to the file
+
 ### Histories ###
 class TrainingBudgetHistory(Base):
     __tablename__ = 'trainingbudgethistory'
     id      = Column(Integer, primary_key=True, index=True)
-    year        = Column(Integer)
+    year        = Column(Integer, index=True)
     budget      = Column(Float)
     division    = Column(String)
 
 class TrainingHistory(Base):
     __tablename__ = 'traininghistory'
     id      = Column(Integer, primary_key=True, index=True)
-    year        = Column(Integer)
+    year        = Column(Integer, index=True)
     nik         = Column(String)
     division    = Column(String)
     emp_name    = Column(String)
@@ -394,7 +445,7 @@ class TrainingHistory(Base):
 class ProjectHistory(Base):
     __tablename__ = 'projecthistory'
     id      = Column(Integer, primary_key=True, index=True)
-    year        = Column(Integer)
+    year        = Column(Integer, index=True)
     p_name      = Column(String)
     div         = Column(String)
     tl_name     = Column(String)
@@ -408,7 +459,7 @@ class ProjectHistory(Base):
 class SocialContribHistory(Base):
     __tablename__ = 'socialcontribhistory'
     id      = Column(Integer, primary_key=True, index=True)
-    year        = Column(Integer)
+    year        = Column(Integer, index=True)
     div         = Column(String)
     category    = Column(String)
     sc_name     = Column(String)
@@ -419,7 +470,7 @@ class SocialContribHistory(Base):
 class AttritionMainTableHistory(Base):
     __tablename__ = 'attritionmaintablehistory'
     id      = Column(Integer, primary_key=True, index=True)
-    year        = Column(Integer)
+    year        = Column(Integer, index=True)
     division    = Column(String)
     hc_budget   = Column(Integer)
     hc_start    = Column(Integer)
@@ -433,7 +484,7 @@ class AttritionMainTableHistory(Base):
 class AttritionJRTTableHistory(Base):
     __tablename__ = 'attritionjrttablehistory'
     id      = Column(Integer, primary_key=True, index=True)
-    year        = Column(Integer)
+    year        = Column(Integer, index=True)
     emp_name    = Column(String)
     emp_nik     = Column(String)
     category    = Column(String)
@@ -443,7 +494,7 @@ class AttritionJRTTableHistory(Base):
 class AttritionRotationTableHistory(Base):
     __tablename__ = 'attritionrotationtablehistory'
     id      = Column(Integer, primary_key=True, index=True)
-    year        = Column(Integer)
+    year        = Column(Integer, index=True)
     emp_name    = Column(String)
     emp_nik     = Column(String)
     date        = Column(Date)
@@ -453,7 +504,7 @@ class AttritionRotationTableHistory(Base):
 class CSFHistory(Base):
     __tablename__ = 'csfhistory'
     id      = Column(Integer, primary_key=True, index=True)
-    year        = Column(Integer)
+    year        = Column(Integer, index=True)
     p_name      = Column(String)
     tl_name     = Column(String)
     client_name = Column(String)
@@ -481,7 +532,7 @@ class CSFHistory(Base):
 class QAResultHistory(Base):
     __tablename__ = 'qaresulthistory'
     id      = Column(Integer, primary_key=True, index=True)
-    year                = Column(Integer)
+    year                = Column(Integer, index=True)
     qa_type             = Column(String)
     p_name              = Column(String)
     tl_name             = Column(String)
@@ -497,7 +548,7 @@ class QAResultHistory(Base):
 class BUSUHistory(Base):
     __tablename__ = 'busuhistory'
     id      = Column(Integer, primary_key=True, index=True)
-    year        = Column(Integer)
+    year        = Column(Integer, index=True)
     tl_name     = Column(String)
     division    = Column(String)
     WorM        = Column(String)
@@ -509,7 +560,7 @@ class BUSUHistory(Base):
 class DivisionHistory(Base):
     __tablename__ = 'divisionhistory'
     id      = Column(Integer, primary_key=True, index=True)
-    year        = Column(Integer)
+    year        = Column(Integer, index=True)
     short_name  = Column(String)
     long_name   = Column(String)
     dh_name     = Column(String)
@@ -518,7 +569,7 @@ class DivisionHistory(Base):
 class EmployeeHistory(Base):
     __tablename__ = 'employeehistory'
     id      = Column(Integer, primary_key=True, index=True)
-    year                    = Column(Integer)
+    year                    = Column(Integer, index=True)
     name                    = Column(String)
     email                   = Column(String)
     staff_id                = Column(String)
@@ -553,5 +604,5 @@ class CertHistory(Base):
     cert_name   = Column(String)
     cert_proof  = Column(String)
 
-    emp_id = Column(Integer, ForeignKey('employeehistory.id'))
+    emp_id = Column(Integer, ForeignKey('employeehistory.id'), index=True)
     owner = relationship("EmployeeHistory", back_populates="certs")
\ No newline at end of file
@@ -0,0 +1,372 @@
+import collections
+import hashlib
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import bindparam, event, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from models import ProofBlob, Training, BUSUEngagement, Project, Certification
+from models import TrainingHistory, BUSUHistory, ProjectHistory, CertHistory
+from fileio import fileio_module as fio
+
+# Proofs are stored once per content as data/blobs/{sha256[:2]}/{sha256}.{ext}, rows point to that path.
+# A proof copied to the history tables, or uploaded twice, adds a reference instead of a copy
+STORE_DIR = os.path.join(fio.DATA_FOLDER, fio.BLOBS_FOLDER)
+
+# Threads putting the proofs stored at their own path in the store, mostly file reads and hashing (GIL released)
+MIGRATE_WORKERS = int(os.getenv("PPA_PROOF_WORKERS", "4"))
+
+# session.info key of the files outside the store released by drop(), deleted once the transaction commits
+_UNLINK_KEY = "proofstore_unlink"
+
+# Upload temp files older than this are leftovers of a crashed worker
+STALE_TEMP_SECONDS = 3600
+
+# (model, column) of every proof path
+PROOF_COLUMNS = [
+    (Training, "proof"),
+    (BUSUEngagement, "proof"),
+    (Project, "completion_PA"),
+    (Certification, "cert_proof"),
+    (TrainingHistory, "proof"),
+    (BUSUHistory, "proof"),
+    (ProjectHistory, "pa_proof"),
+    (CertHistory, "cert_proof"),
+]
+
+def is_blob(filepath: str):
+    return bool(filepath) and os.path.normpath(filepath).startswith(STORE_DIR + os.sep)
+
+def blob_path(name: str):
+    return os.path.join(STORE_DIR, name[:2], name)
+
+def put(src, filename: str, db: Session):
+    """Stores the uploaded file object src and returns its blob path, holding one reference. Does not commit"""
+    os.makedirs(STORE_DIR, exist_ok=True)
+
+    hasher = hashlib.sha256()
+    tmp_filepath = fio.stream_to_temp(src, STORE_DIR, hasher)
+
+    return _add(tmp_filepath, hasher.hexdigest(), _ext(filename), db)
+
+def add_ref(filepath: str, db: Session):
+    """Returns the blob path of the proof at filepath with one more reference, a file outside the store is copied
+    into it (the file itself is left in place). Does not commit"""
+    if is_blob(filepath):
+        stmt = insert(ProofBlob).values(name=os.path.basename(filepath), size=os.path.getsize(filepath), refs=1)
+        db.execute(stmt.on_conflict_do_update(index_elements=["name"], set_={"refs": ProofBlob.refs + 1}))
+        return filepath
+
+    os.makedirs(STORE_DIR, exist_ok=True)
+
+    hasher = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        tmp_filepath = fio.stream_to_temp(f, STORE_DIR, hasher, max_bytes=None)
+
+    return _add(tmp_filepath, hasher.hexdigest(), _ext(filepath), db)
+
+def add_refs(filepaths, db: Session):
+    """add_ref() for every path of filepaths (a path listed n times gets n references), the blobs' counts in a single
+    statement. Returns {filepath: blob path}. Does not commit"""
+    paths = {}
+    counts = collections.Counter()
+
+    for (filepath, n) in collections.Counter(filepaths).items():
+        if is_blob(filepath):
+            paths[filepath] = filepath
+        else:
+            paths[filepath] = add_ref(filepath, db) # Copied in, with one reference
+            n -= 1
+
+        counts[paths[filepath]] += n
+
+    rows = [{"name": os.path.basename(p), "size": os.path.getsize(p), "refs": n} for (p, n) in counts.items() if n]
+    if rows:
+        stmt = insert(ProofBlob)
+        db.execute(stmt.on_conflict_do_update(index_elements=["name"], set_={"refs": ProofBlob.refs + stmt.excluded.refs}), rows)
+
+    return paths
+
+def drop(filepath: str, db: Session):
+    """Releases a row's reference to its proof. Files outside the store are deleted once the session commits
+    (kept on rollback, see install()), blobs once no reference is left and sweep() runs. Does not commit"""
+    if is_blob(filepath):
+        db.query(ProofBlob).filter(ProofBlob.name == os.path.basename(filepath)).update(
+            {ProofBlob.refs: ProofBlob.refs - 1}, synchronize_session=False
+        )
+    elif filepath:
+        db.connection() # Begins the transaction whose commit or rollback settles the file
+        db.info.setdefault(_UNLINK_KEY, set()).add(filepath)
+
+def install(session_factory):
+    """Deletes the files released by drop() after the commit of sessions made by session_factory,
+    a rolled back transaction leaves them in place for the rows still pointing to them"""
+    event.listen(session_factory, "after_commit", _unlink_dropped)
+    event.listen(session_factory, "after_rollback", _forget_dropped)
+
+def _unlink_dropped(session):
+    for filepath in session.info.pop(_UNLINK_KEY, ()):
+        if fio.is_file_exist(filepath):
+            fio.delete_file(filepath)
+
+def _forget_dropped(session):
+    session.info.pop(_UNLINK_KEY, None)
+
+def sweep(db: Session):
+    """Deletes the blobs without references, returns how many. Commits"""
+    names = [name for (name,) in db.query(ProofBlob.name).filter(ProofBlob.refs <= 0).all()]
+
+    deleted = 0
+    for name in names:
+        # Deleted while holding the write lock: an upload of the same content meanwhile either re-adds the row
+        # (and rewrites the file) after this commit, or keeps the row from being deleted
+        if db.query(ProofBlob).filter(ProofBlob.name == name, ProofBlob.refs <= 0).delete(synchronize_session=False):
+            try:
+                os.remove(blob_path(name))
+            except FileNotFoundError:
+                pass
+            deleted += 1
+
+    db.commit()
+
+    return deleted
+
+def migrate_existing(db: Session, workers: int = None):
+    """Moves every proof stored at its own path (data/files, data/history) into the store and points the rows
+    to the blobs. Returns counts and the file stage's throughput. Commits"""
+    (rows, missing) = _legacy_rows(db)
+    res = {"rows": 0, "files": 0, "missing": missing, "linked": 0, "copied": 0, "bytes": 0}
+
+    # File stage, before any write: each distinct file (shared by several rows or not) is put in the store once
+    start = time.perf_counter()
+    filepaths = sorted({r[3] for r in rows})
+
+    with ThreadPoolExecutor(workers or MIGRATE_WORKERS) as pool:
+        moved = dict(zip(filepaths, pool.map(_ingest, filepaths)))
+
+    seconds = time.perf_counter() - start
+    for (_, size, how) in moved.values():
+        res[how] += 1
+        res["bytes"] += size
+
+    # DB stage, a single short write transaction
+    counts = collections.Counter(moved[r[3]][0] for r in rows)
+    sizes = {blob: size for (blob, size, _) in moved.values()}
+
+    if counts:
+        stmt = insert(ProofBlob)
+        db.execute(
+            stmt.on_conflict_do_update(index_elements=["name"], set_={"refs": ProofBlob.refs + stmt.excluded.refs}),
+            [{"name": os.path.basename(blob), "size": sizes[blob], "refs": n} for (blob, n) in counts.items()]
+        )
+
+    # Now holding the write lock: a sweep() since the file stage may have deleted a blob that had no reference left
+    for (filepath, (blob, _, _)) in moved.items():
+        if not os.path.exists(blob):
+            _ingest(filepath)
+
+    for (model, column) in PROOF_COLUMNS:
+        updates = [{"_id": id, "_path": moved[filepath][0]} for (m, c, id, filepath) in rows if (m, c) == (model, column)]
+
+        if updates:
+            table = model.__table__
+            db.execute(table.update().where(table.c.id == bindparam("_id")).values({column: bindparam("_path")}), updates)
+            res["rows"] += len(updates)
+
+    db.commit()
+
+    # Only once the rows point to the blobs
+    for filepath in moved:
+        fio.delete_file(filepath)
+
+    res["files"] = len(moved)
+    res["seconds"] = round(seconds, 3)
+    res["mb_per_s"] = round(res["bytes"] / 1e6 / seconds, 1) if seconds else None
+
+    return res
+
+def pending(db: Session):
+    """Counts what migrate_existing() would move, from os.stat only"""
+    (rows, missing) = _legacy_rows(db)
+    filepaths = {r[3] for r in rows}
+
+    return {"rows": len(rows), "files": len(filepaths), "bytes": sum(os.path.getsize(f) for f in filepaths), "missing": missing}
+
+def _legacy_rows(db: Session):
+    """Returns ([(model, column, id, path)] of the rows whose proof exists outside the store, count of the missing ones)"""
+    rows = []
+    missing = 0
+
+    for (model, column) in PROOF_COLUMNS:
+        col = getattr(model, column)
+
+        for (id, filepath) in db.query(model.id, col).filter(col != None, col != "").all():
+            if is_blob(filepath):
+                continue
+
+            if fio.is_file_exist(filepath):
+                rows.append((model, column, id, filepath))
+            else:
+                missing += 1
+
+    return (rows, missing)
+
+def _ingest(filepath: str):
+    """Puts the file at filepath in the store, hardlinked when the filesystem allows it, copied otherwise.
+    Returns (blob path, size, "linked" or "copied"). No DB access, runs in migrate_existing()'s threads"""
+    size = os.path.getsize(filepath)
+    hasher = hashlib.sha256()
+    tmp_filepath = os.path.join(STORE_DIR, f".upload_{uuid.uuid4().hex}.tmp")
+    os.makedirs(STORE_DIR, exist_ok=True)
+
+    try:
+        os.link(filepath, tmp_filepath)
+        how = "linked"
+    except OSError: # Another filesystem, or one without hardlinks
+        with open(filepath, "rb") as f:
+            tmp_filepath = fio.stream_to_temp(f, STORE_DIR, hasher, max_bytes=None)
+        how = "copied"
+
+    try:
+        if how == "linked":
+            os.utime(tmp_filepath) # Keeps audit() from taking it for a stale temp file
+            with open(tmp_filepath, "rb") as f:
+                for chunk in iter(lambda: f.read(fio.CHUNK_SIZE), b""):
+                    hasher.update(chunk)
+
+        filepath_blob = blob_path(f"{hasher.hexdigest()}{_ext(filepath)}")
+
+        if os.path.exists(filepath_blob):
+            os.remove(tmp_filepath)
+        else:
+            os.makedirs(os.path.dirname(filepath_blob), exist_ok=True)
+            os.replace(tmp_filepath, filepath_blob)
+    except Exception:
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+        raise
+
+    if os.path.getsize(filepath_blob) != size:
+        raise OSError(f"Proof {filepath_blob} is {os.path.getsize(filepath_blob)} bytes, {filepath} was {size}")
+
+    return (filepath_blob, size, how)
+
+### Registry Audit ###
+def audit(db: Session, repair: bool = False):
+    """Compares the store's files and ProofBlob rows with the rows pointing to them. Returns a dict of :
+    - orphans: blob names no row points to
+    - miscounted: {name: [recorded refs, actual refs]}, e.g. rows deleted without releasing their proof
+    - unregistered: blob names rows point to, without a ProofBlob row
+    - missing: [table, id, path] of rows whose proof file doesn't exist
+    - strays: files of the store dir without a ProofBlob row, stale upload temp files included
+    With repair, the refs are set to the actual counts (orphans swept) and the strays deleted. Commits"""
+    if repair:
+        # Takes the write lock before counting, uploads can't add a reference between the count and the fix
+        db.query(ProofBlob).filter(ProofBlob.id == -1).update({ProofBlob.refs: 0}, synchronize_session=False)
+
+    actual = {}
+    missing = []
+
+    for (model, column) in PROOF_COLUMNS:
+        col = getattr(model, column)
+
+        # Blob paths counted in SQL, one row per blob
+        blob_like = col.like(f"{STORE_DIR}{os.sep}%")
+        for (filepath, count) in db.query(col, func.count()).filter(blob_like).group_by(col).all():
+            name = os.path.basename(filepath)
+            actual[name] = actual.get(name, 0) + count
+
+        for (id, filepath) in db.query(model.id, col).filter(col != None, col != "", ~blob_like).all():
+            if not fio.is_file_exist(filepath):
+                missing.append([model.__tablename__, id, filepath])
+
+    recorded = dict(db.query(ProofBlob.name, ProofBlob.refs).all())
+    on_disk = _store_files()
+
+    for name in actual:
+        if name not in on_disk:
+            missing += [
+                [model.__tablename__, id, filepath]
+                for (model, column) in PROOF_COLUMNS
+                for (id, filepath) in db.query(model.id, getattr(model, column)).filter(getattr(model, column) == blob_path(name)).all()
+            ]
+
+    res = {
+        "orphans"       : sorted(n for n in recorded if n not in actual),
+        "miscounted"    : {n: [recorded[n], actual.get(n, 0)] for n in sorted(recorded) if recorded[n] != actual.get(n, 0) and n in actual},
+        "unregistered"  : sorted(n for n in actual if n not in recorded),
+        "missing"       : missing,
+        "strays"        : sorted(n for n in on_disk if n not in recorded and n not in actual),
+    }
+
+    if repair:
+        for name in res["orphans"]:
+            db.query(ProofBlob).filter(ProofBlob.name == name).update({ProofBlob.refs: 0}, synchronize_session=False)
+        for name, (_, refs) in res["miscounted"].items():
+            db.query(ProofBlob).filter(ProofBlob.name == name).update({ProofBlob.refs: refs}, synchronize_session=False)
+        for name in res["unregistered"]:
+            if name in on_disk:
+                db.add(ProofBlob(name=name, size=os.path.getsize(on_disk[name]), refs=actual[name]))
+
+        # Still holding the lock, like sweep()
+        for name in res["strays"]:
+            try:
+                os.remove(on_disk[name])
+            except FileNotFoundError:
+                pass
+
+        db.commit()
+        res["swept"] = sweep(db)
+
+    return res
+
+def _store_files():
+    """Returns {name: path} of the files under STORE_DIR, the upload temp files still in use left out"""
+    res = {}
+
+    for (dirpath, _, filenames) in os.walk(STORE_DIR):
+        for name in filenames:
+            filepath = os.path.join(dirpath, name)
+
+            if name.startswith(".upload_"):
+                try:
+                    if time.time() - os.path.getmtime(filepath) < STALE_TEMP_SECONDS:
+                        continue
+                except FileNotFoundError: # Renamed meanwhile
+                    continue
+
+            res[name] = filepath
+
+    return res
+
+def _add(tmp_filepath: str, digest: str, ext: str, db: Session):
+    name = f"{digest}{ext}"
+    filepath = blob_path(name)
+
+    try:
+        stmt = insert(ProofBlob).values(name=name, size=os.path.getsize(tmp_filepath), refs=1)
+        db.execute(stmt.on_conflict_do_update(index_elements=["name"], set_={"refs": ProofBlob.refs + 1}))
+    except Exception:
+        os.remove(tmp_filepath)
+        raise
+
+    # After the row: a concurrent sweep() either ran before (file gone, rewritten here) or waits for this commit
+    if os.path.exists(filepath):
+        os.remove(tmp_filepath)
+    else:
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        os.replace(tmp_filepath, filepath)
+
+    return filepath
+
+def _ext(filename: str):
+    """Returns the ".ext" of filename, kept for the downloads' content type"""
+    if "." not in os.path.basename(filename):
+        return ""
+
+    ext = re.sub(r"[^0-9a-z]", "", filename.split('.')[-1].lower())
+    return f".{ext}" if ext else ""
@@ -0,0 +1,86 @@
+import contextvars
+import logging
+import os
+import re
+import time
+from collections import Counter
+from fastapi import FastAPI, Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Set PPA_QUERYSTATS=0 to disable the counters entirely
+ENABLED = os.getenv("PPA_QUERYSTATS", "1") != "0"
+
+# Strict mode, flag a request once a single statement shape ran more than this many times (0 disables)
+REPEAT_LIMIT = int(os.getenv("PPA_QUERY_REPEAT_LIMIT", "0"))
+
+_current = contextvars.ContextVar("querystats", default=None)
+
+class RequestStats:
+    def __init__(self):
+        self.count          = 0
+        self.total_ms       = 0.0
+        self.fingerprints   = Counter()
+
+    def repeated(self, limit: int):
+        """Returns a list of (fingerprint, count) of statement shapes ran more than limit times, most frequent first"""
+        return [(f, c) for (f, c) in self.fingerprints.most_common() if c > limit]
+
+def install(app: FastAPI, engine: Engine):
+    if not ENABLED:
+        return
+
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+    app.middleware("http")(_track_request)
+
+def fingerprint(statement: str):
+    """Statement shape: whitespace collapsed and IN lists of any length folded into a single placeholder"""
+    statement = re.sub(r"\s+", " ", statement).strip()
+    return re.sub(r"\((?:\s*\?\s*,)+\s*\?\s*\)", "(?)", statement)
+
+### Engine Events ###
+# The start is kept on the statement's execution context, a failing statement (no after_cursor_execute) leaves
+# nothing behind on the pooled connection
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    context._querystats_start = time.perf_counter()
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_querystats_start", None)
+    stats = _current.get()
+
+    if stats is None or start is None: # Outside of a request (startup, scripts)
+        return
+
+    stats.count     += 1
+    stats.total_ms  += (time.perf_counter() - start) * 1000
+    stats.fingerprints[fingerprint(statement)] += 1
+
+### Middleware ###
+async def _track_request(request: Request, call_next):
+    stats = RequestStats()
+    token = _current.set(stats)
+
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+
+    response.headers["Server-Timing"] = f'db;dur={stats.total_ms:.1f};desc="{stats.count} queries"'
+
+    logger.debug(
+        "%s %s: %d queries, %.1f ms, %d distinct",
+        request.method, request.url.path, stats.count, stats.total_ms, len(stats.fingerprints)
+    )
+
+    if REPEAT_LIMIT:
+        repeated = stats.repeated(REPEAT_LIMIT)
+
+        if repeated:
+            response.headers["X-Query-Repeats"] = str(repeated[0][1])
+            for f, c in repeated:
+                logger.warning("Possible N+1 on %s %s: ran %d times: %s", request.method, request.url.path, c, f)
+
+    return response
@@ -1,23 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Form
 from fastapi.datastructures import UploadFile
 from fastapi.encoders import jsonable_encoder
 from fastapi.param_functions import File
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.orm import Session, aliased
 from sqlalchemy.exc import MultipleResultsFound, NoResultFound
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import datetime
 import calendar
+import hashlib
+import os
 from operator import itemgetter
-from dateutil.relativedelta import relativedelta
 from sqlalchemy.sql.expression import desc, or_
-from fastapi.responses import FileResponse
 from fileio import fileio_module as fio
-import schemas, datetime, utils, hashing
+import schemas, datetime, utils, hashing, loaders
 from models import *
-from database import get_db
+from database import get_db, SessionLocal
 from MrptParser import parser_module as pm
-
-gen_x_youngest = datetime.date(1975,12,31)
-gen_y_youngest = datetime.date(1989,12,31)
+from aggregator import aggregator_module as agg
+from aggregator import summary_module as summ
+from cache import cache_module as cache
+from jobs import jobs_module as jobs
+from proofstore import proofstore_module as ps
 
 # API
 router = APIRouter(
@@ -28,262 +32,85 @@ router = APIRouter(
 ### Merge Division ###
 @router.post('/admin/operation/merge-division')
 def merge_division(req: schemas.DivisionMerge, db: Session = Depends(get_db)):
-    parent_div  = get_div_by_shortname(req.mother_division, db)
-    child_div   = get_div_by_shortname(req.child_division, db)
-
-    _merge_yearlyattr(parent_div, child_div, db)
-    _delete_yearlyattr(child_div, db)
+    """Moves every row of the child division to the mother division and deletes the child, in one transaction.
+    Returns the rows updated per step"""
+    (parent_div, child_div) = _get_merged_divs(req, db)
 
-    _merge_yearlytrainingbudget(parent_div, child_div, db)
-    _delete_yearlytrainingbudget(child_div, db)
-
-    _merge_project(parent_div, child_div, db)
-    _merge_csf(parent_div, child_div, db)
-    _merge_employee(parent_div, child_div, db)
-    _merge_attr_jrt(parent_div, child_div, db)
-    _merge_attr_rot(parent_div, child_div, db)
+    res = {}
+    for (name, query, values) in _division_merge_steps(parent_div, child_div, db):
+        if values is None:
+            res[name] = query.delete(synchronize_session=False)
+        else:
+            res[name] = query.update(values, synchronize_session=False)
 
     db.delete(child_div)
-
-    db.commit()
-
-    return {'details': 'Success'}
-
-def _delete_yearlyattr(c_div: Division, db: Session):
-    child_q = db.query(YearlyAttrition).filter(
-        YearlyAttrition.div_id == c_div.id
-    )
-
-    try:
-        child   = child_q.one()
-    except MultipleResultsFound:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Either Parent or Child Div has more than one YearlyAttrition")
-    except NoResultFound:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Either Parent or Child Div has no YearlyAttrition")
-
-    child_q.delete()
-
-def _delete_yearlytrainingbudget(c_div: Division, db: Session):
-    child_q = db.query(TrainingBudget).filter(
-        TrainingBudget.div_id == c_div.id
-    )
-
-    try:
-        child   = child_q.one()
-    except MultipleResultsFound:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Either Parent or Child Div has more than one TrainingBudget")
-    except NoResultFound:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Either Parent or Child Div has no TrainingBudget")
-
-    child_q.delete()
-
-def _merge_attr_jrt(p_div: Division, c_div: Division, db: Session):
-    child_jrts = db.query(AttritionJoinResignTransfer).filter(
-        AttritionJoinResignTransfer.div_id == c_div.id
-    ).all()
-
-    for c in child_jrts:
-        c_q = db.query(AttritionJoinResignTransfer).filter(
-            AttritionJoinResignTransfer.id == c.id
-        )
-
-        stored_data = jsonable_encoder(c)
-        stored_model = schemas.AttritionJoinResignTransferIn(**stored_data)
-
-        new_data = {
-            "div_id"   : p_div.id
-        }
-        updated = stored_model.copy(update=new_data)
-        stored_data.update(updated)
-
-        c_q.update(stored_data)
-
-def _merge_attr_rot(p_div: Division, c_div: Division, db: Session):
-    # from_div_id
-    child_rots = db.query(AttritionRotation).filter(
-        AttritionRotation.from_div_id == c_div.id
-    ).all()
-
-    for c in child_rots:
-        c_q = db.query(AttritionRotation).filter(
-            AttritionRotation.id == c.id
-        )
-
-        stored_data = jsonable_encoder(c)
-        stored_model = schemas.AttritionRotationIn(**stored_data)
-
-        new_data = {
-            "from_div_id"   : p_div.id
-        }
-        updated = stored_model.copy(update=new_data)
-        stored_data.update(updated)
-
-        c_q.update(stored_data)
-    
-    # to_div_id
-    child_rots = db.query(AttritionRotation).filter(
-        AttritionRotation.to_div_id == c_div.id
-    ).all()
-
-    for c in child_rots:
-        c_q = db.query(AttritionRotation).filter(
-            AttritionRotation.id == c.id
-        )
-
-        stored_data = jsonable_encoder(c)
-        stored_model = schemas.AttritionRotationIn(**stored_data)
-
-        new_data = {
-            "to_div_id"   : p_div.id
-        }
-        updated = stored_model.copy(update=new_data)
-        stored_data.update(updated)
-
-        c_q.update(stored_data)
-
-def _merge_employee(p_div: Division, c_div: Division, db: Session):
-    child_emp = db.query(Employee).filter(
-        Employee.div_id == c_div.id
-    ).all()
-
-    for e in child_emp:
-        e_q = db.query(Employee).filter(
-            Employee.id == e.id
-        )
-
-        stored_data = jsonable_encoder(e)
-        stored_model = schemas.EmployeeIn(**stored_data)
-
-        new_data = {
-            "div_id"   : p_div.id
-        }
-        updated = stored_model.copy(update=new_data)
-        stored_data.update(updated)
-
-        e_q.update(stored_data)
-    
-def _merge_csf(p_div: Division, c_div: Division, db: Session):
-    child_csfs = db.query(CSF).filter(
-        CSF.by_invdiv_div_id == c_div.id
-    ).all()
-
-    for c in child_csfs:
-        c_q = db.query(CSF).filter(
-            CSF.id == c.id
-        )
-
-        stored_data = jsonable_encoder(c)
-        stored_model = schemas.CSFIn(**stored_data)
-
-        new_data = {
-            "by_invdiv_div_id"   : p_div.id
-        }
-        updated = stored_model.copy(update=new_data)
-        stored_data.update(updated)
-
-        c_q.update(stored_data)
-    
-def _merge_project(p_div: Division, c_div: Division, db: Session):
-    child_prjs = db.query(Project).filter(
-        Project.div_id == c_div.id
-    ).all()
-
-    for p in child_prjs:
-        p_q = db.query(Project).filter(
-            Project.id == p.id
-        )
-
-        stored_data = jsonable_encoder(p)
-        stored_model = schemas.ProjectIn(**stored_data)
-
-        new_data = {
-            "div_id"   : p_div.id
-        }
-        updated = stored_model.copy(update=new_data)
-        stored_data.update(updated)
-
-        p_q.update(stored_data)
-    
-def __switch_project_div(p:Project, new_div: Division, db:Session):
-    p_q = db.query(Project).filter(Project.id == p.id)
-
-    stored_data = jsonable_encoder(p)
-    stored_model = schemas.ProjectIn(**stored_data)
-
-    new_data = {
-        "div_id"   : new_div.id
-    }
-    updated = stored_model.copy(update=new_data)
-    stored_data.update(updated)
-
-    p_q.update(stored_data)
     db.commit()
 
-    return
-
-def _merge_yearlytrainingbudget(p_div: Division, c_div: Division, db: Session):
-    parent_q = db.query(TrainingBudget).filter(
-        TrainingBudget.div_id == p_div.id
-    )
+    return {'details': 'Success', 'rows': res}
 
-    child_q = db.query(TrainingBudget).filter(
-        TrainingBudget.div_id == c_div.id
-    )
+@router.post('/admin/operation/merge-division/preview')
+def preview_merge_division(req: schemas.DivisionMerge, db: Session = Depends(get_db)):
+    """Rows merge_division would update per step, nothing is written"""
+    (parent_div, child_div) = _get_merged_divs(req, db)
 
-    try:
-        parent  = parent_q.one()
-        child   = child_q.one()
-    except MultipleResultsFound:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Either Parent or Child Div has more than one TrainingBudget")
-    except NoResultFound:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Either Parent or Child Div has no TrainingBudget")
-
-    stored_data = jsonable_encoder(parent)
-    stored_model = schemas.TrainingBudgetIn(**stored_data)
-
-    new_data = {
-        "budget"   : parent.budget + child.budget
+    return {
+        'rows': {name: query.count() for (name, query, _) in _division_merge_steps(parent_div, child_div, db)}
     }
-    updated = stored_model.copy(update=new_data)
-    stored_data.update(updated)
 
-    parent_q.update(stored_data)
+def _get_merged_divs(req: schemas.DivisionMerge, db: Session):
+    parent_div  = get_div_by_shortname(req.mother_division, db)
+    child_div   = get_div_by_shortname(req.child_division, db)
 
-def _merge_yearlyattr(p_div: Division, c_div: Division, db: Session):
-    parent_q = db.query(YearlyAttrition).filter(
-        YearlyAttrition.div_id == p_div.id
-    )
+    if parent_div.id == child_div.id:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Division ({req.child_division}) can't be merged into itself!")
 
-    child_q = db.query(YearlyAttrition).filter(
-        YearlyAttrition.div_id == c_div.id
-    )
+    return (parent_div, child_div)
 
-    try:
-        parent  = parent_q.one()
-        child   = child_q.one()
-    except MultipleResultsFound:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Either Parent or Child Div has more than one YearlyAttrition")
-    except NoResultFound:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Either Parent or Child Div has no YearlyAttrition")
+def _division_merge_steps(p_div: Division, c_div: Division, db: Session):
+    """Returns (name, query, values) of the bulk UPDATEs (DELETE when values is None) of a merge, in run order.
+    Each query selects the same rows before and after the steps preceding it run"""
+    (p, c) = (p_div.id, c_div.id)
+    res = []
 
-    stored_data = jsonable_encoder(parent)
-    stored_model = schemas.YearlyAttritionIn(**stored_data)
+    # Yearly rows: summed into the parent's row of the same year, moved to the parent for the years it has none
+    for (model, columns) in [
+        (YearlyAttrition, ["start_headcount", "budget_headcount"]),
+        (TrainingBudget, ["budget"]),
+    ]:
+        child = aliased(model)
+        parent_years = db.query(model.year).filter(model.div_id == p)
+        child_years  = db.query(model.year).filter(model.div_id == c)
+
+        summed = {
+            getattr(model, col): getattr(model, col) + db.query(func.coalesce(func.sum(getattr(child, col)), 0)).filter(
+                child.div_id == c, child.year == model.year
+            ).scalar_subquery()
+            for col in columns
+        }
 
-    new_data = {
-        "start_headcount"   : parent.start_headcount + child.start_headcount,
-        "budget_headcount"  : parent.budget_headcount + child.budget_headcount
-    }
-    updated = stored_model.copy(update=new_data)
-    stored_data.update(updated)
+        res += [
+            (f"{model.__tablename__}_summed",   db.query(model).filter(model.div_id == p, model.year.in_(child_years)), summed),
+            (f"{model.__tablename__}_moved",    db.query(model).filter(model.div_id == c, ~model.year.in_(parent_years)), {model.div_id: p}),
+            (f"{model.__tablename__}_deleted",  db.query(model).filter(model.div_id == c, model.year.in_(parent_years)), None),
+        ]
+
+    res += [
+        ("projects",            db.query(Project).filter(Project.div_id == c),                          {Project.div_id: p}),
+        ("csfs",                db.query(CSF).filter(CSF.by_invdiv_div_id == c),                        {CSF.by_invdiv_div_id: p}),
+        ("employees",           db.query(Employee).filter(Employee.div_id == c),                        {Employee.div_id: p}),
+        ("attrition_jrts",      db.query(AttritionJoinResignTransfer).filter(AttritionJoinResignTransfer.div_id == c), {AttritionJoinResignTransfer.div_id: p}),
+        ("attrition_rots_from", db.query(AttritionRotation).filter(AttritionRotation.from_div_id == c), {AttritionRotation.from_div_id: p}),
+        ("attrition_rots_to",   db.query(AttritionRotation).filter(AttritionRotation.to_div_id == c),   {AttritionRotation.to_div_id: p}),
+    ]
 
-    parent_q.update(stored_data)
+    return res
 
 ### History ###
-@router.get('/historic/employee/year/{year}')
+@router.get('/historic/employee/year/{year}', dependencies=[Depends(cache.etag(EmployeeHistory, CertHistory, daily=True))])
 def get_employee_historic(year:int, db: Session = Depends(get_db)):
     endDate = datetime.date(year,12,31)
 
-    datas = db.query(EmployeeHistory).filter(
+    datas = db.query(EmployeeHistory).options(*loaders.EMPLOYEE_HISTORY_TABLE).filter(
         EmployeeHistory.year == year
     ).all()
 
@@ -379,7 +206,7 @@ def get_employee_historic(year:int, db: Session = Depends(get_db)):
     
     return res
 
-@router.get('/historic/division/year/{year}')
+@router.get('/historic/division/year/{year}', dependencies=[Depends(cache.etag(DivisionHistory))])
 def get_division_historic(year:int, db: Session = Depends(get_db)):
     datas = db.query(DivisionHistory).filter(
         DivisionHistory.year == year
@@ -398,7 +225,7 @@ def get_division_historic(year:int, db: Session = Depends(get_db)):
     
     return res
 
-@router.get('/historic/attr/rot/year/{year}')
+@router.get('/historic/attr/rot/year/{year}', dependencies=[Depends(cache.etag(AttritionRotationTableHistory))])
 def get_attrjrt_historic(year:int, db: Session = Depends(get_db)):
     datas = db.query(AttritionJRTTableHistory).filter(
         AttritionJRTTableHistory.year == year
@@ -418,7 +245,7 @@ def get_attrjrt_historic(year:int, db: Session = Depends(get_db)):
     
     return res
 
-@router.get('/historic/attr/jrt/year/{year}')
+@router.get('/historic/attr/jrt/year/{year}', dependencies=[Depends(cache.etag(AttritionJRTTableHistory))])
 def get_attrjrt_historic(year:int, db: Session = Depends(get_db)):
     datas = db.query(AttritionJRTTableHistory).filter(
         AttritionJRTTableHistory.year == year
@@ -438,7 +265,7 @@ def get_attrjrt_historic(year:int, db: Session = Depends(get_db)):
     
     return res
 
-@router.get('/historic/attr/main/year/{year}')
+@router.get('/historic/attr/main/year/{year}', dependencies=[Depends(cache.etag(AttritionMainTableHistory))])
 def get_attrmain_historic(year:int, db: Session = Depends(get_db)):
     datas = db.query(AttritionMainTableHistory).filter(
         AttritionMainTableHistory.year == year
@@ -472,7 +299,7 @@ def get_attrmain_historic(year:int, db: Session = Depends(get_db)):
     
     return res
 
-@router.get('/historic/qaip/year/{year}')
+@router.get('/historic/qaip/year/{year}', dependencies=[Depends(cache.etag(QAResultHistory))])
 def get_training_historic(year:int, db: Session = Depends(get_db)):
     datas = db.query(QAResultHistory).filter(
         QAResultHistory.year == year
@@ -497,7 +324,7 @@ def get_training_historic(year:int, db: Session = Depends(get_db)):
     
     return res
 
-@router.get('/historic/busu/year/{year}')
+@router.get('/historic/busu/year/{year}', dependencies=[Depends(cache.etag(BUSUHistory))])
 def get_busu_historic(year:int, db: Session = Depends(get_db)):
     datas = db.query(BUSUHistory).filter(
         BUSUHistory.year == year
@@ -518,7 +345,7 @@ def get_busu_historic(year:int, db: Session = Depends(get_db)):
     return res
 
 @router.get('/historic/busu/download/proof/id/{id}')
-def get_busu_proof(id: int, db: Session = Depends(get_db)):
+def get_busu_proof(id: int, request: Request, db: Session = Depends(get_db)):
     b_q = db.query(BUSUHistory).filter(
         BUSUHistory.id == id
     )
@@ -530,11 +357,11 @@ def get_busu_proof(id: int, db: Session = Depends(get_db)):
     if busu.proof == "" or busu.proof == None:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, f"No uploaded proof for BUSUHistory ({busu.name})")
     elif fio.is_file_exist(busu.proof):
-        return FileResponse(busu.proof)
+        return fio.file_response(busu.proof, request)
     else:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Cannot find file on filepath ({busu.proof})")
 
-@router.get('/historic/csf/year/{year}')
+@router.get('/historic/csf/year/{year}', dependencies=[Depends(cache.etag(CSFHistory))])
 def get_csf_historic(year:int, db: Session = Depends(get_db)):
     datas = db.query(CSFHistory).filter(
         CSFHistory.year == year
@@ -586,7 +413,7 @@ def get_csf_historic(year:int, db: Session = Depends(get_db)):
     
     return res
 
-@router.get('/historic/auditnews/year/{year}')
+@router.get('/historic/auditnews/year/{year}', dependencies=[Depends(cache.etag(SocialContribHistory))])
 def get_auditnews_historic(year:int, db: Session = Depends(get_db)):
     datas = db.query(SocialContribHistory).filter(
         SocialContribHistory.year == year
@@ -608,7 +435,7 @@ def get_auditnews_historic(year:int, db: Session = Depends(get_db)):
     return res
 
 @router.get('/historic/project/download/proof/id/{id}')
-def get_project_proof(id: int, db: Session = Depends(get_db)):
+def get_project_proof(id: int, request: Request, db: Session = Depends(get_db)):
     p_q = db.query(ProjectHistory).filter(
         ProjectHistory.id == id
     )
@@ -622,11 +449,11 @@ def get_project_proof(id: int, db: Session = Depends(get_db)):
     if project.pa_proof == "" or project.pa_proof == None:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, f"No uploaded proof for ProjectHistory ({project.p_name})")
     elif fio.is_file_exist(project.pa_proof):
-        return FileResponse(project.pa_proof)
+        return fio.file_response(project.pa_proof, request)
     else:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Cannot find file on filepath ({project.pa_proof})")
 
-@router.get('/historic/project/year/{year}')
+@router.get('/historic/project/year/{year}', dependencies=[Depends(cache.etag(ProjectHistory))])
 def get_project_historic(year:int, db: Session = Depends(get_db)):
     datas = db.query(ProjectHistory).filter(
         ProjectHistory.year == year
@@ -654,7 +481,7 @@ def get_project_historic(year:int, db: Session = Depends(get_db)):
     return res
 
 @router.get('/historic/training/download/proof/id/{id}')
-def get_training_proof(id: int, db: Session = Depends(get_db)):
+def get_training_proof(id: int, request: Request, db: Session = Depends(get_db)):
     t_q = db.query(TrainingHistory).filter(
         TrainingHistory.id == id
     )
@@ -668,11 +495,11 @@ def get_training_proof(id: int, db: Session = Depends(get_db)):
     if train.proof == "" or train.proof == None:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, f"No uploaded proof for Training ({train.name})")
     elif fio.is_file_exist(train.proof):
-        return FileResponse(train.proof)
+        return fio.file_response(train.proof, request)
     else:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Cannot find file on filepath ({train.proof})")
 
-@router.get('/historic/training/year/{year}')
+@router.get('/historic/training/year/{year}', dependencies=[Depends(cache.etag(TrainingHistory))])
 def get_training_historic(year:int, db: Session = Depends(get_db)):
     datas = db.query(TrainingHistory).filter(
         TrainingHistory.year == year
@@ -698,7 +525,7 @@ def get_training_historic(year:int, db: Session = Depends(get_db)):
     
     return res
 
-@router.get('/historic/training/budget/year/{year}')
+@router.get('/historic/training/budget/year/{year}', dependencies=[Depends(cache.etag(TrainingBudgetHistory))])
 def get_training_budget_historic(year:int, db: Session = Depends(get_db)):
     datas = db.query(TrainingBudgetHistory).filter(
         TrainingBudgetHistory.year == year
@@ -715,16 +542,276 @@ def get_training_budget_historic(year:int, db: Session = Depends(get_db)):
     
     return res
 
+### Dashboard Aggregates & Response Cache ###
+@router.post('/admin/operation/rebuild_dashboard')
+def rebuild_dashboard_aggregates(db: Session = Depends(get_db)):
+    summ.rebuild(db)
+    db.commit()
+
+    return {"Details": "Success"}
+
+@router.get('/admin/operation/cache_stats')
+def get_cache_stats():
+    return cache.get_stats()
+
+@router.post('/admin/operation/proof_store/migrate')
+def migrate_proofs_to_store(db: Session = Depends(get_db)):
+    """Moves the proofs still stored at their own path into the deduplicating proof store"""
+    res = ps.migrate_existing(db)
+    res["swept"] = ps.sweep(db)
+
+    return res
+
+@router.get('/admin/operation/proof_store/audit')
+def get_proof_store_audit(sample: int = 20, db: Session = Depends(get_db)):
+    """Orphaned, miscounted, missing and stray proof files, as counts and up to sample entries each"""
+    return _audit_summary(ps.audit(db), sample)
+
+@router.post('/admin/operation/proof_store/repair')
+def repair_proof_store(sample: int = 20, db: Session = Depends(get_db)):
+    """Fixes the reference counts, then deletes the orphaned and stray files"""
+    res = ps.audit(db, repair=True)
+    swept = res.pop("swept")
+
+    return dict(_audit_summary(res, sample), swept=swept)
+
+def _audit_summary(res, sample: int):
+    return {
+        key: {"count": len(found), "sample": list(found.items())[:sample] if isinstance(found, dict) else found[:sample]}
+        for key, found in res.items()
+    }
+
 @router.post('/admin/operation/migrate_data')
 def migrate_data(req: schemas.Migration, db: Session = Depends(get_db)):
     year = req.year - 1
+
+    # Proofs still at their own path would be copied into the store, move them first
+    ps.migrate_existing(db)
     
     # Copy Data
     copy_data_to_historic_tables(year, db)
     delete_old_data(year,db)
+    ps.sweep(db)
     # TODO Create new Yearly Initial Data (YearlyTraining Budget, YearlyAttr)
     return {"Details": "Success"}
 
+### Year-end Migration Job ###
+MIGRATION_JOB = "year_migration"
+
+@router.post('/admin/operation/migrate_data_jobs')
+def post_migration_job(req: schemas.Migration, db: Session = Depends(get_db)):
+    """Same as migrate_data, in a background process. Returns the job id to poll"""
+    year = req.year - 1
+
+    if db.query(DivisionHistory).filter(DivisionHistory.year == year).first():
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Year ({year}) was already migrated!")
+
+    running = [
+        j for (j,) in db.query(BackgroundJob.id).filter(
+            BackgroundJob.kind == MIGRATION_JOB, BackgroundJob.stage.notin_([jobs.STAGE_DONE, jobs.STAGE_FAILED])
+        ).all()
+    ]
+    if running:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Migration job of id ({running[0]}) is still running!")
+
+    job_id = jobs.create(db, MIGRATION_JOB, year=year, completed=[])
+    jobs.submit(run_migration_job, job_id)
+
+    return {'job_id': job_id}
+
+@router.post('/admin/operation/migrate_data_jobs/{id}/resume')
+def resume_migration_job(id: int, force: bool = False, db: Session = Depends(get_db)):
+    """Runs a failed migration job again from its first uncompleted stage.
+    force also resumes a job left unfinished by a killed worker (check it isn't running anymore first)"""
+    job = jobs.get(db, id, MIGRATION_JOB)
+
+    if not job:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"Migration job of id ({id}) not found!")
+    if job["stage"] == jobs.STAGE_DONE:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Migration job of id ({id}) is already done!")
+    if job["stage"] != jobs.STAGE_FAILED and not force:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Migration job of id ({id}) is still running (stage {job['stage']}), use force if its worker was killed!")
+
+    jobs.update(id, stage=jobs.STAGE_QUEUED, error="", resumed=job["details"].get("resumed", 0) + 1)
+    jobs.submit(run_migration_job, id)
+
+    return {'job_id': id}
+
+@router.get('/admin/operation/migrate_data_jobs/{id}')
+def get_migration_job(id: int, db: Session = Depends(get_db)):
+    """The job, with the rows and proof files copied so far per copy stage"""
+    job = jobs.get(db, id, MIGRATION_JOB)
+
+    if not job:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"Migration job of id ({id}) not found!")
+
+    year = job["details"]["year"]
+    proof_columns = dict(ps.PROOF_COLUMNS)
+    progress = {}
+
+    for (name, _, models) in _copy_stages():
+        rows = files = 0
+        for model in models:
+            query = _history_query(model, year, db)
+            rows += query.count()
+
+            if model in proof_columns:
+                col = getattr(model, proof_columns[model])
+                files += query.filter(col != None, col != "").count()
+
+        progress[name] = {"rows": rows, "files": files, "done": name in job["details"]["completed"]}
+
+    for (name, _) in _delete_stages():
+        progress[name] = {"done": name in job["details"]["completed"]}
+
+    return dict(job, progress=progress)
+
+def run_migration_job(job_id: int):
+    """Background part of post_migration_job, runs in a jobs process. Stages completed by an earlier run are skipped,
+    a copy stage interrupted midway starts over"""
+    db = SessionLocal()
+    try:
+        details = jobs.get(db, job_id)["details"]
+        (year, completed) = (details["year"], details["completed"])
+
+        # Counted before the first stage, the stages' durations measure the rates dry_run_migration projects with
+        if "estimate" not in details:
+            jobs.update(job_id, estimate=_migration_estimate(year, db))
+
+        stages  = [("proof_store", lambda year, db: ps.migrate_existing(db), [])]
+        stages += _copy_stages()
+        stages += [(name, delete, []) for (name, delete) in _delete_stages()]
+        stages += [("sweep", lambda year, db: {"swept": ps.sweep(db)}, [])]
+
+        for (name, run, models) in stages:
+            if name in completed:
+                continue
+
+            with jobs.stage(job_id, name):
+                try:
+                    _clear_history(models, year, db)
+                    res = run(year, db)
+                except Exception:
+                    db.rollback() # Releases the write lock before the failure gets recorded
+                    raise
+
+            # Checkpoint
+            completed.append(name)
+            jobs.update(job_id, completed=completed, **({f"{name}_result": res} if isinstance(res, dict) else {}))
+    finally:
+        db.close()
+
+### Migration Dry Run ###
+# Rates used until a migration job measured them, ms per row of a stage and ms per MB moved into the proof store
+DEFAULT_MS_PER_ROW  = 0.5
+DEFAULT_MS_PER_MB   = 20.0
+
+@router.post('/admin/operation/migrate_data/dry_run')
+def dry_run_migration(req: schemas.Migration, db: Session = Depends(get_db)):
+    """Counts the rows and proof files each stage of migrate_data would touch and projects its duration
+    with the rates measured by the last migration job. Writes nothing"""
+    year = req.year - 1
+
+    stages = _migration_estimate(year, db)
+    (rates, job_id) = _measured_rates(db)
+
+    for (name, stage) in stages.items():
+        if name == "proof_store":
+            stage["ms"] = round(stage["bytes"] / 1e6 * rates.get(name, DEFAULT_MS_PER_MB), 1)
+        else:
+            stage["ms"] = round(stage["rows"] * rates.get(name, DEFAULT_MS_PER_ROW), 1)
+
+    return {
+        "year"          : year,
+        "stages"        : stages,
+        "rows"          : sum(s["rows"] for s in stages.values()),
+        "bytes"         : stages["proof_store"]["bytes"],
+        "projected_ms"  : round(sum(s["ms"] for s in stages.values()), 1),
+        "rates_of_job"  : job_id,
+    }
+
+def _migration_estimate(year: int, db: Session):
+    """Returns {stage: {"rows", "files", "bytes"}} of a migration of year. files/bytes of a copy stage are the proofs
+    its history rows will reference (not copied, see ps.add_refs), the ones of proof_store are moved into the store"""
+    startDate   = datetime.date(year,1,1)
+    endDate     = datetime.date(year,12,31)
+
+    budgets     = db.query(TrainingBudget).filter(TrainingBudget.year == year)
+    trainings   = db.query(Training).filter(Training.date <= endDate)
+    engs        = db.query(BUSUEngagement).filter(BUSUEngagement.date <= endDate)
+    contribs    = db.query(SocialContrib).filter(SocialContrib.date <= endDate)
+    csfs        = db.query(CSF).filter(CSF.csf_date <= endDate)
+    qaips       = db.query(QAIP).join(QAIP.prj).filter(Project.year == year)
+    prjs        = db.query(Project).filter(Project.year == year)
+    jrts        = db.query(AttritionJoinResignTransfer).filter(AttritionJoinResignTransfer.date <= endDate)
+    rots        = db.query(AttritionRotation).filter(AttritionRotation.date <= endDate)
+    certs       = db.query(Certification).filter(Certification.emp_id.in_(db.query(Employee.id)))
+
+    # (query, proof column) of the rows each stage reads or deletes, same order as _copy_stages() and _delete_stages()
+    stages = {
+        "copy_training_budget"  : [(budgets, None)],
+        "copy_training"         : [(trainings, Training.proof)],
+        "copy_busu"             : [(engs, BUSUEngagement.proof)],
+        "copy_social_contrib"   : [(contribs, None)],
+        "copy_csf"              : [(csfs, None)],
+        "copy_qaip"             : [(qaips, None)],
+        "copy_attrition"        : [
+            (db.query(Division).filter(Division.short_name != "IAH"), None),
+            (jrts.filter(AttritionJoinResignTransfer.date >= startDate), None),
+            (rots.filter(AttritionRotation.date >= startDate), None),
+        ],
+        "copy_project"          : [(prjs, Project.completion_PA)],
+        "copy_employee"         : [(db.query(Employee), None), (certs, Certification.cert_proof)],
+        "copy_division"         : [(db.query(Division), None)],
+        "delete_training_budget": [(budgets, None)],
+        "delete_training"       : [(trainings, None)],
+        "delete_busu"           : [(engs, None)],
+        "delete_social_contrib" : [(contribs, None)],
+        "delete_csf"            : [(csfs, None)],
+        "delete_qaip"           : [(qaips, None)],
+        "delete_attrition"      : [(jrts, None), (rots, None)],
+        "delete_project"        : [(prjs, None)],
+    }
+
+    pending = ps.pending(db)
+    res = {"proof_store": {"rows": pending["rows"], "files": pending["files"], "bytes": pending["bytes"]}}
+
+    for (name, queries) in stages.items():
+        rows = 0
+        filepaths = []
+
+        for (query, col) in queries:
+            rows += query.count()
+
+            if col is not None:
+                filepaths += [f for (f,) in query.filter(col != None, col != "").with_entities(col).all() if fio.is_file_exist(f)]
+
+        res[name] = {"rows": rows, "files": len(filepaths), "bytes": sum(os.path.getsize(f) for f in set(filepaths))}
+
+    return res
+
+def _measured_rates(db: Session):
+    """Returns ({stage: ms per row, "proof_store": ms per MB}, job id) measured by the last done migration job that
+    recorded an estimate, ({}, None) without one"""
+    done = db.query(BackgroundJob.id).filter(
+        BackgroundJob.kind == MIGRATION_JOB, BackgroundJob.stage == jobs.STAGE_DONE
+    ).order_by(desc(BackgroundJob.id))
+
+    for (job_id,) in done:
+        details = jobs.get(db, job_id)["details"]
+        if "estimate" not in details:
+            continue
+
+        rates = {}
+        for (name, stage) in details["estimate"].items():
+            amount = stage["bytes"] / 1e6 if name == "proof_store" else stage["rows"]
+            if amount and f"{name}_ms" in details:
+                rates[name] = details[f"{name}_ms"] / amount
+
+        return (rates, job_id)
+
+    return ({}, None)
+
 @router.get('/admin/operation/migrate_data')
 def get_migration_year(db: Session = Depends(get_db)):
     res_year = _get_latest_historic_year_or_none(db)
@@ -750,43 +837,77 @@ def _get_curr_year(db: Session):
         return 2021
 
 def copy_data_to_historic_tables(year: int, db: Session):
-    _copy_training_budget_data(year, db)
-    _copy_training_data(year, db)
-    _copy_busu_data(year, db)
-    _copy_socContrrib_data(year, db)
-    _copy_csf_data(year, db)
-    _copy_qaip_data(year, db)
-    _copy_attr_data(year, db)
-    _copy_prj_data(year, db)
-    _copy_emp_data(year, db)
-    _copy_div_data(year, db)
+    for (_, copy, _) in _copy_stages():
+        copy(year, db)
 
 def delete_old_data(year: int, db: Session):
-    _delete_training_budget_data(year, db)
-    _delete_training_data(year,db)
-    _delete_busu_data(year,db)
-    _delete_socContrrib_data(year, db)
-    _delete_csf_data(year, db)
-    _delete_qaip_data(year, db)
-    _delete_attr_data(year, db)
-    _delete_prj_data(year, db)
+    for (_, delete) in _delete_stages():
+        delete(year, db)
+
+def _copy_stages():
+    """Returns (stage name, function, history models it fills) of the copies, in run order"""
+    return [
+        ("copy_training_budget",    _copy_training_budget_data, [TrainingBudgetHistory]),
+        ("copy_training",           _copy_training_data,        [TrainingHistory]),
+        ("copy_busu",               _copy_busu_data,            [BUSUHistory]),
+        ("copy_social_contrib",     _copy_socContrrib_data,     [SocialContribHistory]),
+        ("copy_csf",                _copy_csf_data,             [CSFHistory]),
+        ("copy_qaip",               _copy_qaip_data,            [QAResultHistory]),
+        ("copy_attrition",          _copy_attr_data,            [AttritionMainTableHistory, AttritionJRTTableHistory, AttritionRotationTableHistory]),
+        ("copy_project",            _copy_prj_data,             [ProjectHistory]),
+        ("copy_employee",           _copy_emp_data,             [CertHistory, EmployeeHistory]),
+        ("copy_division",           _copy_div_data,             [DivisionHistory]),
+    ]
+
+def _delete_stages():
+    """Returns (stage name, function) of the deletions of the migrated rows, in run order"""
+    return [
+        ("delete_training_budget",  _delete_training_budget_data),
+        ("delete_training",         _delete_training_data),
+        ("delete_busu",             _delete_busu_data),
+        ("delete_social_contrib",   _delete_socContrrib_data),
+        ("delete_csf",              _delete_csf_data),
+        ("delete_qaip",             _delete_qaip_data),
+        ("delete_attrition",        _delete_attr_data),
+        ("delete_project",          _delete_prj_data),
+    ]
+
+def _history_query(model, year: int, db: Session):
+    if model is CertHistory: # Year of the owner
+        return db.query(CertHistory).filter(
+            CertHistory.emp_id.in_(db.query(EmployeeHistory.id).filter(EmployeeHistory.year == year))
+        )
+
+    return db.query(model).filter(model.year == year)
+
+def _clear_history(models, year: int, db: Session):
+    """Deletes the year's rows of the history models, releasing their proofs. Lets an interrupted copy start over"""
+    proof_columns = dict(ps.PROOF_COLUMNS)
+
+    for model in models:
+        query = _history_query(model, year, db)
+
+        if model in proof_columns:
+            for (filepath,) in query.with_entities(getattr(model, proof_columns[model])).all():
+                ps.drop(filepath, db)
+
+        query.delete(synchronize_session=False)
+
+    db.commit()
 
 def _copy_training_budget_data(year: int, db: Session):
     budgets = db.query(TrainingBudget).filter(
         TrainingBudget.year == year
     ).all()
 
-    for b in budgets:
-        # Create History Entry
-        budgetH = TrainingBudgetHistory(
-            year        = b.year,
-            budget      = b.budget,
-            division    = b.div.short_name
-        )
+    rows = [{
+        "year"      : b.year,
+        "budget"    : b.budget,
+        "division"  : b.div.short_name
+    } for b in budgets]
 
-        db.add(budgetH)
-        db.commit()
-        db.refresh(budgetH)
+    _bulk_insert(TrainingBudgetHistory, rows, db)
+    db.commit()
 
 def _copy_training_data(year: int, db: Session):
     endDate = datetime.date(year,12,31)
@@ -794,45 +915,32 @@ def _copy_training_data(year: int, db: Session):
         Training.date <= endDate
     ).all()
 
-    for t in trainings:
-        emp = get_emp(t.emp_id, db)
+    emps = _emps_by_id(db)
+    proofs = _copied_proofs([t.proof for t in trainings], db)
 
-        # Create History Entry
-        trainingH = TrainingHistory(
-            year        = year,
-            nik         = emp.staff_id if emp else None,
-            division    = emp.part_of_div.short_name if emp else None,
-            emp_name    = emp.name if emp else None,
-            name        = t.name,
-            date        = t.date,
-            hours       = t.duration_hours,
-            budget      = t.budget,
-            realized    = t.realization,
-            charged     = t.charged_by_fin,
-            mandatory   = t.mandatory_from,
-            remark      = t.remark,
-
-            proof       = ""
-        )
-        db.add(trainingH)
-        db.commit()
-        db.refresh(trainingH)
-
-        # Handle Proof File Copy
-        if fio.is_file_exist(t.proof):
-            new_proof = fio.migrate_training_proof(t.proof, year, emp.id, trainingH.id)
+    rows = []
+    for t in trainings:
+        emp = emps.get(t.emp_id) or get_emp(t.emp_id, db)
+
+        rows.append({
+            "year"      : year,
+            "nik"       : emp.staff_id if emp else None,
+            "division"  : emp.part_of_div.short_name if emp else None,
+            "emp_name"  : emp.name if emp else None,
+            "name"      : t.name,
+            "date"      : t.date,
+            "hours"     : t.duration_hours,
+            "budget"    : t.budget,
+            "realized"  : t.realization,
+            "charged"   : t.charged_by_fin,
+            "mandatory" : t.mandatory_from,
+            "remark"    : t.remark,
+
+            "proof"     : proofs.get(t.proof, "")
+        })
 
-            # Update History Proof
-            tH_query = db.query(TrainingHistory).filter(
-                TrainingHistory.id == trainingH.id
-            )
-            stored_data = jsonable_encoder(trainingH)
-            stored_model = schemas.TrainingHistory(**stored_data)
-            new_data = {"proof": new_proof}
-            updated = stored_model.copy(update=new_data)
-            stored_data.update(updated)
-            tH_query.update(stored_data)
-            db.commit()
+    _bulk_insert(TrainingHistory, rows, db)
+    db.commit()
 
 def _copy_busu_data(year: int, db: Session):
     endDate = datetime.date(year,12,31)
@@ -840,39 +948,26 @@ def _copy_busu_data(year: int, db: Session):
         BUSUEngagement.date <= endDate
     ).all()
 
+    emps = _emps_by_id(db)
+    proofs = _copied_proofs([e.proof for e in engs], db)
+
+    rows = []
     for e in engs:
-        emp = get_emp(e.creator_id, db)
+        emp = emps.get(e.creator_id) or get_emp(e.creator_id, db)
 
-        # Create History Entry
-        engH = BUSUHistory(
-            year        = year,
-            tl_name     = emp.name,
-            division    = emp.part_of_div.short_name,
-            WorM        = e.eng_type.name,
-            name        = e.activity_name,
-            date        = e.date,
+        rows.append({
+            "year"      : year,
+            "tl_name"   : emp.name,
+            "division"  : emp.part_of_div.short_name,
+            "WorM"      : e.eng_type.name,
+            "name"      : e.activity_name,
+            "date"      : e.date,
 
-            proof       = None
-        )
-        db.add(engH)
-        db.commit()
-        db.refresh(engH)
-
-        # Handle Proof File Copy
-        if fio.is_file_exist(e.proof):
-            new_proof = fio.migrate_busu_proof(e.proof, year, emp.id, engH.id)
+            "proof"     : proofs.get(e.proof)
+        })
 
-            # Update History Proof
-            eH_query = db.query(BUSUHistory).filter(
-                BUSUHistory.id == engH.id
-            )
-            stored_data = jsonable_encoder(engH)
-            stored_model = schemas.BUSUHistory(**stored_data)
-            new_data = {"proof": new_proof}
-            updated = stored_model.copy(update=new_data)
-            stored_data.update(updated)
-            eH_query.update(stored_data)
-            db.commit()
+    _bulk_insert(BUSUHistory, rows, db)
+    db.commit()
 
 def _copy_socContrrib_data(year: int, db: Session):
     endDate = datetime.date(year,12,31)
@@ -938,8 +1033,8 @@ def _copy_csf_data(year: int, db: Session):
     db.commit()
 
 def _copy_qaip_data(year: int, db: Session):
-    qaips = db.query(QAIP).filter(
-        QAIP.prj.has(year=year)
+    qaips = db.query(QAIP).join(QAIP.prj).filter(
+        Project.year == year
     ).all()
 
     for q in qaips:
@@ -1070,125 +1165,107 @@ def _copy_prj_data(year: int, db: Session):
         Project.year == year
     ).all()
 
-    for p in prjs:
-        try:
-            tl = get_emp(p.tl_id, db)
-        except Exception:
-            tl = None
-
-        # Create History Entry
-        projectH = ProjectHistory(
-            year        = year,
-            p_name      = p.name,
-            div         = p.div.short_name,
-            tl_name     = tl.name if tl else None,
-            tl_nik      = tl.staff_id if tl else None,
-            status      = p.status.name,
-            use_da      = p.used_DA,
-            carried_over= p.is_carried_over,
-            timely      = p.timely_report,
-            pa_proof    = None
-        )
-        db.add(projectH)
-        db.commit()
-        db.refresh(projectH)
+    emps = _emps_by_id(db)
+    proofs = _copied_proofs([p.completion_PA for p in prjs], db)
 
-        # Handle Proof File Copy
-        if fio.is_file_exist(p.completion_PA):
-            new_proof = fio.migrate_pa_completion(p.completion_PA, year, projectH.id)
+    rows = []
+    for p in prjs:
+        tl = emps.get(p.tl_id)
+
+        rows.append({
+            "year"          : year,
+            "p_name"        : p.name,
+            "div"           : p.div.short_name,
+            "tl_name"       : tl.name if tl else None,
+            "tl_nik"        : tl.staff_id if tl else None,
+            "status"        : p.status.name,
+            "use_da"        : p.used_DA,
+            "carried_over"  : p.is_carried_over,
+            "timely"        : p.timely_report,
+            "pa_proof"      : proofs.get(p.completion_PA)
+        })
 
-            # Update History Proof
-            eH_query = db.query(BUSUHistory).filter(
-                ProjectHistory.id == projectH.id
-            )
-            stored_data = jsonable_encoder(projectH)
-            stored_model = schemas.ProjectHistory(**stored_data)
-            new_data = {"pa_proof": new_proof}
-            updated = stored_model.copy(update=new_data)
-            stored_data.update(updated)
-            eH_query.update(stored_data)
-            db.commit()
+    _bulk_insert(ProjectHistory, rows, db)
+    db.commit()
 
 def _copy_emp_data(year: int, db: Session):
     emps = db.query(Employee).all()
 
-    for e in emps:
-        # Create History Entry
-        empH = EmployeeHistory(
-            year                    = year,
-            name                    = e.name,
-            email                   = e.email,
-            staff_id                = e.staff_id,
-            role                    = e.role.name,
-            division                = e.part_of_div.short_name,
-            div_stream              = e.div_stream,
-            corporate_title         = e.corporate_title,
-            corporate_grade         = e.corporate_grade,
-            gender                  = e.gender,
-            edu_level               = e.edu_level,
-            edu_major               = e.edu_major,
-            edu_category            = e.edu_category,
-            ia_background           = e.ia_background,
-            ea_background           = e.ea_background,
-            year_audit_non_uob      = e.year_audit_non_uob,
-            date_of_birth           = e.date_of_birth,
-            date_first_employment   = e.date_first_employment,
-            date_first_uob          = e.date_first_uob,
-            date_first_ia           = e.date_first_ia,
-            active                  = e.active
-        )
-        db.add(empH)
-        db.commit()
-        db.refresh(empH)
-
-        # Handle Certs
-        for c in e.emp_certifications:
-            certHistory = CertHistory(
-                cert_name   = c.cert_name,
-                cert_proof  = "",
-                emp_id = empH.id
-            )
-
-            db.add(certHistory)
-            db.commit()
-            db.refresh(certHistory)
-
-            # Handle Proofs
-            if fio.is_file_exist(c.cert_proof):
-                new_proof = fio.migrate_cert(c.cert_proof, year, empH.id, certHistory.id)
-
-                # Update History Proof
-                certH_query = db.query(CertHistory).filter(
-                    CertHistory.id == certHistory.id
-                )
-                stored_data = jsonable_encoder(certHistory)
-                stored_model = schemas.CertHistory(**stored_data)
-                new_data = {"cert_proof": new_proof}
-                updated = stored_model.copy(update=new_data)
-                stored_data.update(updated)
-                certH_query.update(stored_data)
-                db.commit()
+    certs = {}
+    for c in db.query(Certification).order_by(Certification.id).all():
+        certs.setdefault(c.emp_id, []).append(c)
+
+    proofs = _copied_proofs([c.cert_proof for e in emps for c in certs.get(e.id, [])], db)
+
+    rows = [{
+        "year"                  : year,
+        "name"                  : e.name,
+        "email"                 : e.email,
+        "staff_id"              : e.staff_id,
+        "role"                  : e.role.name,
+        "division"              : e.part_of_div.short_name,
+        "div_stream"            : e.div_stream,
+        "corporate_title"       : e.corporate_title,
+        "corporate_grade"       : e.corporate_grade,
+        "gender"                : e.gender,
+        "edu_level"             : e.edu_level,
+        "edu_major"             : e.edu_major,
+        "edu_category"          : e.edu_category,
+        "ia_background"         : e.ia_background,
+        "ea_background"         : e.ea_background,
+        "year_audit_non_uob"    : e.year_audit_non_uob,
+        "date_of_birth"         : e.date_of_birth,
+        "date_first_employment" : e.date_first_employment,
+        "date_first_uob"        : e.date_first_uob,
+        "date_first_ia"         : e.date_first_ia,
+        "active"                : e.active
+    } for e in emps]
+
+    _bulk_insert(EmployeeHistory, rows, db)
+
+    # Ids of the rows just inserted, in insertion order. Nothing else can write until the commit
+    empH_ids = [id for (id,) in db.query(EmployeeHistory.id).order_by(EmployeeHistory.id.desc()).limit(len(rows)).all()]
+    empH_ids.reverse()
+
+    cert_rows = [{
+        "cert_name" : c.cert_name,
+        "cert_proof": proofs.get(c.cert_proof, ""),
+        "emp_id"    : empH_id
+    } for (e, empH_id) in zip(emps, empH_ids) for c in certs.get(e.id, [])]
+
+    _bulk_insert(CertHistory, cert_rows, db)
+    db.commit()
 
 def _copy_div_data(year: int, db: Session):
     divs = db.query(Division).all()
+    emps = _emps_by_id(db)
 
+    rows = []
     for d in divs:
-        try:
-            dh = get_emp(d.dh_id, db)
-        except Exception:
-            dh = None
+        dh = emps.get(d.dh_id)
+
+        rows.append({
+            "year"      : year,
+            "short_name": d.short_name,
+            "long_name" : d.long_name,
+            "dh_name"   : dh.name if dh else None,
+            "dh_nik"    : dh.staff_id if dh else None
+        })
 
-        divH = DivisionHistory(
-            year        = year,
-            short_name  = d.short_name,
-            long_name   = d.long_name,
-            dh_name     = dh.name if dh else None,
-            dh_nik      = dh.staff_id if dh else None
-        )
+    _bulk_insert(DivisionHistory, rows, db)
+    db.commit()
 
-        db.add(divH)
-        db.commit()
-        db.refresh(divH)
+def _bulk_insert(model, rows, db: Session):
+    """Inserts the rows (dicts) with a single executemany. Does not commit"""
+    if rows:
+        db.execute(sqlite_insert(model), rows)
+
+def _emps_by_id(db: Session):
+    return {e.id: e for e in db.query(Employee).all()}
+
+def _copied_proofs(filepaths, db: Session):
+    """Adds a reference to every existing proof of filepaths for its history row, returns {filepath: blob path}"""
+    return ps.add_refs([f for f in filepaths if fio.is_file_exist(f)], db)
 
 def _delete_training_budget_data(year: int, db: Session):
     budgets = db.query(TrainingBudget).filter(
@@ -1207,8 +1284,7 @@ def _delete_training_data(year: int, db: Session):
 
     # Delete Training Data
     for t in trainings:
-        if fio.is_file_exist(t.proof):
-            fio.delete_file(t.proof)
+        ps.drop(t.proof, db)
         db.delete(t)
     db.commit()
 
@@ -1220,8 +1296,7 @@ def _delete_busu_data(year: int, db: Session):
 
     # Delete Data
     for b in busus:
-        if fio.is_file_exist(b.proof):
-            fio.delete_file(b.proof)
+        ps.drop(b.proof, db)
         db.delete(b)
     db.commit()
 
@@ -1248,8 +1323,8 @@ def _delete_csf_data(year: int, db: Session):
     db.commit()
 
 def _delete_qaip_data(year: int, db: Session):
-    qaips = db.query(QAIP).filter(
-        QAIP.prj.has(year=year)
+    qaips = db.query(QAIP).join(QAIP.prj).filter(
+        Project.year == year
     ).all()
 
     # Delete Data
@@ -1284,56 +1359,57 @@ def _delete_prj_data(year:int, db: Session):
 
     # Delete Data
     for p in prjs:
+        ps.drop(p.completion_PA, db)
         db.delete(p)
     db.commit()
 
 ### File ###
 @router.get('/admin/audit_project_data/download/pa/id/{id}')
-def get_prj_paproof_proof(id: int, db: Session = Depends(get_db)):
+def get_prj_paproof_proof(id: int, request: Request, db: Session = Depends(get_db)):
     prj = get_prj_by_id(id, db)
 
     if prj.completion_PA == "":
         raise HTTPException(status.HTTP_400_BAD_REQUEST, f"No uploaded proof for PA Completion of Project ({prj.name})")
     elif fio.is_file_exist(prj.completion_PA):
-        return FileResponse(prj.completion_PA)
+        return fio.file_response(prj.completion_PA, request)
     else:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Cannot find file on filepath ({prj.completion_PA})")
 
 @router.get('/admin/training_data/download/proof/id/{id}')
-def get_training_proof(id: int, db: Session = Depends(get_db)):
+def get_training_proof(id: int, request: Request, db: Session = Depends(get_db)):
     train = get_training_by_id(id, db)
 
     if train.proof == "":
         raise HTTPException(status.HTTP_400_BAD_REQUEST, f"No uploaded proof for Training ({train.name})")
     elif fio.is_file_exist(train.proof):
-        return FileResponse(train.proof)
+        return fio.file_response(train.proof, request)
     else:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Cannot find file on filepath ({train.proof})")
 
 @router.get('/admin/busu_data/download/proof/id/{id}')
-def get_busu_proof(id: int, db: Session = Depends(get_db)):
+def get_busu_proof(id: int, request: Request, db: Session = Depends(get_db)):
     busu = get_busu_by_id(id, db)
 
     if busu.proof == "":
         raise HTTPException(status.HTTP_400_BAD_REQUEST, f"No uploaded proof for BUSU Engagement ({busu.activity_name})")
     elif fio.is_file_exist(busu.proof):
-        return FileResponse(busu.proof)
+        return fio.file_response(busu.proof, request)
     else:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Cannot find file on filepath ({busu.proof})")
 
 @router.get('/profile/get_cert_proof/id/{id}')
-def get_cert_proof(id: int, db: Session = Depends(get_db)):
+def get_cert_proof(id: int, request: Request, db: Session = Depends(get_db)):
     cert = get_cert_by_id(id, db)
 
     if cert.cert_proof == "":
         raise HTTPException(status.HTTP_400_BAD_REQUEST, f"No uploaded proof for Cert ({cert.cert_name})")
     elif fio.is_file_exist(cert.cert_proof):
-        return FileResponse(cert.cert_proof)
+        return fio.file_response(cert.cert_proof, request)
     else:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Cannot find file on filepath ({cert.cert_proof})")
 
 @router.get('/admin/employee/download/cert/cname/{cert_name}/nik/{nik}')
-def get_cert_proof(cert_name: str, nik: str, db: Session = Depends(get_db)):
+def get_cert_proof(cert_name: str, nik: str, request: Request, db: Session = Depends(get_db)):
     # Check if cert_name is SMR_x
     if "SMR_" in cert_name:
         smr_lvl = cert_name[-1]
@@ -1352,7 +1428,7 @@ def get_cert_proof(cert_name: str, nik: str, db: Session = Depends(get_db)):
     elif not fio.is_file_exist(cert.cert_proof):
         raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Cert of name ({cert_name}) and Employee of NIK ({nik}) was found (id:{cert.id}, but file ({cert.cert_proof}) doesn't exist in server!")
         
-    return FileResponse(cert.cert_proof)
+    return fio.file_response(cert.cert_proof, request)
 
 @router.post('/project/submit_pa_form/{year}')
 def post_pa_completion_form(
@@ -1361,8 +1437,6 @@ def post_pa_completion_form(
     attachment_proof: UploadFile = File(...), 
     db: Session = Depends(get_db)
 ):
-    data = attachment_proof.file.read()
-
     # Check Project Name
     prj_query = db.query(Project).filter(
         Project.year == year,
@@ -1377,7 +1451,8 @@ def post_pa_completion_form(
         raise HTTPException(status.HTTP_400_BAD_REQUEST, f"No Projects of Name ({projectTitle}) and of year ({year}) was found!")
 
     # Process Proof
-    filepath = fio.write_pa_completion_proof(prj.id, data, attachment_proof.filename)
+    filepath = ps.put(attachment_proof.file, attachment_proof.filename, db)
+    ps.drop(prj.completion_PA, db)
 
     stored_data = jsonable_encoder(prj)
     stored_model = schemas.ProjectIn(**stored_data)
@@ -1400,38 +1475,28 @@ def post_engagement_input_form(
 ):
     eng_types = ["Regular Meeting", "Workshop"]
 
-    data = proof.file.read()
     # Check NIK
     emp = get_emp_by_nik(id, db)
     emp_id = emp.id
 
+    eng_type_id = eng_types.index(WorM) + 1
+
+    # Process Proof first, an oversized upload (413) leaves no row behind
+    filepath = ps.put(proof.file, proof.filename, db)
+
     # Create BUSU Engagement
     new_eng = BUSUEngagement(
         activity_name   = activity,
         date            = utils.formstr_to_datetime(date),
-        proof           = "",
+        proof           = filepath,
         
-        eng_type_id     = eng_types.index(WorM) + 1,
+        eng_type_id     = eng_type_id,
 
         creator_id      = emp_id
     )
 
     db.add(new_eng)
     db.commit()
-    db.refresh(new_eng)
-
-    # Process Proof
-    filepath = fio.write_busu_proof(new_eng.id, emp_id, data, proof.filename)
-
-    eng_query = db.query(BUSUEngagement).filter(BUSUEngagement.id == new_eng.id)
-
-    stored_data = jsonable_encoder(new_eng)
-    stored_model = schemas.BUSUEngagementIn(**stored_data)
-    new_data = {"proof": filepath}
-    updated = stored_model.copy(update=new_data)
-    stored_data.update(updated)
-    eng_query.update(stored_data)
-    db.commit()
 
     return {"Details": "Success"}
 
@@ -1445,17 +1510,19 @@ def post_training_proof_file(
     proof           : UploadFile = File(...), 
     db: Session = Depends(get_db)
 ):
-    data = proof.file.read()
     # Check NIK
     emp = get_emp_by_nik(id, db)
     emp_id = emp.id
 
+    # Process Proof first, an oversized upload (413) leaves no row behind
+    filepath = ps.put(proof.file, proof.filename, db)
+
     # Create Training
     newTrain = Training(
         name            = name, 
         date            = utils.formstr_to_datetime(date), 
         duration_hours  = duration_hours, 
-        proof           = "",
+        proof           = filepath,
         budget          = 0,
         realization     = 0,
         charged_by_fin  = 0,
@@ -1466,27 +1533,11 @@ def post_training_proof_file(
 
     db.add(newTrain)
     db.commit()
-    db.refresh(newTrain)
-
-    # Process Proof
-    filepath = fio.write_training_proof(newTrain.id, emp_id, data, proof.filename)
-
-    train_query = db.query(Training).filter(Training.id == newTrain.id)
-
-    stored_data = jsonable_encoder(newTrain)
-    stored_model = schemas.TrainingIn(**stored_data)
-    new_data = {"proof": filepath}
-    updated = stored_model.copy(update=new_data)
-    stored_data.update(updated)
-    train_query.update(stored_data)
-    db.commit()
 
     return {"Details": "Success"}
 
 @router.post('/training/proof/{nik}/{training_id}')
 def post_training_proof_file(nik: str, training_id: int, attachment_proof: UploadFile = File(...), db: Session = Depends(get_db)):
-    data = attachment_proof.file.read()
-
     # Check NIK
     emp = get_emp_by_nik(nik,db)
     emp_id = emp.id
@@ -1505,7 +1556,8 @@ def post_training_proof_file(nik: str, training_id: int, attachment_proof: Uploa
         raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Training of ID ({training_id}) belongs to emp of id ({train.emp_id}), not ({emp_id})!")
 
 
-    filepath = fio.write_training_proof(training_id, emp_id, data, attachment_proof.filename)
+    filepath = ps.put(attachment_proof.file, attachment_proof.filename, db)
+    ps.drop(train.proof, db)
 
     # Update DB
     stored_data = jsonable_encoder(train)
@@ -1524,27 +1576,145 @@ def post_mrpt_file(mrpt: UploadFile = File(...), db: Session = Depends(get_db)):
     if not ".xlsx" in mrpt.filename:
         raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, f"Sent file ({mrpt.filename}) isnt of '.xlsx' format!")
 
-    # Parse Excel
-    data = mrpt.file.read()
-    filepath = fio.write_mrpt(data, mrpt.filename)
-    actuals, mBudgets, yBudget = pm.parse_excel_to_budgets(filepath)
-    fio.delete_file(filepath)
+    # Parse Excel, unless the same content was parsed before
+    content_key, filepath = _write_mrpt_unless_cached(mrpt.file, mrpt.filename)
+    by_year = _parse_mrpt(content_key, filepath)
 
-    # Process Monthly Actuals
-    for a in actuals:
-        # print(f"mActuals: {a['year']}/{a['month']}")
-        create_or_update_mActual(a, db)
-    
-    # Process Monthly Budget
-    for m in mBudgets:
-        # print(f"mBudgets: {m['year']}/{m['month']}")
-        create_or_update_mBudget(m, db)
+    written = import_budgets(by_year, db)
     
-    # Process Yearly Budget
-    # print(f"yBudget: {yBudget['year']}")
-    create_or_update_yBudget(yBudget, db)
-    
-    return {'details': 'All budgets updated!'}
+    return {'details': 'All budgets updated!', 'years': list(by_year), 'written': written}
+
+@router.post('/admin/budget_data/mrpt_preview')
+def post_mrpt_preview(mrpt: UploadFile = File(...), db: Session = Depends(get_db)):
+    """Dry run of post_mrpt_file: returns the budget cells the file would change, writes nothing.
+    The parsed results stay cached, uploading the same file afterwards skips parsing"""
+    if not ".xlsx" in mrpt.filename:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, f"Sent file ({mrpt.filename}) isnt of '.xlsx' format!")
+
+    content_key, filepath = _write_mrpt_unless_cached(mrpt.file, mrpt.filename)
+    try:
+        by_year = _parse_mrpt(content_key, filepath)
+    except (TypeError, FileNotFoundError) as e: # The parser's validation errors
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Invalid MRPT file: {e}")
+
+    return dict({'years': list(by_year)}, **diff_budgets(by_year, db))
+
+MRPT_IMPORT_JOB = "mrpt_import"
+
+@router.post('/admin/budget_data/mrpt_jobs')
+def post_mrpt_job(mrpt: UploadFile = File(...), db: Session = Depends(get_db)):
+    """Same as post_mrpt_file, parsing and DB writes run in a background process. Returns the job id to poll"""
+    if not ".xlsx" in mrpt.filename:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, f"Sent file ({mrpt.filename}) isnt of '.xlsx' format!")
+
+    content_key, filepath = _write_mrpt_unless_cached(mrpt.file, mrpt.filename)
+
+    job_id = jobs.create(db, MRPT_IMPORT_JOB, filename=mrpt.filename)
+    jobs.submit(run_mrpt_import_job, job_id, content_key, filepath)
+
+    return {'job_id': job_id}
+
+@router.get('/admin/budget_data/mrpt_jobs/{id}')
+def get_mrpt_job(id: int, db: Session = Depends(get_db)):
+    job = jobs.get(db, id, MRPT_IMPORT_JOB)
+
+    if not job:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"MRPT import job of id ({id}) not found!")
+
+    return job
+
+def run_mrpt_import_job(job_id: int, content_key: str, filepath: str):
+    """Background part of post_mrpt_job, runs in a jobs process"""
+    with jobs.stage(job_id, "parsing"):
+        try:
+            by_year = _parse_mrpt(content_key, filepath)
+        except (TypeError, FileNotFoundError) as e: # The parser's validation errors
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Invalid MRPT file: {e}")
+
+    jobs.update(
+        job_id, years=list(by_year), actuals=sum(len(a) for (a, _, _) in by_year.values()),
+        budgets=sum(len(b) for (_, b, _) in by_year.values()), yearly=len(by_year)
+    )
+
+    with jobs.stage(job_id, "writing"):
+        db = SessionLocal()
+        try:
+            written = import_budgets(by_year, db)
+        finally:
+            db.close()
+
+    jobs.update(job_id, **{f"written_{name}": count for name, count in written.items()})
+
+def _mrpt_tables(by_year):
+    """Returns a list of (name, model, keys, defaults, rows) of the parsed MRPT budgets of every year"""
+    return [
+        ('actuals', MonthlyActualBudget, ['year', 'month'], {'remark': ""}, [a for (actuals, _, _) in by_year.values() for a in actuals]),
+        ('budgets', MonthlyBudget, ['year', 'month'], None, [b for (_, budgets, _) in by_year.values() for b in budgets]),
+        ('yearly', YearlyBudget, ['year'], None, [y for (_, _, y) in by_year.values()]),
+    ]
+
+def import_budgets(by_year, db: Session):
+    """Upserts the parsed MRPT budgets that differ from the stored ones, one statement per table, in a single transaction.
+    Returns the amount of rows written per table"""
+    written = {}
+
+    for (name, model, keys, defaults, rows) in _mrpt_tables(by_year):
+        changed = [r for (r, _) in changed_budgets(model, rows, keys, db)]
+        upsert_budgets(model, changed, keys, db, defaults=defaults)
+        written[name] = len(changed)
+
+    db.commit()
+
+    return written
+
+def diff_budgets(by_year, db: Session):
+    """Returns the changes import_budgets would write, per table a list of dicts of the keys values,
+    'new' (no stored row yet) and 'changes', the {column: {'old', 'new'}} of the changed cells only"""
+    res = {}
+
+    for (name, model, keys, _, rows) in _mrpt_tables(by_year):
+        res[name] = [
+            dict(
+                {k: r[k] for k in keys},
+                new=stored is None,
+                changes={
+                    c: {'old': stored[c] if stored else None, 'new': r[c]}
+                    for c in BUDGET_COLUMNS if stored is None or stored[c] != r[c]
+                }
+            )
+            for (r, stored) in changed_budgets(model, rows, keys, db)
+        ]
+
+    return res
+
+def _write_mrpt_unless_cached(src, filename):
+    """Returns a tuple (content_key, filepath), filepath being None when the content's parsed results are cached"""
+    hasher = hashlib.sha256()
+    filepath = fio.write_mrpt(src, filename, hasher)
+    content_key = pm.content_key(hasher.hexdigest())
+
+    if pm.get_cached(content_key) is not None:
+        fio.delete_file(filepath)
+        return content_key, None
+
+    return content_key, filepath
+
+def _parse_mrpt(content_key, filepath):
+    """Returns the cached {year: (actuals, budgets, yearly)} of content_key, else parses (then deletes) filepath"""
+    try:
+        parsed = pm.get_cached(content_key)
+
+        if parsed is None:
+            if not filepath: # Evicted since the upload
+                raise HTTPException(status.HTTP_400_BAD_REQUEST, "Cached MRPT results expired, upload the file again!")
+
+            parsed = pm.parse_excel_by_year(filepath)
+            pm.put_cached(content_key, parsed)
+    finally:
+        if filepath:
+            fio.delete_file(filepath)
+
+    return parsed
 
 @router.post('/admin/employee_data/cert/others')
 def post_others_cert_form(
@@ -1553,13 +1723,11 @@ def post_others_cert_form(
     proof               : UploadFile = File(...), 
     db: Session = Depends(get_db)
 ):
-    data = proof.file.read()
-
     # Check NIK
     emp = get_emp_by_nik(nik, db)
 
     # Write CertFile
-    filepath = fio.write_cert(certification_name, emp.id, data, proof.filename)
+    filepath = ps.put(proof.file, proof.filename, db)
 
     # Update DB
     existing_cert = None
@@ -1569,6 +1737,8 @@ def post_others_cert_form(
             break
 
     if existing_cert: # Update cert_proof
+        ps.drop(existing_cert.cert_proof, db)
+
         query = db.query(Certification).filter(
             Certification.id == existing_cert.id
         )
@@ -1594,13 +1764,11 @@ def post_others_cert_form(
 
 @router.post('/admin/employee_data/cert/{cert_name}/{nik}')
 def post_file(cert_name: str, nik: str, cert_file: UploadFile = File(...), db: Session = Depends(get_db)):
-    data = cert_file.file.read()
-
     # Check NIK
     emp = get_emp_by_nik(nik, db)
     emp_id = emp.id
 
-    filepath = fio.write_cert(cert_name, emp_id, data, cert_file.filename)
+    filepath = ps.put(cert_file.file, cert_file.filename, db)
 
     # Check if cert_name is SMR_x
     if "SMR_" in cert_name:
@@ -1617,6 +1785,8 @@ def post_file(cert_name: str, nik: str, cert_file: UploadFile = File(...), db: S
             break
     
     if existing_cert: # Update cert_proof
+        ps.drop(existing_cert.cert_proof, db)
+
         query = db.query(Certification).filter(
             Certification.id == existing_cert.id
         )
@@ -1642,33 +1812,22 @@ def post_file(cert_name: str, nik: str, cert_file: UploadFile = File(...), db: S
 
 @router.post('/file')
 def post_file(attachment_proof: UploadFile = File(...)):
-    data = attachment_proof.file.read()
-
-    f = open(f'data/{attachment_proof.filename}', 'wb')
-    f.write(data)
-    f.close()
+    fio.write_stream(attachment_proof.file, f'data/{attachment_proof.filename}')
 
     return {"filename": attachment_proof.filename}
 
 @router.post('/admin/budget_data/excel_parse')
 def post_excel_file_budget(file: UploadFile = File(...)):
-    data = file.file.read()
-
     # TODO Make sure dir exists
 
-    f = open(f'data/files/budget/{file.filename}', 'wb')
-    f.write(data)
-    f.close()
+    fio.write_stream(file.file, f'data/files/budget/{file.filename}')
 
     return
 
 ### Dashboard ###
 
-@router.get('/dashboard/smr_certification')
+@router.get('/dashboard/smr_certification', dependencies=[Depends(cache.etag(Employee, Certification))])
 def get_smr_certs(db: Session = Depends(get_db)):
-    # Get Emps
-    emps = get_all_active_emps(db)
-
     # Init res
     levels = [
         "SMR In Progress",
@@ -1685,20 +1844,17 @@ def get_smr_certs(db: Session = Depends(get_db)):
             "sum_per_level" : 0
         })
 
-    for e in emps:
-        # Check Smr of Emp
-        max_lvl, max_id = extract_highest_smr_level(e.emp_certifications)
+    # Count Emps by their highest SMR level
+    counts = summ.count_by_highest_smr(db)
 
-        if max_lvl >= 0:
-            res[max_lvl]["sum_per_level"] += 1
+    for max_lvl, count in counts.items():
+        if 0 <= max_lvl < len(levels):
+            res[max_lvl]["sum_per_level"] = count
     
     return res
 
-@router.get('/dashboard/pro_certification')
+@router.get('/dashboard/pro_certification', dependencies=[Depends(cache.etag(Employee, Certification))])
 def get_pro_certs(db: Session = Depends(get_db)):
-    # Get Emps
-    emps = get_all_active_emps(db)
-
     # Init res
     types = [
         "CISA",
@@ -1718,30 +1874,21 @@ def get_pro_certs(db: Session = Depends(get_db)):
             "sum_per_name"     : 0
         })
 
-    other_certs = 0
+    # Count proven Certs by name
+    counts = summ.count_by_pro_cert(types, db)
 
-    for e in emps:
-        for cert in e.emp_certifications:
-            index = utils.find_index(res,"certification_name", cert.cert_name)
-    
-            if cert.cert_proof:
-                if index is not None:
-                    res[index]["sum_per_name"] += 1
-                else:
-                    other_certs += 1
+    for r in res:
+        r["sum_per_name"] = counts.get(r["certification_name"], 0)
     
     res.append({
         "certification_name": "Others",
-        "sum_per_name"      : other_certs
+        "sum_per_name"      : counts.get("Others", 0)
     })
 
     return res
 
-@router.get('/dashboard/age_group')
+@router.get('/dashboard/age_group', dependencies=[Depends(cache.etag(Employee, Certification))])
 def get_age_group(db: Session = Depends(get_db)):
-    # Get All Emps
-    emps = get_all_active_emps(db)
-
     gens = ["Gen-X", "Gen-Y", "Gen-Z"]
     res = []
 
@@ -1753,30 +1900,17 @@ def get_age_group(db: Session = Depends(get_db)):
             "gen_name"  : gen
         })
     
-    for e in emps:
-        if e.date_of_birth <= gen_x_youngest: # Gen X
-            if e.gender == 'M':
-                res[0]['male_sum'] += 1
-            elif e.gender == 'F':
-                res[0]['female_sum'] += 1
-        elif e.date_of_birth <= gen_y_youngest: # Gen Y
-            if e.gender == 'M':
-                res[1]['male_sum'] += 1
-            elif e.gender == 'F':
-                res[1]['female_sum'] += 1
-        else:
-            if e.gender == 'M':
-                res[2]['male_sum'] += 1
-            elif e.gender == 'F':
-                res[2]['female_sum'] += 1
+    # Count Emps by generation and gender
+    counts = summ.count_by_generation_gender(db)
+
+    for i, r in enumerate(res):
+        r['male_sum']   = counts.get((i, 'M'), 0)
+        r['female_sum'] = counts.get((i, 'F'), 0)
 
     return res
 
-@router.get('/dashboard/education_level')
+@router.get('/dashboard/education_level', dependencies=[Depends(cache.etag(Employee, Certification))])
 def get_edu_level(db: Session = Depends(get_db)):
-    # Get All Emps
-    emps = get_all_active_emps(db)
-
     titles = ["Management/Economy", "Information Technology", "Others"]
     res = []
 
@@ -1788,30 +1922,17 @@ def get_edu_level(db: Session = Depends(get_db)):
             "major_title"   : title
         })
     
-    for e in emps:
-        if e.edu_category == "Information Technology":
-            if e.edu_level == "Bachelor":
-                res[1]['bachelor_sum'] += 1
-            elif e.edu_level == "Master":
-                res[1]['master_sum'] += 1
-        elif e.edu_category == "Management/Economy":
-            if e.edu_level == "Bachelor":
-                res[0]['bachelor_sum'] += 1
-            elif e.edu_level == "Master":
-                res[0]['master_sum'] += 1
-        elif e.edu_category == "Others":
-            if e.edu_level == "Bachelor":
-                res[2]['bachelor_sum'] += 1
-            elif e.edu_level == "Master":
-                res[2]['master_sum'] += 1
+    # Count Emps by education category and level
+    counts = summ.count_by_edu(db)
+
+    for r in res:
+        r['bachelor_sum']   = counts.get((r['major_title'], "Bachelor"), 0)
+        r['master_sum']     = counts.get((r['major_title'], "Master"), 0)
 
     return res
 
-@router.get('/dashboard/audit_exp')
+@router.get('/dashboard/audit_exp', dependencies=[Depends(cache.etag(Employee, daily=True))])
 def get_total_audit_exp(db: Session = Depends(get_db)):
-    # Get All Emps
-    emps = get_all_active_emps(db)
-
     # in_uob, outside_uob, total_exp, year
     year_cats = [
         "Less than 3", 
@@ -1832,27 +1953,12 @@ def get_total_audit_exp(db: Session = Depends(get_db)):
             "year"          : y
         })
 
-    for e in emps:
-        years   = [0,0,0] #in UOB, outside UOB, total
-        keys    = ["in_uob", "outside_uob", "total_exp"]
-
-        years[0]    = relativedelta(datetime.date.today(), e.date_first_uob).years
-        years[1]    = e.year_audit_non_uob
-        years[2]    = years[0] + years[1]
-
-        for index, year in enumerate(years):
-            if year < 3:
-                res[utils.find_index(res,"year","Less than 3")][keys[index]] += 1
-            elif year < 7:
-                res[utils.find_index(res,"year","3-6")][keys[index]] += 1
-            elif year < 10:
-                res[utils.find_index(res,"year","7-9")][keys[index]] += 1
-            elif year < 13:
-                res[utils.find_index(res,"year","10-12")][keys[index]] += 1
-            elif year < 16:
-                res[utils.find_index(res,"year","13-15")][keys[index]] += 1
-            else:
-                res[utils.find_index(res,"year","More than 15")][keys[index]] += 1
+    # Count Emps by experience buckets (in UOB, outside UOB, total)
+    keys = ["in_uob", "outside_uob", "total_exp"]
+
+    for (*buckets, count) in agg.count_by_audit_exp(db):
+        for index, bucket in enumerate(buckets):
+            res[bucket][keys[index]] += count
 
     return res
 
@@ -1914,7 +2020,7 @@ def get_emp_gen(db: Session = Depends(get_db)):
 @router.get('/clicktable/cert/smr')
 def get_click_cert_smr(db: Session = Depends(get_db)):
     # Get Emps
-    emps = get_all_active_emps(db)
+    emps = get_all_active_emps(db, loaders.EMPLOYEE_CERTS)
 
     # Init res
     res = []
@@ -1934,7 +2040,7 @@ def get_click_cert_smr(db: Session = Depends(get_db)):
 @router.get('/clicktable/cert/pro')
 def get_click_cert_pro(db: Session = Depends(get_db)):
     # Get Emps
-    emps = get_all_active_emps(db)
+    emps = get_all_active_emps(db, loaders.EMPLOYEE_CERTS)
 
     types = [
         "CISA",
@@ -2203,7 +2309,8 @@ def change_password(id: int, req: schemas.PasswordChangeIn, db: Session = Depend
 
 ### Budgets ###
 
-@router.get('/budget/budgetdata/{year}/{month}')
+@router.get('/budget/budgetdata/{year}/{month}', dependencies=[Depends(cache.etag(MonthlyBudget, MonthlyActualBudget))])
+@cache.cached(MonthlyBudget, MonthlyActualBudget)
 def get_total_by_division_by_year(year: int, month: int, db: Session = Depends(get_db)):
 
     yearlyQuery = db.query(MonthlyBudget).filter(
@@ -2342,10 +2449,9 @@ def patch_project_table_entry(id: int,req: schemas.ProjectInHiCoupling, db: Sess
     return updated
 
 # Chart
-@router.get('/projects/total_by_division/v2/{year}')
+@router.get('/projects/total_by_division/v2/{year}', dependencies=[Depends(cache.etag(Project, ProjectStatus, Division))])
+@cache.cached(Project, ProjectStatus, Division)
 def get_total_by_division_by_year_v2(year: int, db: Session = Depends(get_db)):
-    projects = db.query(Project).filter(Project.year == year).all()
-    
     status = [
         "Total Projects",
         "Completed",
@@ -2380,31 +2486,24 @@ def get_total_by_division_by_year_v2(year: int, db: Session = Depends(get_db)):
             "backgroundColor"   : colors[idx]
         })
 
-    for p in projects:
+    div_names = get_div_names_by_id(db)
+
+    for div_id, counts in summ.count_projects_by_div(year, db).items():
         # Cek Divisi
-        div_name = p.div.short_name
-        div_index = utils.find_index(datasets, "label", div_name)
-        # Process Each Prj Status
-        # res[utils.find_index(res, 'project_status', status[0])]
-
-        datasets[div_index]["data"][0] += 1
-        datasets[div_index]["data"][1] += 1 and p.status.name == status[1]
-        datasets[div_index]["data"][2] += 1 and p.status.name == status[2]
-        datasets[div_index]["data"][3] += 1 and p.status.name == status[3]
-        datasets[div_index]["data"][4] += 1 and p.status.name == status[4]
-        datasets[div_index]["data"][5] += 1 and p.status.name == status[5]
-        datasets[div_index]["data"][6] += 1 and p.timely_report
-        datasets[div_index]["data"][7] += 1 and p.used_DA
-        datasets[div_index]["data"][8] += 1 and len(p.completion_PA) > 0        
+        div_index = utils.find_index(datasets, "label", div_names.get(div_id))
+        if div_index is None:
+            continue
+
+        for i, s in enumerate(status):
+            datasets[div_index]["data"][i] += counts.get(s, 0)
     
     res["datasets"] = datasets
 
     return res
 
-@router.get('/projects/total_by_division/{year}')
+@router.get('/projects/total_by_division/{year}', dependencies=[Depends(cache.etag(Project, ProjectStatus, Division))])
+@cache.cached(Project, ProjectStatus, Division)
 def get_total_by_division_by_year(year: int, db: Session = Depends(get_db)):
-    query = db.query(Project).filter(Project.year == year).all()
-    
     status = [
         "Total Projects",
         "Completed",
@@ -2428,22 +2527,16 @@ def get_total_by_division_by_year(year: int, db: Session = Depends(get_db)):
             "TAD":0
         })
 
-    for q in query:
+    div_names = get_div_names_by_id(db)
+
+    for div_id, counts in summ.count_projects_by_div(year, db).items():
         # Cek Divisi
-        div_name = q.div.short_name
-
-        # Process Each Prj Status
-        # res[utils.find_index(res, 'project_status', status[0])]
-        res[0][div_name] += 1
-        res[1][div_name] += 1 and q.status.name == status[1]
-        res[2][div_name] += 1 and q.status.name == status[2]
-        res[3][div_name] += 1 and q.status.name == status[3]
-        res[4][div_name] += 1 and q.status.name == status[4]
-        res[5][div_name] += 1 and q.status.name == status[5]
-        res[6][div_name] += 1 and q.timely_report
-        res[7][div_name] += 1 and q.used_DA
-        res[8][div_name] += 1 and len(q.completion_PA) > 0        
-        
+        div_name = div_names.get(div_id)
+        if div_name not in res[0]:
+            continue
+
+        for i, s in enumerate(status):
+            res[i][div_name] += counts.get(s, 0)
 
     return res
 
@@ -2539,17 +2632,9 @@ def delete_contrib_table_entry(id: int, db: Session = Depends(get_db)):
 
     return {'details': 'Deleted'}
 
-@router.get('/socialcontrib/total_by_division/{year}')
+@router.get('/socialcontrib/total_by_division/{year}', dependencies=[Depends(cache.etag(SocialContrib, Employee, Division))])
+@cache.cached(SocialContrib, Employee, Division)
 def get_total_by_division_by_year(year: int, db: Session = Depends(get_db)):
-    startDate   = datetime.date(year,1,1)
-    endDate     = datetime.date(year,12,31)
-
-    query = db.query(SocialContrib).filter(
-        SocialContrib.date >= startDate, 
-        SocialContrib.date <= endDate,
-        SocialContrib.creator.has(active=True)
-    ).all()
-    
     divs = get_divs_name_exclude_IAH(db)
     res = []
 
@@ -2557,19 +2642,18 @@ def get_total_by_division_by_year(year: int, db: Session = Depends(get_db)):
     for div in divs:
         res.append({"contribute_sum":0, "division":div})
 
-    for q in query:
-        contrib_by_div = next((index for (index, d) in enumerate(res) if d["division"] == q.creator.part_of_div.short_name), None)
-        res[contrib_by_div]["contribute_sum"] += 1
+    div_names = get_div_names_by_id(db)
+
+    for div_id, counts in summ.count_social_contribs_by_div(year, db, active_only=True).items():
+        contrib_by_div = utils.find_index(res, "division", div_names.get(div_id))
+        if contrib_by_div is not None:
+            res[contrib_by_div]["contribute_sum"] += sum(counts.values())
 
     return res
 
-@router.get('/socialcontrib/total_by_division_type_categorized/{year}')
+@router.get('/socialcontrib/total_by_division_type_categorized/{year}', dependencies=[Depends(cache.etag(SocialContrib, Employee, Division))])
+@cache.cached(SocialContrib, Employee, Division)
 def get_total_by_division_by_year_type_categorized(year: int, db: Session = Depends(get_db)):
-    startDate   = datetime.date(year,1,1)
-    endDate     = datetime.date(year,12,31)
-
-    query = db.query(SocialContrib).filter(SocialContrib.date >= startDate, SocialContrib.date <= endDate).all()
-    
     divs = get_divs_name_exclude_IAH(db)
     res = {}
 
@@ -2577,13 +2661,16 @@ def get_total_by_division_by_year_type_categorized(year: int, db: Session = Depe
     for div in divs:
         res[div] = {"news":0, "myUob":0, "buletin":0}
 
-    for q in query:
-        if q.social_type_id == 1:
-            res[q.div.short_name]["news"] += 1
-        if q.social_type_id == 2:
-            res[q.div.short_name]["myUob"] += 1
-        if q.social_type_id == 3:
-            res[q.div.short_name]["buletin"] += 1
+    div_names = get_div_names_by_id(db)
+
+    for div_id, counts in summ.count_social_contribs_by_div(year, db).items():
+        div_name = div_names.get(div_id)
+        if div_name not in res:
+            continue
+
+        res[div_name]["news"]       += counts.get(1, 0)
+        res[div_name]["myUob"]      += counts.get(2, 0)
+        res[div_name]["buletin"]    += counts.get(3, 0)
 
     return res
 
@@ -2604,20 +2691,13 @@ def get_training_annoucement(db: Session = Depends(get_db)):
     else:
         return {'body': ann.body}
 
-@router.get('/training/budget_percentange/{year}')
+@router.get('/training/budget_percentange/{year}', dependencies=[Depends(cache.etag(TrainingBudget, Training, Employee, Division))])
+@cache.cached(TrainingBudget, Training, Employee, Division)
 def get_training_budget_percentage(year: int, db: Session = Depends(get_db)):
-    startDate   = datetime.date(year,1,1)
-    endDate     = datetime.date(year,12,31)
-
     yearlyBudgets = db.query(TrainingBudget).filter(
         TrainingBudget.year == year
     ).all()
 
-    trainings = db.query(Training).filter(
-        Training.date >= startDate,
-        Training.date <= endDate
-    ).all()
-
     divs = get_divs_name_exclude_IAH(db)
     divs.append("Mandatory/Inhouse")
 
@@ -2639,17 +2719,21 @@ def get_training_budget_percentage(year: int, db: Session = Depends(get_db)):
             i = utils.find_index(values, "div", y.div.short_name)
             values[i]["budget"] = y.budget
     
-    # Get Each Training's Charged and Realized
-    for t in trainings:
-        if t.emp_id == 0: # Mandatory (Not specific to a employee)
-            values[mandatory_index]["budget"]     += t.budget
-            values[mandatory_index]["realized"]   += t.realization
-            values[mandatory_index]["charged"]    += t.charged_by_fin
-        elif t.employee.active:
-            if t.employee.part_of_div.short_name in divs: # Not Including IAH
-                i = utils.find_index(values, "div", t.employee.part_of_div.short_name)
-                values[i]["realized"]   += t.realization
-                values[i]["charged"]    += t.charged_by_fin
+    # Get Each Division's Charged and Realized
+    costs_by_div, mandatory = summ.sum_training_costs_by_div(year, db)
+    div_names = get_div_names_by_id(db)
+
+    # Mandatory (Not specific to a employee)
+    values[mandatory_index]["budget"]     += mandatory.get("budget", 0)
+    values[mandatory_index]["realized"]   += mandatory.get("realized", 0)
+    values[mandatory_index]["charged"]    += mandatory.get("charged", 0)
+
+    for div_id, costs in costs_by_div.items():
+        div_name = div_names.get(div_id)
+        if div_name in divs[:mandatory_index]: # Not Including IAH
+            i = utils.find_index(values, "div", div_name)
+            values[i]["realized"]   += costs.get("realized", 0)
+            values[i]["charged"]    += costs.get("charged", 0)
 
     # Translate to Percentage
     res = []
@@ -2671,21 +2755,9 @@ def get_training_budget_percentage(year: int, db: Session = Depends(get_db)):
         
     return res
 
-@router.get('/training/progress_percentange/{year}')
+@router.get('/training/progress_percentange/{year}', dependencies=[Depends(cache.etag(TrainingTarget, Training, Employee, Division))])
+@cache.cached(TrainingTarget, Training, Employee, Division)
 def get_training_progress_percentage(year: int, db: Session = Depends(get_db)):
-    startDate   = datetime.date(year,1,1)
-    endDate     = datetime.date(year,12,31)
-
-    targets = db.query(TrainingTarget).filter(
-        TrainingTarget.year == year
-    ).all()
-
-    trainings = db.query(Training).filter(
-        Training.date >= startDate,
-        Training.date <= endDate,
-        Training.emp_id > 0
-    ).all()
-
     divs = get_divs_name_exclude_IAH(db)
     divs.append("IAH")
 
@@ -2698,16 +2770,20 @@ def get_training_progress_percentage(year: int, db: Session = Depends(get_db)):
             "curr_hours"     : 0
         })
     
+    hours, targets = summ.sum_training_hours_by_div(year, db)
+    div_names = get_div_names_by_id(db)
+
     # Get Targets
-    for t in targets:
-        i = utils.find_index(values, "div", t.trainee.part_of_div.short_name)
-        values[i]["target_hours"] += t.target_hours
+    for div_id, target_hours in targets.items():
+        i = utils.find_index(values, "div", div_names.get(div_id))
+        if i is not None:
+            values[i]["target_hours"] += target_hours
 
     # Get Currs
-    for t in trainings:
-        if t.employee and t.employee.active:
-            i = utils.find_index(values, "div", t.employee.part_of_div.short_name)
-            values[i]["curr_hours"] += t.duration_hours
+    for div_id, curr_hours in hours.items():
+        i = utils.find_index(values, "div", div_names.get(div_id))
+        if i is not None:
+            values[i]["curr_hours"] += curr_hours
     
     # Translate to Percentage
     res = []
@@ -2830,6 +2906,7 @@ def delete_training_table_entry(id: int, db: Session = Depends(get_db)):
     if not t.first():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='ID not found')
     
+    ps.drop(t.first().proof, db) # Releases the proof file
     t.delete()
     db.commit()
 
@@ -2837,13 +2914,14 @@ def delete_training_table_entry(id: int, db: Session = Depends(get_db)):
 
 ### CSF ###
 
-@router.get('/csf/client_survey/{year}')
+@router.get('/csf/client_survey/{year}', dependencies=[Depends(cache.etag(CSF, Project, Division))])
+@cache.cached(CSF, Project, Division)
 def get_csf_bar_chart_data(year: int, db: Session = Depends(get_db)):
     divs    = get_divs_name_exclude_IAH(db)
     
     # Get All CSF where Project's year is {year}
-    csfs = db.query(CSF).filter(
-        CSF.prj.has(year=year)
+    csfs = db.query(CSF).join(CSF.prj).filter(
+        Project.year == year
     ).all()
 
     # Init result dict
@@ -2921,13 +2999,14 @@ def get_csf_bar_chart_data(year: int, db: Session = Depends(get_db)):
 
     return res
 
-@router.get('/csf/overall_csf/{year}')
+@router.get('/csf/overall_csf/{year}', dependencies=[Depends(cache.etag(CSF, Project, Division))])
+@cache.cached(CSF, Project, Division)
 def get_csf_donut_data(year: int, db: Session = Depends(get_db)):
     divs    = get_divs_name_exclude_IAH(db)
     
     # Get All CSF where Project's year is {year}
-    csfs = db.query(CSF).filter(
-        CSF.prj.has(year=year)
+    csfs = db.query(CSF).join(CSF.prj).filter(
+        Project.year == year
     ).all()
 
     scores = []
@@ -3073,6 +3152,7 @@ def delete_busu_input_table_entry(id:int, db: Session = Depends(get_db)):
     if not eng.first():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='ID not found')
 
+    ps.drop(eng.first().proof, db) # Releases the proof file
     eng.delete()
     db.commit()
 
@@ -3106,16 +3186,9 @@ def get_view_busu_table(nik: str, year: int, db: Session = Depends(get_db)):
     
     return res
 
-@router.get('/engagement/total_by_division/{year}')
+@router.get('/engagement/total_by_division/{year}', dependencies=[Depends(cache.etag(BUSUEngagement, Employee, Division))])
+@cache.cached(BUSUEngagement, Employee, Division)
 def get_total_by_division_by_year(year: int, db: Session = Depends(get_db)):
-    startDate   = datetime.date(year,1,1)
-    endDate     = datetime.date(year,12,31)
-
-    query = db.query(BUSUEngagement).filter(
-        BUSUEngagement.date >= startDate,
-        BUSUEngagement.date <= endDate
-    ).all()
-    
     divs = get_divs_name_exclude_IAH(db)
     res = []
 
@@ -3123,13 +3196,15 @@ def get_total_by_division_by_year(year: int, db: Session = Depends(get_db)):
     for div in divs:
         res.append({"quarterly_meeting":0, "workshop":0, "division":div})
 
-    for q in query:
-        eng_by_div = next((index for (index, d) in enumerate(res) if d["division"] == q.creator.part_of_div.short_name), None)
+    div_names = get_div_names_by_id(db)
+
+    for div_id, counts in summ.count_busu_by_div(year, db).items():
+        eng_by_div = utils.find_index(res, "division", div_names.get(div_id))
+        if eng_by_div is None:
+            continue
 
-        if q.eng_type_id == 1:
-            res[eng_by_div]["quarterly_meeting"] += 1
-        if q.eng_type_id == 2:
-            res[eng_by_div]["workshop"] += 1
+        res[eng_by_div]["quarterly_meeting"]    += counts.get(1, 0)
+        res[eng_by_div]["workshop"]             += counts.get(2, 0)
 
     return res
 
@@ -3167,7 +3242,8 @@ def get_attr_summary_details_by_div_shortname(year: int, div: str, db: Session):
 
     return (join, resign, t_in, t_out, r_in, r_out, start_count, curr_hc)
 
-@router.get('/attrition/staff_attrition/{year}')
+@router.get('/attrition/staff_attrition/{year}', dependencies=[Depends(cache.etag(YearlyAttrition, AttritionJoinResignTransfer, AttrType, AttritionRotation, Division))])
+@cache.cached(YearlyAttrition, AttritionJoinResignTransfer, AttrType, AttritionRotation, Division)
 def get_total_by_division_by_year(year: int, db: Session = Depends(get_db)):
     divs = get_divs_name_exclude_IAH(db)
     res = []
@@ -3188,7 +3264,8 @@ def get_total_by_division_by_year(year: int, db: Session = Depends(get_db)):
     
     return res
 
-@router.get('/attrition/rate_wbgm_testing/year/{year}')
+@router.get('/attrition/rate_wbgm_testing/year/{year}', dependencies=[Depends(cache.etag(YearlyAttrition, AttritionJoinResignTransfer, AttrType, AttritionRotation, Division))])
+@cache.cached(YearlyAttrition, AttritionJoinResignTransfer, AttrType, AttritionRotation, Division)
 def get_dynamic_attr_rate_byYear(year: int, db: Session = Depends(get_db)):
     """Temp EP for Daffa Testing WBGM Attr Rate Donut Chart"""
     divs    = ["WBGM"]
@@ -3214,7 +3291,8 @@ def get_dynamic_attr_rate_byYear(year: int, db: Session = Depends(get_db)):
 
     return res
 
-@router.get('/attrition/rate_v4/year/{year}')
+@router.get('/attrition/rate_v4/year/{year}', dependencies=[Depends(cache.etag(YearlyAttrition, AttritionJoinResignTransfer, AttrType, AttritionRotation, Division))])
+@cache.cached(YearlyAttrition, AttritionJoinResignTransfer, AttrType, AttritionRotation, Division)
 def get_dynamic_attr_rate_byYear(year: int, db: Session = Depends(get_db)):
     """Returns List of List of Dict"""
     divs    = get_divs_name_exclude_IAH(db)
@@ -3241,7 +3319,8 @@ def get_dynamic_attr_rate_byYear(year: int, db: Session = Depends(get_db)):
 
     return res
 
-@router.get('/attrition/rate_v3/year/{year}')
+@router.get('/attrition/rate_v3/year/{year}', dependencies=[Depends(cache.etag(YearlyAttrition, AttritionJoinResignTransfer, AttrType, AttritionRotation, Division))])
+@cache.cached(YearlyAttrition, AttritionJoinResignTransfer, AttrType, AttritionRotation, Division)
 def get_dynamic_attr_rate_byYear(year: int, db: Session = Depends(get_db)):
     """Returns List of Dict"""
 
@@ -3268,7 +3347,8 @@ def get_dynamic_attr_rate_byYear(year: int, db: Session = Depends(get_db)):
 
     return res
 
-@router.get('/attrition/rate_v2/div/{div_name}/year/{year}')
+@router.get('/attrition/rate_v2/div/{div_name}/year/{year}', dependencies=[Depends(cache.etag(YearlyAttrition, AttritionJoinResignTransfer, AttrType, AttritionRotation, Division))])
+@cache.cached(YearlyAttrition, AttritionJoinResignTransfer, AttrType, AttritionRotation, Division)
 def get_rate_by_division_by_yearmonth(div_name: str, year: int, db: Session = Depends(get_db)):
     (join, resign, t_in, t_out, r_in, r_out, start_hc, curr_hc) = get_attr_summary_details_by_div_shortname(year, div_name, db)
 
@@ -3281,7 +3361,8 @@ def get_rate_by_division_by_yearmonth(div_name: str, year: int, db: Session = De
         {"title":"","rate":f"{round(100-attr_rate,2)}%"}
     ]
 
-@router.get('/attrition/rate/{div_name}/{year}')
+@router.get('/attrition/rate/{div_name}/{year}', dependencies=[Depends(cache.etag(YearlyAttrition, AttritionJoinResignTransfer, AttrType, AttritionRotation, Division))])
+@cache.cached(YearlyAttrition, AttritionJoinResignTransfer, AttrType, AttritionRotation, Division)
 def get_rate_by_division_by_yearmonth(div_name: str, year: int, db: Session = Depends(get_db)):
     (join, resign, t_in, t_out, r_in, r_out, start_hc, curr_hc) = get_attr_summary_details_by_div_shortname(year, div_name, db)
 
@@ -3352,10 +3433,10 @@ def toggle_maintenance_status(db: Session = Depends(get_db)):
     return {'is_maintenance_mode': new_data['value']}
 
 # QA Result
-@router.get('/admin/qaip_data/table_data/{year}')
+@router.get('/admin/qaip_data/table_data/{year}', dependencies=[Depends(cache.etag(QAIP, Project, QAType, QAGradingResult, Division, Employee))])
 def get_qaip_table(year: int, db: Session = Depends(get_db)):
-    qaips = db.query(QAIP).filter(
-        QAIP.prj.has(year=year)
+    qaips = db.query(QAIP).join(QAIP.prj).filter(
+        Project.year == year
     ).all()
 
     res = []
@@ -3455,7 +3536,7 @@ def patch_qaip_entry(req: schemas.QAIPFormInHiCoupling, db: Session = Depends(ge
     return updated
 
 # Budget
-@router.get('/admin/budget_data/table_data/{year}/{month}')
+@router.get('/admin/budget_data/table_data/{year}/{month}', dependencies=[Depends(cache.etag(MonthlyActualBudget, MonthlyBudget, YearlyBudget, Training))])
 def get_budget_table(year: int, month: int, db: Session = Depends(get_db)):
     cats = [
         "Staff Expense",
@@ -3833,7 +3914,7 @@ def patch_budget_table_entry(year: int, month: int, req: schemas.BudgetTableInHi
         db.commit()
 
 # CSF
-@router.get('/admin/csf_data/table_data/{year}')
+@router.get('/admin/csf_data/table_data/{year}', dependencies=[Depends(cache.etag(CSF, Project, Division, Employee))])
 def get_csf_table(year: int, db: Session = Depends(get_db)):
     prjs = db.query(Project).filter(
         Project.year == year
@@ -4010,7 +4091,7 @@ def delete_csf_table_entry(id: int, db: Session = Depends(get_db)):
     return {'details': 'Deleted'}
 
 # Division
-@router.get('/admin/division_table_data')
+@router.get('/admin/division_table_data', dependencies=[Depends(cache.etag(Division, Employee))])
 def get_division_table(db: Session = Depends(get_db)):
     divs = db.query(Division).all()
 
@@ -4118,7 +4199,7 @@ def change_password_admin(req: schemas.PasswordChangeAdminIn, db: Session = Depe
 
     return {'detail':'Password Change Success!'}
 
-@router.get('/admin/employee/tables/cert/nik/{nik}')
+@router.get('/admin/employee/tables/cert/nik/{nik}', dependencies=[Depends(cache.etag(Certification, Employee))])
 def get_employee_cert_table(nik: str, db: Session = Depends(get_db)):
     emp = get_emp_by_nik(nik, db)
 
@@ -4144,14 +4225,15 @@ def delete_employee_cert_table_entry(id: int, db: Session = Depends(get_db)):
         Certification.id == c.id
     )
 
+    ps.drop(c.cert_proof, db) # Releases the proof file
     c_q.delete()
     db.commit()
 
     return {'details': 'Deleted'}
 
-@router.get('/admin/employee_data/table_data')
+@router.get('/admin/employee_data/table_data', dependencies=[Depends(cache.etag(Employee, Certification, Division, Role, daily=True))])
 def get_employee_table(db: Session = Depends(get_db)):
-    emps = get_all_active_emps(db)
+    emps = get_all_active_emps(db, loaders.EMPLOYEE_TABLE)
 
     res = []
 
@@ -4355,11 +4437,19 @@ def delete_employee_table_entry(id: int, db: Session = Depends(get_db)):
     if not e.first():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='ID not found')
     
+    _delete_emp_certs(e.first(), db)
     e.delete()
     db.commit()
 
     return {'details': 'Deleted'}
 
+def _delete_emp_certs(emp: Employee, db: Session):
+    """Deletes the employee's certifications, releasing their proof files. Does not commit"""
+    for c in emp.emp_certifications:
+        ps.drop(c.cert_proof, db)
+
+    db.query(Certification).filter(Certification.emp_id == emp.id).delete(synchronize_session=False)
+
 # Training
 @router.post('/admin/training_announcement_form')
 def post_training_annoucement(req: schemas.AnnouncementCreate, db: Session = Depends(get_db)):
@@ -4397,7 +4487,7 @@ def post_training_annoucement(req: schemas.AnnouncementCreate, db: Session = Dep
         db.commit()
         return updated
 
-@router.get('/admin/training_budget_data/table_data')
+@router.get('/admin/training_budget_data/table_data', dependencies=[Depends(cache.etag(TrainingBudget, Division))])
 def get_trainingbudget_table(db: Session = Depends(get_db)):
     divs = get_divs_name_exclude_IAH(db)
 
@@ -4435,7 +4525,7 @@ def patch_trainingbudget_table(req: schemas.TrainingBudgetInHiCoupling, year: in
     db.commit()
     return updated
 
-@router.get('/admin/training_data/table_data/{year}')
+@router.get('/admin/training_data/table_data/{year}', dependencies=[Depends(cache.etag(Training, Employee, Division))])
 def get_training_table(year: int, db: Session = Depends(get_db)):
     startDate   = datetime.date(year,1,1)
     endDate     = datetime.date(year,12,31)
@@ -4556,13 +4646,14 @@ def delete_training_table_entry(id: int, db: Session = Depends(get_db)):
     if not t.first():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='ID not found')
     
+    ps.drop(t.first().proof, db) # Releases the proof file
     t.delete()
     db.commit()
 
     return {'details': 'Deleted'}
 
 # Audit Project
-@router.get('/admin/audit_project_data/table_data/{year}')
+@router.get('/admin/audit_project_data/table_data/{year}', dependencies=[Depends(cache.etag(Project, ProjectStatus, Division, Employee))])
 def get_project_table(year: int, db: Session = Depends(get_db)):
     projects = db.query(Project).filter(
         Project.year == year
@@ -4713,13 +4804,14 @@ def delete_project_table_entry(id: int, db: Session = Depends(get_db)):
     
     db.delete(prj.first().qaips[0])
 
+    ps.drop(prj.first().completion_PA, db) # Releases the proof file
     prj.delete()
     db.commit()
 
     return {'details': 'Deleted'}
 
 # Social Contribution
-@router.get('/admin/audit_contribution_data/table_data/{year}')
+@router.get('/admin/audit_contribution_data/table_data/{year}', dependencies=[Depends(cache.etag(SocialContrib, SocialType, Employee, Division))])
 def get_contrib_table(year: int, db: Session = Depends(get_db)):
     startDate   = datetime.date(year,1,1)
     endDate     = datetime.date(year,12,31)
@@ -4813,7 +4905,7 @@ def delete_contrib_table_entry(id: int, db: Session = Depends(get_db)):
     return {'details': 'Deleted'}
 
 # BUSU Engagement Table
-@router.get('/admin/busu_data/table_data/{year}')
+@router.get('/admin/busu_data/table_data/{year}', dependencies=[Depends(cache.etag(BUSUEngagement, EngagementType, Employee, Division))])
 def get_busu_table(year: int, db: Session = Depends(get_db)):
     startDate   = datetime.date(year,1,1)
     endDate     = datetime.date(year,12,31)
@@ -4904,13 +4996,14 @@ def delete_busu_table_entry(id:int, db: Session = Depends(get_db)):
     if not eng.first():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='ID not found')
 
+    ps.drop(eng.first().proof, db) # Releases the proof file
     eng.delete()
     db.commit()
 
     return {'details': 'Deleted'}
 
 # Attrition MainTable
-@router.get('/admin/attrition/summary_table/year/{year}')
+@router.get('/admin/attrition/summary_table/year/{year}', dependencies=[Depends(cache.etag(YearlyAttrition, AttritionJoinResignTransfer, AttrType, AttritionRotation, Division))])
 def get_summary_attr_table(year: int, db: Session = Depends(get_db)):
     divs = get_divs_name_exclude_IAH(db)
     res = []
@@ -5000,7 +5093,7 @@ def get_summary_attr_table(year: int, id: int, req: schemas.YearlyAttritionInHiC
     return updated
 
 # Attrition JRT Table
-@router.get('/admin/attrition/jrt_table/year/{year}/month/{month}')
+@router.get('/admin/attrition/jrt_table/year/{year}/month/{month}', dependencies=[Depends(cache.etag(AttritionJoinResignTransfer, AttrType, Division))])
 def get_jrt_attr_table(year: int, month: int, db: Session = Depends(get_db)):
     jrts = get_jrtAttrs(year, db, month=month)
 
@@ -5103,7 +5196,7 @@ def patch_jrt_attr_table_entry(id: int, db: Session = Depends(get_db)):
     return {'details': 'Deleted'}
 
 # Attrition Rotation Table
-@router.get('/admin/attrition/rot_table/year/{year}/month/{month}')
+@router.get('/admin/attrition/rot_table/year/{year}/month/{month}', dependencies=[Depends(cache.etag(AttritionRotation, Division))])
 def get_rot_attr_table(year: int, month: int, db: Session = Depends(get_db)):
     rots = get_rotAttrs(year, db, month=month)
 
@@ -5209,7 +5302,7 @@ def get_name(nik: int, db: Session = Depends(get_db)):
 
 @router.get('/utils/employee/show_aas')
 def get_employee_table(db: Session = Depends(get_db)):
-    emps = get_all_active_emps(db)
+    emps = get_all_active_emps(db, loaders.EMPLOYEE_TABLE)
 
     res = []
 
@@ -5476,6 +5569,10 @@ def get_divs_name_exclude_IAH(db: Session = Depends(get_db)):
     
     return res
 
+def get_div_names_by_id(db: Session):
+    """Returns a dict of {div_id: short_name} of every division"""
+    return {id: short_name for (id, short_name) in db.query(Division.id, Division.short_name).all()}
+
 def get_div_by_shortname(shortname: str , db: Session):
     div_q = db.query(Division).filter(
         Division.short_name == shortname
@@ -5518,123 +5615,45 @@ def get_yTrainingBudget_by_div_id(div_id: int, db: Session):
 
     return data
 
-def create_or_update_mActual(data, db: Session):
-    actual_query = db.query(MonthlyActualBudget).filter(
-        MonthlyActualBudget.year == data['year'],
-        MonthlyActualBudget.month == data['month']
-    )
-
-    try:
-        actual_db = actual_query.one_or_none()
-    except MultipleResultsFound:
-        raise MultipleResultsFound(f"Multiple mActual with year/month({data['year']}/{data['month']})")
+# MRPT columns, the key columns excluded
+BUDGET_COLUMNS = [
+    'staff_salaries', 'staff_training_reg_meeting', 'revenue_related', 'it_related',
+    'occupancy_related', 'other_transport_travel', 'other_other', 'indirect_expense'
+]
 
-    if actual_db: # Exists
-        # Update
-        stored_data = jsonable_encoder(actual_db)
-        stored_model = schemas.MonthlyActualBudgetIn(**stored_data)
-        
-        updated = stored_model.copy(update=data)
-        stored_data.update(updated)
-        actual_query.update(stored_data)
-        db.commit()
-    else:
-        # Create
-        newMonthActualBudget = MonthlyActualBudget(
-            year                        = data['year'],
-            month                       = data['month'],
-            staff_salaries              = data['staff_salaries'],
-            staff_training_reg_meeting  = data['staff_training_reg_meeting'],
-            revenue_related             = data['revenue_related'],
-            it_related                  = data['it_related'],
-            occupancy_related           = data['occupancy_related'],
-            other_transport_travel      = data['other_transport_travel'],
-            other_other                 = data['other_other'],
-            indirect_expense            = data['indirect_expense'],
-            remark                      = ""
-        )
+def upsert_budgets(model, rows, keys, db: Session, defaults: dict = None):
+    """Inserts the rows, or updates the BUDGET_COLUMNS of the row with the same keys values, with a single
+    INSERT ... ON CONFLICT statement (keys need a unique index). defaults only fill in the inserted rows. Does not commit"""
+    if not rows:
+        return
 
-        db.add(newMonthActualBudget)
-        db.commit()
-        db.refresh(newMonthActualBudget)
+    rows = [dict(defaults or {}, **{c: r[c] for c in keys + BUDGET_COLUMNS}) for r in rows]
 
-def create_or_update_mBudget(data, db: Session):
-    budget_query = db.query(MonthlyBudget).filter(
-        MonthlyBudget.year == data['year'],
-        MonthlyBudget.month == data['month']
+    stmt = sqlite_insert(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={c: stmt.excluded[c] for c in BUDGET_COLUMNS}
     )
 
-    try:
-        budget_db = budget_query.one_or_none()
-    except MultipleResultsFound:
-        raise MultipleResultsFound(f"Multiple mBudget with year/month({data['year']}/{data['month']})")
+    db.execute(stmt, rows)
 
-    if budget_db:
-        # Update
-        stored_data = jsonable_encoder(budget_db)
-        stored_model = schemas.MonthlyBudgetIn(**stored_data)
-        
-        updated = stored_model.copy(update=data)
-        stored_data.update(updated)
-        budget_query.update(stored_data)
-        db.commit()
-    else:
-        # Create
-        newMonthlyBudget = MonthlyBudget(
-            year                        = data['year'],
-            month                       = data['month'],
-            staff_salaries              = data['staff_salaries'],
-            staff_training_reg_meeting  = data['staff_training_reg_meeting'],
-            revenue_related             = data['revenue_related'],
-            it_related                  = data['it_related'],
-            occupancy_related           = data['occupancy_related'],
-            other_transport_travel      = data['other_transport_travel'],
-            other_other                 = data['other_other'],
-            indirect_expense            = data['indirect_expense']
-        )
-
-        db.add(newMonthlyBudget)
-        db.commit()
-        db.refresh(newMonthlyBudget)
+def changed_budgets(model, rows, keys, db: Session):
+    """Returns a list of (row, stored) of the rows whose BUDGET_COLUMNS differ from the stored row of the same keys values,
+    stored being a dict of the stored columns, None when there is no such row yet"""
+    if not rows:
+        return []
 
-def create_or_update_yBudget(data, db: Session):
-    del data['month']
+    columns = [getattr(model, c) for c in keys + BUDGET_COLUMNS]
+    stored_rows = db.query(*columns).filter(model.year.in_({r['year'] for r in rows})).all()
+    stored_by_keys = {tuple(getattr(s, k) for k in keys): s._asdict() for s in stored_rows}
 
-    budget_query = db.query(YearlyBudget).filter(
-        YearlyBudget.year == data['year']
-    )
-
-    try:
-        budget_db = budget_query.one_or_none()
-    except MultipleResultsFound:
-        raise MultipleResultsFound(f"Multiple yBudget with year({data['year']})")
-
-    if budget_db:
-        # Update
-        stored_data = jsonable_encoder(budget_db)
-        stored_model = schemas.YearlyBudgetIn(**stored_data)
-        
-        updated = stored_model.copy(update=data)
-        stored_data.update(updated)
-        budget_query.update(stored_data)
-        db.commit()
-    else:
-        # Create
-        newYearlyBudget = YearlyBudget(
-            year                        = data['year'],
-            staff_salaries              = data['staff_salaries'],
-            staff_training_reg_meeting  = data['staff_training_reg_meeting'],
-            revenue_related             = data['revenue_related'],
-            it_related                  = data['it_related'],
-            occupancy_related           = data['occupancy_related'],
-            other_transport_travel      = data['other_transport_travel'],
-            other_other                 = data['other_other'],
-            indirect_expense            = data['indirect_expense']
-        )
+    res = []
+    for r in rows:
+        stored = stored_by_keys.get(tuple(r[k] for k in keys))
+        if stored is None or any(stored[c] != r[c] for c in BUDGET_COLUMNS):
+            res.append((r, stored))
 
-        db.add(newYearlyBudget)
-        db.commit()
-        db.refresh(newYearlyBudget)
+    return res
 
 def get_project_status_id(inputText):
     statuses= ["Not Started", "Planning", "Fieldwork", "Reporting", "Sign-off", "Completed"]
@@ -5694,8 +5713,9 @@ def _create_employee_from_table(req: schemas.EmployeeInHiCoupling, db : Session)
 
     return new_emp
 
-def get_all_active_emps(db: Session):
-    return db.query(Employee).filter(
+def get_all_active_emps(db: Session, options=()):
+    """Returns active employees, options being a loaders preset matching what the caller touches"""
+    return db.query(Employee).options(*options).filter(
         Employee.active == True
     ).all()
 
@@ -6,6 +6,7 @@ import schemas, hashing
 from models import *
 from database import get_db
 from fileio import fileio_module as fio
+from proofstore import proofstore_module as ps
 
 router = APIRouter(
     tags=['Employee'],
@@ -125,6 +126,8 @@ def delete_cert_proof(db: Session = Depends(get_db)):
     certs = db.query(Certification).all()
 
     for c in certs:
+        ps.drop(c.cert_proof, db)
+
         query = db.query(Certification).filter(
             Certification.id == c.id
         )
@@ -137,6 +140,7 @@ def delete_cert_proof(db: Session = Depends(get_db)):
         db.commit()
     
     fio.delete_cert_files_dir()
+    ps.sweep(db)
 
     return {'details': 'All cert_proof deleted'}
 
@@ -144,9 +148,11 @@ def delete_cert_proof(db: Session = Depends(get_db)):
 def delete_cert(id: int, db: Session = Depends(get_db)):
     query_res = db.query(Certification).filter(Certification.id == id)
 
-    if not query_res.first():
+    cert = query_res.first()
+    if not cert:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='ID not found')
 
+    ps.drop(cert.cert_proof, db) # Releases the proof file
     query_res.delete()
     db.commit()
 
@@ -227,6 +233,11 @@ def delete_employee(id: int, db: Session = Depends(get_db)):
     if not query_res.first():
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='ID not found')
 
+    # Certifications go with their owner, releasing their proof files
+    for c in query_res.first().emp_certifications:
+        ps.drop(c.cert_proof, db)
+    db.query(Certification).filter(Certification.emp_id == id).delete(synchronize_session=False)
+
     query_res.delete()
     db.commit()
 
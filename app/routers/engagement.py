@@ -6,6 +6,7 @@ import datetime
 import schemas, oauth2
 from models import *
 from database import get_db
+from proofstore import proofstore_module as ps
 
 router = APIRouter(
     tags=['BU/SU Engagement'],
@@ -126,9 +127,11 @@ def update_engagement(id: int, req: schemas.BUSUEngagementIn, db: Session = Depe
 def delete_engagement(id: int, db: Session = Depends(get_db)):
     query_res = db.query(BUSUEngagement).filter(BUSUEngagement.id == id)
 
-    if not query_res.first():
+    eng = query_res.first()
+    if not eng:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='ID not found')
 
+    ps.drop(eng.proof, db) # Releases the proof file
     query_res.delete()
     db.commit()
 
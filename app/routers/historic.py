@@ -6,6 +6,7 @@ import datetime
 import schemas, oauth2, utils
 from models import *
 from database import get_db
+from cache import cache_module as cache
 
 router = APIRouter(
     tags=['Historic'],
@@ -13,62 +14,62 @@ router = APIRouter(
 )
 
 
-@router.get('/training')
+@router.get('/training', dependencies=[Depends(cache.etag(TrainingHistory))])
 def get_training_historic(db: Session = Depends(get_db)):
     query = db.query(TrainingHistory).all()
     return query
 
-@router.get('/busu')
+@router.get('/busu', dependencies=[Depends(cache.etag(BUSUHistory))])
 def get_busu_historic(db: Session = Depends(get_db)):
     query = db.query(BUSUHistory).all()
     return query
 
-@router.get('/socialContrib')
+@router.get('/socialContrib', dependencies=[Depends(cache.etag(SocialContribHistory))])
 def get_socContrib_historic(db: Session = Depends(get_db)):
     query = db.query(SocialContribHistory).all()
     return query
 
-@router.get('/csf')
+@router.get('/csf', dependencies=[Depends(cache.etag(CSFHistory))])
 def get_csf_historic(db: Session = Depends(get_db)):
     query = db.query(CSFHistory).all()
     return query
 
-@router.get('/qaip')
+@router.get('/qaip', dependencies=[Depends(cache.etag(QAResultHistory))])
 def get_qaip_historic(db: Session = Depends(get_db)):
     query = db.query(QAResultHistory).all()
     return query
 
-@router.get('/attr/main')
+@router.get('/attr/main', dependencies=[Depends(cache.etag(AttritionMainTableHistory))])
 def get_attrmain_historic(db: Session = Depends(get_db)):
     query = db.query(AttritionMainTableHistory).all()
     return query
 
-@router.get('/attr/jrt')
+@router.get('/attr/jrt', dependencies=[Depends(cache.etag(AttritionJRTTableHistory))])
 def get_attr_jrt_historic(db: Session = Depends(get_db)):
     query = db.query(AttritionJRTTableHistory).all()
     return query
 
-@router.get('/attr/rot')
+@router.get('/attr/rot', dependencies=[Depends(cache.etag(AttritionRotationTableHistory))])
 def get_attr_rot_historic(db: Session = Depends(get_db)):
     query = db.query(AttritionRotationTableHistory).all()
     return query
 
-@router.get('/project')
+@router.get('/project', dependencies=[Depends(cache.etag(ProjectHistory))])
 def get_prj_historic(db: Session = Depends(get_db)):
     query = db.query(ProjectHistory).all()
     return query
 
-@router.get('/emp')
+@router.get('/emp', dependencies=[Depends(cache.etag(EmployeeHistory))])
 def get_emp_historic(db: Session = Depends(get_db)):
     query = db.query(EmployeeHistory).all()
     return query
 
-@router.get('/cert')
+@router.get('/cert', dependencies=[Depends(cache.etag(CertHistory))])
 def get_cert_historic(db: Session = Depends(get_db)):
     query = db.query(CertHistory).all()
     return query
 
-@router.get('/div')
+@router.get('/div', dependencies=[Depends(cache.etag(DivisionHistory))])
 def get_div_historic(db: Session = Depends(get_db)):
     query = db.query(DivisionHistory).all()
     return query
\ No newline at end of file
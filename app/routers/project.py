@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 import schemas, oauth2, utils
 from models import *
 from database import get_db
+from proofstore import proofstore_module as ps
 
 router = APIRouter(
     tags=['Projects'],
@@ -118,9 +119,11 @@ def update_project(id: int, req: schemas.ProjectIn, db: Session = Depends(get_db
 def delete_project(id: int, db: Session = Depends(get_db)):
     query_res = db.query(Project).filter(Project.id == id)
 
-    if not query_res.first():
+    prj = query_res.first()
+    if not prj:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='ID not found')
 
+    ps.drop(prj.completion_PA, db) # Releases the proof file
     query_res.delete()
     db.commit()
 
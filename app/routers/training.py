@@ -7,6 +7,7 @@ import datetime
 import schemas, oauth2, utils
 from models import *
 from database import get_db
+from proofstore import proofstore_module as ps
 
 router = APIRouter(
     tags=['Training'],
@@ -272,9 +273,11 @@ def update_training(id: int, req: schemas.TrainingIn, db: Session = Depends(get_
 def delete_training(id: int, db: Session = Depends(get_db)):
     query_res = db.query(Training).filter(Training.id == id)
 
-    if not query_res.first():
+    train = query_res.first()
+    if not train:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='ID not found')
 
+    ps.drop(train.proof, db) # Releases the proof file
     query_res.delete()
     db.commit()
 